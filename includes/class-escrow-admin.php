@@ -64,6 +64,10 @@ class WEO_Admin {
       'meta_compare' => 'EXISTS'
     ]);
 
+    $api_status = weo_api_status_batch(array_map(function($o){
+      return weo_sanitize_order_id((string)$o->get_order_number());
+    }, $orders));
+
     echo '<table class="widefat fixed"><thead><tr>';
     echo '<th>Bestellung</th><th>Adresse</th><th>Funding</th><th>Signaturen</th><th>Aktionen</th>';
     echo '</tr></thead><tbody>';
@@ -72,7 +76,7 @@ class WEO_Admin {
       $addr = $order->get_meta('_weo_escrow_addr');
       if (!$addr) continue;
       $oid  = weo_sanitize_order_id((string)$order->get_order_number());
-      $status = weo_api_get('/orders/'.rawurlencode($oid).'/status');
+      $status = is_wp_error($api_status) ? $api_status : ($api_status[$oid] ?? new WP_Error('weo_api', 'API error'));
       $fund = is_wp_error($status) ? '-' : intval($status['funding']['total_sat'] ?? 0);
       $conf = is_wp_error($status) ? 0 : intval($status['funding']['confirmed_sat'] ?? 0);
       $signs = intval($order->get_meta('_weo_psbt_sign_count'));
@@ -144,6 +148,10 @@ class WEO_Admin {
       'meta_compare' => 'EXISTS'
     ]);
 
+    $api_status = weo_api_status_batch(array_map(function($o){
+      return weo_sanitize_order_id((string)$o->get_order_number());
+    }, $orders));
+
     echo '<table class="widefat fixed"><thead><tr>';
     echo '<th>Bestellung</th><th>Käufer</th><th>Verkäufer</th><th>Funding</th><th>Nachricht</th><th>Aktionen</th>';
     echo '</tr></thead><tbody>';
@@ -151,7 +159,7 @@ class WEO_Admin {
     foreach ($orders as $order) {
       $oid  = weo_sanitize_order_id((string)$order->get_order_number());
       $meta_dispute = $order->get_meta('_weo_dispute');
-      $status = weo_api_get('/orders/'.rawurlencode($oid).'/status');
+      $status = is_wp_error($api_status) ? $api_status : ($api_status[$oid] ?? new WP_Error('weo_api', 'API error'));
       $state  = is_wp_error($status) ? '' : ($status['state'] ?? '');
       if (!$meta_dispute && $state !== 'dispute') continue;
 
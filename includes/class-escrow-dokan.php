@@ -163,6 +163,15 @@ class WEO_Dokan {
       'return'        => 'objects',
     ]);
 
+    $oids = [];
+    foreach (array_merge($vendor_orders, $buyer_orders) as $order) {
+      if ($order->get_meta('_weo_escrow_addr')) {
+        $oids[] = weo_sanitize_order_id((string)$order->get_order_number());
+      }
+    }
+    $statuses = weo_api_status_batch($oids);
+    if (is_wp_error($statuses)) $statuses = [];
+
     $list = [];
     $seen = [];
     foreach ($vendor_orders as $order) {
@@ -171,8 +180,8 @@ class WEO_Dokan {
       $state = 'unknown';
       $funding = null;
       if ($addr && $oid) {
-        $status = weo_api_get('/orders/'.rawurlencode($oid).'/status');
-        if (!is_wp_error($status)) {
+        $status = $statuses[$oid] ?? null;
+        if ($status) {
           $state = $status['state'] ?? 'unknown';
           $funding = $status['funding'] ?? null;
         }
@@ -200,8 +209,8 @@ class WEO_Dokan {
       $state = 'unknown';
       $funding = null;
       if ($addr && $oid) {
-        $status = weo_api_get('/orders/'.rawurlencode($oid).'/status');
-        if (!is_wp_error($status)) {
+        $status = $statuses[$oid] ?? null;
+        if ($status) {
           $state = $status['state'] ?? 'unknown';
           $funding = $status['funding'] ?? null;
         }
@@ -12,6 +12,11 @@ class WEO_REST {
       'callback' => [$this,'handle'],
       'permission_callback' => [$this,'verify'],
     ]);
+    register_rest_route('weo/v1', '/webhook/batch', [
+      'methods'  => 'POST',
+      'callback' => [$this,'handle_batch'],
+      'permission_callback' => [$this,'verify'],
+    ]);
   }
 
   public function verify($req) {
@@ -27,13 +32,29 @@ class WEO_REST {
   }
 
   public function handle($req) {
-    $data = $req->get_json_params();
+    $status = $this->apply_event($req->get_json_params());
+    return new WP_REST_Response(['ok'=>$status===200],$status);
+  }
+
+  // Body is a JSON array of single-webhook payloads, signed once as a whole.
+  public function handle_batch($req) {
+    $events = $req->get_json_params();
+    if (!is_array($events) || array_values($events) !== $events) return new WP_REST_Response(['ok'=>false],400);
+    $results = [];
+    foreach ($events as $data) {
+      $status = is_array($data) ? $this->apply_event($data) : 400;
+      $results[] = ['order_id'=>is_array($data) ? ($data['order_id'] ?? '') : '', 'ok'=>$status===200, 'status'=>$status];
+    }
+    return new WP_REST_Response(['ok'=>true,'results'=>$results],200);
+  }
+
+  private function apply_event($data) {
     $order_id_str = $data['order_id'] ?? '';
-    if (!$order_id_str) return new WP_REST_Response(['ok'=>false],400);
+    if (!$order_id_str) return 400;
 
     $order_id = wc_get_order_id_by_order_key($order_id_str);
     $order = $order_id ? wc_get_order($order_id) : wc_get_order($order_id_str);
-    if (!$order) return new WP_REST_Response(['ok'=>false],404);
+    if (!$order) return 404;
 
     $event = $data['event'] ?? '';
     switch ($event) {
@@ -50,6 +71,6 @@ class WEO_REST {
         $order->update_status('on-hold','Dispute geöffnet');
         break;
     }
-    return new WP_REST_Response(['ok'=>true],200);
+    return 200;
   }
 }
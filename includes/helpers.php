@@ -33,6 +33,21 @@ function weo_api_get($endpoint) {
   return ($code >=200 && $code <300) ? $json : new WP_Error('weo_api', 'API error', ['code'=>$code,'body'=>$json]);
 }
 
+// Must not exceed StatusBatchReq.order_ids max_length in the API (python_api/models.py).
+if (!defined('WEO_STATUS_BATCH_MAX')) define('WEO_STATUS_BATCH_MAX', 200);
+
+function weo_api_status_batch($oids) {
+  $oids = array_values(array_unique(array_filter(array_map('strval', $oids))));
+  if (!$oids) return [];
+  $orders = [];
+  foreach (array_chunk($oids, WEO_STATUS_BATCH_MAX) as $chunk) {
+    $res = weo_api_post('/orders/status:batch', ['order_ids' => $chunk]);
+    if (is_wp_error($res)) return $res;
+    $orders += $res['orders'] ?? [];
+  }
+  return $orders;
+}
+
 function weo_sanitize_xpub($x) {
   $x = trim($x);
   return preg_replace('/[^A-Za-z0-9]/','',$x);
@@ -0,0 +1,91 @@
+"""Queries per second of the legacy connect-per-call pattern vs. the pooled WAL layer.
+
+Mimics FastAPI's threadpool: N threads run a status-poll style mix of
+get_order (80%) and update_funding (20%) against the same database.
+
+Usage: python benchmarks/bench_db.py [ops_per_thread] [threads]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+ORDERS = 1000
+
+
+def legacy_get_order(path, order_id):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM orders WHERE order_id=?", (order_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def legacy_update_funding(path, order_id, txid, vout, conf):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "UPDATE orders SET funding_txid=?, vout=?, confirmations=? WHERE order_id=?",
+        (txid, vout, conf, order_id),
+    )
+    conn.commit()
+    conn.close()
+
+
+def seed(path):
+    db.DB_PATH = path
+    db.init_db()
+    with db.transaction():
+        for i in range(ORDERS):
+            db.upsert_order(f"o{i}", "desc", i, 1, f"escrow:o{i}", 1000, 10)
+    db.close_conn()
+
+
+def run(name, get_order, update_funding, ops, threads, cleanup=None):
+    def worker(t):
+        for i in range(ops):
+            oid = f"o{(t * ops + i) % ORDERS}"
+            if i % 5 == 0:
+                update_funding(oid, "tx", i, i)
+            else:
+                get_order(oid)
+        if cleanup:
+            cleanup()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+    total = ops * threads
+    print(f"{name:<34} {total:>7} ops  {elapsed:7.2f} s  {total / elapsed:9.0f} qps")
+
+
+def main():
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    tmp = tempfile.mkdtemp()
+
+    legacy = os.path.join(tmp, "legacy.sqlite")
+    seed(legacy)
+    sqlite3.connect(legacy).execute("PRAGMA journal_mode=DELETE").close()
+    run(
+        "connect-per-call, rollback journal",
+        lambda oid: legacy_get_order(legacy, oid),
+        lambda *a: legacy_update_funding(legacy, *a),
+        ops,
+        threads,
+    )
+
+    pooled = os.path.join(tmp, "pooled.sqlite")
+    seed(pooled)
+    db.DB_PATH = pooled
+    run("per-thread connection, WAL", db.get_order, db.update_funding, ops, threads, db.close_conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Stuck/deadline checks: periodic full sweep vs. the DeadlineScheduler heap.
+
+Seeds open orders carrying realistic partials/rbf_psbt blobs, a few of them due.
+The sweep is the old per-interval work (SELECT * of every open order, walked in
+Python); the scheduler numbers are the one-off startup load, an incremental sync
+and a wake-up that handles only the due orders. The escalation part models each
+order's RPC chain as rpc_ms of latency and compares one-by-one escalation with
+the DEADLINE_WORKERS pool.
+
+Usage: python benchmarks/bench_deadlines.py [open_orders] [due] [rpc_ms]
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ALLOW_ORIGINS", "http://bench")
+os.environ.setdefault("ORDERS_DB", os.path.join(tempfile.mkdtemp(), "bench.sqlite"))
+
+from python_api import workers  # noqa: E402
+
+logging.getLogger().setLevel(logging.WARNING)
+
+
+def seed(db, open_orders, due):
+    now = int(time.time())
+    blob = json.dumps(["cHNidP8B" + "A" * 4000] * 3)
+    rows = []
+    for i in range(open_orders):
+        deadline = now - 10 if i < due else now + 86400
+        rows.append((f"o{i}", "desc", i, 1, f"escrow:o{i}", 1000, 10, now - 3600, "signing", deadline, blob, blob))
+    with db.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO orders(order_id, descriptor, "index", min_conf, label, amount_sat, fee_est_sat, created_at, state, deadline_ts, partials, rbf_psbt) '
+            "VALUES(?,?,?,?,?,?,?,?,?,?,?,?)",
+            rows,
+        )
+
+
+def sweep(db, now):
+    due = []
+    for o in db.list_orders_by_states(["awaiting_deposit", "signing"]):
+        age_h = (now - (o.get("created_at") or now)) / 3600
+        if age_h > workers.STUCK_ORDER_HOURS or (o.get("deadline_ts") and now > int(o["deadline_ts"])):
+            due.append(o["order_id"])
+    return due
+
+
+def timed(name, fn):
+    start = time.perf_counter()
+    fn()
+    print(f"  {name:<34} {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+
+def main():
+    open_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    due = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    db = workers.db
+    seed(db, open_orders, due)
+    handled = []
+    workers._escalate_deadline = lambda o, expires: handled.append(o["order_id"]) or "escalated"
+    now = int(time.time())
+    print(f"{open_orders} open orders, {due} past their deadline")
+    timed("full sweep (every interval)", lambda: sweep(db, now))
+    s = workers.DeadlineScheduler()
+    timed("scheduler startup load", lambda: s.sync(now))
+    timed("scheduler incremental sync", lambda: s.sync(now))
+    timed("scheduler wake-up (due orders)", lambda: (s.run_once(now), s.wait_idle()))
+    assert len(handled) == due
+
+    rpc_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 160
+    workers._escalate_deadline = lambda o, expires: time.sleep(rpc_ms / 1000) or "escalated"
+    db.get_conn().execute("UPDATE orders SET state='signing', lease_until=NULL")
+    print(f"escalating {due} due orders, {rpc_ms:.0f} ms of RPCs each")
+    timed("one by one", lambda: [workers._escalate_order(f"o{i}", now) for i in range(due)])
+    s = workers.DeadlineScheduler()
+    s.sync(now - 1)
+    timed(f"pool of {workers.DEADLINE_WORKERS}", lambda: (s.run_once(now), s.wait_idle()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""psbt_finalize input verification: serial RPCs vs. per-input gather vs. batched pipeline.
+
+The stub Core adds a fixed per-HTTP-request delay to model RPC latency.
+
+Usage: python benchmarks/bench_finalize.py [delay_ms]
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ALLOW_ORIGINS", "http://bench")
+os.environ.setdefault("ORDERS_DB", os.path.join(tempfile.mkdtemp(), "bench.sqlite"))
+
+from benchmarks.stub_core import StubCore  # noqa: E402
+from python_api.rpc import AsyncCoreRPC  # noqa: E402
+from python_api.routes import psbt as psbt_routes  # noqa: E402
+
+logging.getLogger().setLevel(logging.WARNING)
+
+LABEL = "escrow:bench"
+HANDLERS = {
+    "gettransaction": lambda p: {"details": [{"vout": v, "label": LABEL} for v in range(100)]},
+    "gettxout": lambda p: {"value": 0.0001},
+}
+
+
+async def serial(client, vins):
+    for vin in vins:
+        await client.call("gettransaction", [vin["txid"]])
+        await client.call("gettxout", [vin["txid"], vin["vout"]])
+
+
+async def per_input_gather(client, vins):
+    await asyncio.gather(*[
+        client.batch([("gettransaction", [vin["txid"]]), ("gettxout", [vin["txid"], vin["vout"]])])
+        for vin in vins
+    ])
+
+
+async def pipeline(client, vins):
+    psbt_routes.arpc_batch = client.batch
+    await psbt_routes._verify_inputs(vins, LABEL, True)
+
+
+async def main():
+    delay = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.002
+    with StubCore(HANDLERS, delay=delay) as core:
+        client = AsyncCoreRPC(url=core.url, wallet="bench", pool_size=16)
+        print(f"stub Core latency {delay * 1000:.1f} ms per HTTP request")
+        await client.call("gettxout", ["warmup", 0])
+        for n in (1, 10, 100):
+            # deposits usually share few funding txs; use 4 distinct txids
+            vins = [{"txid": f"tx{i % 4}", "vout": i, "sequence": 0xfffffffd} for i in range(n)]
+            for name, fn in (("serial", serial), ("per-input gather", per_input_gather), ("batched pipeline", pipeline)):
+                before = core.requests
+                start = time.perf_counter()
+                await fn(client, vins)
+                ms = (time.perf_counter() - start) * 1000
+                print(f"  {n:>3} inputs  {name:<18} {ms:8.1f} ms  {core.requests - before:>4} HTTP requests")
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""Per-request overhead of the logging middleware and log pipeline.
+
+Drives a minimal FastAPI app in-process (httpx ASGITransport) whose route logs
+one rpc_start carrying a base64 PSBT, like the PSBT routes do. Compares no
+logging at all, the previous BaseHTTPMiddleware with synchronous JSON rendering
+on the request thread, and the ASGI middleware with the queued writer. Log
+output goes to /dev/null so only the in-process cost is measured.
+
+Usage: python benchmarks/bench_logging.py [requests] [psbt_bytes]
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+import structlog
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ALLOW_ORIGINS", "http://bench")
+os.environ.setdefault("ORDERS_DB", os.path.join(tempfile.mkdtemp(), "bench.sqlite"))
+
+from python_api import logging as log_module  # noqa: E402
+from python_api.logging import LoggingMiddleware, log, req_id_var, order_id_var, actor_var  # noqa: E402
+
+PIPELINE = structlog.get_config()["processors"]
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        req_id_var.set(request_id)
+        start = time.time()
+        response = await call_next(request)
+        log.info(
+            "request",
+            request_id=request_id,
+            method=request.method,
+            path=str(request.url.path),
+            status=response.status_code,
+            duration=time.time() - start,
+            order_id=order_id_var.get(),
+            actor=actor_var.get(),
+        )
+        req_id_var.set(None)
+        return response
+
+
+def legacy_logging():
+    structlog.configure(processors=[
+        structlog.stdlib.filter_by_level,
+        structlog.processors.TimeStamper(fmt="iso"),
+        structlog.processors.add_log_level,
+        structlog.processors.JSONRenderer(),
+    ])
+
+
+def queued_logging():
+    structlog.configure(processors=PIPELINE)
+
+
+def make_app(middleware, psbt):
+    app = FastAPI()
+    if middleware is not None:
+        app.add_middleware(middleware)
+
+    @app.get("/orders/{order_id}/status")
+    async def status(order_id: str):
+        order_id_var.set(order_id)
+        log.bind(request_id=req_id_var.get(), rpc_method="decodepsbt").info("rpc_start", params=[psbt])
+        return {"state": "signing"}
+
+    return app
+
+
+async def drive(app, requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(50):
+            await client.get("/orders/warm/status")
+        start = time.perf_counter()
+        for i in range(requests):
+            await client.get(f"/orders/o{i}/status")
+        return time.perf_counter() - start
+
+
+def run(name, app, requests, level, configure, baseline=None):
+    configure()
+    logging.getLogger().setLevel(level)
+    elapsed = asyncio.run(drive(app, requests))
+    log_module._writer.flush()
+    per = elapsed / requests * 1e6
+    extra = f"  {per - baseline:+7.1f} us" if baseline is not None else ""
+    print(f"{name:<38} {requests / elapsed:8.0f} req/s  {per:7.1f} us/req{extra}", file=sys.__stdout__)
+    return per
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    psbt = "cHNidP8B" + "A" * (int(sys.argv[2]) if len(sys.argv) > 2 else 4000)
+    sys.stdout = open(os.devnull, "w")
+    logging.getLogger().handlers[:] = [logging.StreamHandler(sys.stdout)]
+    print(f"{requests} requests, {len(psbt)}-char PSBT logged per request", file=sys.__stdout__)
+    base = run("no middleware, logging off", make_app(None, psbt), requests, logging.WARNING, queued_logging)
+    run("BaseHTTPMiddleware + sync JSON", make_app(LegacyLoggingMiddleware, psbt), requests, logging.INFO,
+        legacy_logging, base)
+    run("ASGI middleware, logging off", make_app(LoggingMiddleware, psbt), requests, logging.WARNING,
+        queued_logging, base)
+    run("ASGI middleware + queued writer", make_app(LoggingMiddleware, psbt), requests, logging.INFO,
+        queued_logging, base)
+
+
+if __name__ == "__main__":
+    main()
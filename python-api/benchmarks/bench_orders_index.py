@@ -0,0 +1,69 @@
+"""Seed a large orders table and time the hot queries before and after the index migration.
+
+Usage: python benchmarks/bench_orders_index.py [orders] [open_orders]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+def seed(total, open_orders):
+    now = int(time.time())
+    rows = []
+    for i in range(total):
+        if i < open_orders:
+            state = "signing" if i % 2 else "awaiting_deposit"
+        else:
+            state = "completed"
+        rows.append((f"o{i}", "desc", i, 1, f"escrow:o{i}", 1000, 10, now, state, now + i, f"tx{i}"))
+    with db.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO orders(order_id, descriptor, "index", min_conf, label, amount_sat, fee_est_sat, created_at, state, deadline_ts, payout_txid) '
+            "VALUES(?,?,?,?,?,?,?,?,?,?,?)",
+            rows,
+        )
+
+
+def timed(name, fn, repeat=20):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    ms = (time.perf_counter() - start) / repeat * 1000
+    print(f"  {name:<32} {ms:9.3f} ms")
+
+
+def queries():
+    conn = db.get_conn()
+    timed("list_orders_by_states (stuck)", lambda: db.list_orders_by_states(["awaiting_deposit", "signing"]))
+    timed("count_pending_signatures", db.count_pending_signatures)
+    timed("next_index", db.next_index)
+    timed("label lookup", lambda: conn.execute("SELECT order_id FROM orders WHERE label=?", ("escrow:o4242",)).fetchone())
+    timed("payout_txid lookup", lambda: conn.execute("SELECT order_id FROM orders WHERE payout_txid=?", ("tx4242",)).fetchone())
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    open_orders = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.sqlite")
+    with db.transaction() as conn:
+        db.MIGRATIONS[0](conn.cursor())
+        conn.execute("PRAGMA user_version=1")
+    start = time.perf_counter()
+    seed(total, open_orders)
+    print(f"seeded {total} orders ({open_orders} open) in {time.perf_counter() - start:.1f} s")
+    print("schema v1 (no secondary indexes):")
+    queries()
+    start = time.perf_counter()
+    db.init_db()
+    print(f"migrated to v{db.schema_version()} in {time.perf_counter() - start:.1f} s")
+    queries()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""decodepsbt round trip to Core vs. the local BIP-174 parser.
+
+The stub Core answers decodepsbt with the locally decoded JSON, so the RPC
+number is a lower bound: real Core also has to parse the PSBT and resolve
+the wallet, and usually runs on another host.
+
+Usage: python benchmarks/bench_psbt_decode.py [iterations]
+"""
+import base64
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ALLOW_ORIGINS", "http://bench")
+os.environ.setdefault("ORDERS_DB", os.path.join(tempfile.mkdtemp(), "bench.sqlite"))
+
+from benchmarks.stub_core import StubCore  # noqa: E402
+from python_api import bip174  # noqa: E402
+from python_api.rpc import CoreRPC  # noqa: E402
+
+logging.getLogger().setLevel(logging.WARNING)
+
+P2WSH = bytes.fromhex("00201863143c14c5166804bd19203356da136c985678cd4d27a1b8c6329604903262")
+# 2-of-3 multisig witness script shape: OP_2 <33> <33> <33> OP_3 OP_CHECKMULTISIG
+WITNESS_SCRIPT = b"\x52" + (b"\x21\x02" + b"\x11" * 32) * 3 + b"\x53\xae"
+
+
+def _kv(key, val):
+    return bytes([len(key)]) + key + bytes([len(val)]) + val
+
+
+def make_psbt(n_inputs, sigs_per_input):
+    tx = (2).to_bytes(4, "little") + bytes([n_inputs])
+    for i in range(n_inputs):
+        tx += i.to_bytes(32, "little") + (0).to_bytes(4, "little") + b"\x00" + (0xFFFFFFFD).to_bytes(4, "little")
+    tx += b"\x01" + (10000 * n_inputs).to_bytes(8, "little") + bytes([len(P2WSH)]) + P2WSH
+    tx += (0).to_bytes(4, "little")
+    out = b"psbt\xff\x01\x00" + bip174._compact(len(tx)) + tx + b"\x00"
+    for i in range(n_inputs):
+        out += _kv(b"\x01", (10500).to_bytes(8, "little") + bytes([len(P2WSH)]) + P2WSH)
+        out += _kv(b"\x05", WITNESS_SCRIPT)
+        for s in range(sigs_per_input):
+            out += _kv(b"\x02" + b"\x02" + bytes([s]) * 32, b"\x30" * 71)
+        out += b"\x00"
+    out += b"\x00"
+    return base64.b64encode(out).decode()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    for n in (1, 10, 100):
+        psbt = make_psbt(n, 2)
+        dec = bip174.decode_psbt(psbt, "tb")
+        with StubCore({"decodepsbt": lambda p, dec=dec: dec}) as core:
+            client = CoreRPC(url=core.url, wallet="bench", pool_size=4)
+            client.call("decodepsbt", [psbt])
+            start = time.perf_counter()
+            for _ in range(iterations):
+                client.call("decodepsbt", [psbt])
+            rpc_ms = (time.perf_counter() - start) * 1000 / iterations
+        start = time.perf_counter()
+        for _ in range(iterations):
+            bip174.decode_psbt(psbt, "tb")
+        local_ms = (time.perf_counter() - start) * 1000 / iterations
+        print(f"{n:>3} inputs ({len(psbt):>6} b64 chars)  Core RPC {rpc_ms:7.3f} ms  local {local_ms:7.3f} ms  x{rpc_ms / local_ms:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
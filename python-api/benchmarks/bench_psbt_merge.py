@@ -0,0 +1,77 @@
+"""Partial merging: accumulated list + combinepsbt per call vs. local incremental combine.
+
+Each round submits one more signer partial (plus the buyer's partial again, as
+plugins tend to resend everything they hold). The old path ships the whole
+accumulated list to Core on every call; the stub Core combines with the local
+combiner, so the RPC numbers exclude Core's own parsing cost.
+
+Usage: python benchmarks/bench_psbt_merge.py [inputs] [rounds]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ALLOW_ORIGINS", "http://bench")
+os.environ.setdefault("ORDERS_DB", os.path.join(tempfile.mkdtemp(), "bench.sqlite"))
+
+from benchmarks.bench_psbt_decode import make_psbt  # noqa: E402
+from benchmarks.stub_core import StubCore  # noqa: E402
+from python_api import bip174  # noqa: E402
+from python_api.rpc import CoreRPC  # noqa: E402
+
+logging.getLogger().setLevel(logging.WARNING)
+
+
+def signer_partial(base, signer):
+    psbt = bip174.PSBT.from_base64(base)
+    for m in psbt.inputs:
+        m.append((memoryview(b"\x02\x03" + bytes([signer]) * 32), memoryview(b"\x30" * 71)))
+    return psbt.to_base64()
+
+
+def legacy(client, partials):
+    stored = []
+    for i in range(1, len(partials)):
+        submitted = [partials[0], partials[i]]
+        stored += [p for p in submitted if p not in stored]
+        client.call("combinepsbt", [stored])
+
+
+def incremental(partials):
+    merged, seen = None, []
+    for i in range(1, len(partials)):
+        new = []
+        for p in (partials[0], partials[i]):
+            h = bip174.psbt_hash(p)
+            if h not in seen:
+                seen.append(h)
+                new.append(p)
+        if new:
+            merged = bip174.combine_psbts(([merged] if merged else []) + new)
+
+
+def main():
+    n_inputs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    base = make_psbt(n_inputs, 0)
+    partials = [signer_partial(base, s) for s in range(rounds + 1)]
+    with StubCore({"combinepsbt": lambda p: bip174.combine_psbts(p[0])}) as core:
+        client = CoreRPC(url=core.url, wallet="bench", pool_size=4)
+        client.call("combinepsbt", [[base]])
+        start = time.perf_counter()
+        legacy(client, partials)
+        legacy_ms = (time.perf_counter() - start) * 1000
+        sent = core.requests
+    start = time.perf_counter()
+    incremental(partials)
+    local_ms = (time.perf_counter() - start) * 1000
+    print(f"{n_inputs} inputs, {rounds} merge calls")
+    print(f"  list + combinepsbt   {legacy_ms:8.1f} ms  {sent - 1} RPCs, final payload {sum(map(len, partials)) // 1024} KiB")
+    print(f"  local incremental    {local_ms:8.1f} ms  0 RPCs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Compare per-call requests.post, the pooled CoreRPC client and JSON-RPC batching.
+
+Usage: python benchmarks/bench_rpc.py [calls] [threads]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ALLOW_ORIGINS", "http://bench")
+os.environ.setdefault("ORDERS_DB", os.path.join(tempfile.mkdtemp(), "bench.sqlite"))
+
+from benchmarks.stub_core import StubCore  # noqa: E402
+from python_api.rpc import CoreRPC  # noqa: E402
+
+logging.getLogger().setLevel(logging.WARNING)
+
+HANDLERS = {
+    "gettransaction": lambda p: {"confirmations": 3, "details": [{"vout": 0, "label": "escrow:bench"}]},
+    "gettxout": lambda p: {"value": 0.0006},
+}
+
+
+def _report(name, calls, elapsed):
+    print(f"{name:<28} {calls:>6} calls  {elapsed * 1000:8.1f} ms  {calls / elapsed:10.0f} calls/s")
+
+
+def bench_legacy(url, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        payload = {"jsonrpc": "1.0", "id": "escrow", "method": "gettxout", "params": ["tx", i]}
+        requests.post(url.rstrip("/") + "/wallet/bench", json=payload, timeout=25).json()
+    _report("requests.post (no session)", calls, time.perf_counter() - start)
+
+
+def bench_pooled(client, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        client.call("gettxout", ["tx", i])
+    _report("CoreRPC.call (keep-alive)", calls, time.perf_counter() - start)
+
+
+def bench_batch(client, calls):
+    start = time.perf_counter()
+    for i in range(0, calls, 2):
+        client.batch([("gettransaction", ["tx"]), ("gettxout", ["tx", i])])
+    _report("CoreRPC.batch (pairs)", calls, time.perf_counter() - start)
+    start = time.perf_counter()
+    client.batch([("gettxout", ["tx", i]) for i in range(calls)])
+    _report("CoreRPC.batch (single)", calls, time.perf_counter() - start)
+
+
+def bench_threads(client, calls, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(lambda i: client.call("gettxout", ["tx", i]), range(calls)))
+    _report(f"CoreRPC.call x{threads} threads", calls, time.perf_counter() - start)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    with StubCore(HANDLERS) as core:
+        client = CoreRPC(url=core.url, wallet="bench", pool_size=threads)
+        bench_legacy(core.url, calls)
+        bench_pooled(client, calls)
+        bench_batch(client, calls)
+        bench_threads(client, calls, threads)
+
+
+if __name__ == "__main__":
+    main()
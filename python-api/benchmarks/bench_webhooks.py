@@ -0,0 +1,103 @@
+"""Webhook delivery throughput from the SQLite outbox against a local receiver.
+
+Compares the old per-event requests.post (no session) with a sequential outbox
+pass (claimed batches, keep-alive session), the WebhookScheduler worker pool and
+batch mode (one signed JSON array per WEBHOOK_BATCH_MAX events).
+Every fail_every-th request is rejected to exercise retry scheduling; retried
+rows are made due immediately. The receiver sleeps delay_ms per request to
+model a real shop endpoint.
+
+Usage: python benchmarks/bench_webhooks.py [events] [fail_every] [delay_ms] [workers]
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ALLOW_ORIGINS", "http://bench")
+os.environ.setdefault("ORDERS_DB", os.path.join(tempfile.mkdtemp(), "bench.sqlite"))
+
+from benchmarks.stub_receiver import StubReceiver  # noqa: E402
+from python_api import workers  # noqa: E402
+
+logging.getLogger().setLevel(logging.WARNING)
+
+
+def _drain_sequential(db, session):
+    while workers.update_webhook_gauge():
+        if not workers.deliver_webhooks(session):
+            db.get_conn().execute("UPDATE webhook_outbox SET next_attempt_at=0 WHERE failed_at IS NULL AND attempts > 0")
+
+
+def _drain_batched(db, n_workers):
+    workers.WEBHOOK_BATCH_MODE = True
+    try:
+        _drain_scheduler(db, n_workers)
+    finally:
+        workers.WEBHOOK_BATCH_MODE = False
+
+
+def _drain_scheduler(db, n_workers):
+    scheduler = workers.WebhookScheduler(workers=n_workers)
+    t = threading.Thread(target=scheduler.run, daemon=True)
+    t.start()
+    while workers.update_webhook_gauge():
+        time.sleep(0.01)
+        if scheduler._timers:
+            db.get_conn().execute("UPDATE webhook_outbox SET next_attempt_at=0 WHERE failed_at IS NULL AND attempts > 0")
+            scheduler.wake()
+    scheduler.stop()
+    t.join()
+
+
+def _enqueue(db, payloads):
+    with db.transaction():
+        for p in payloads:
+            workers.woo_callback(p)
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    fail_every = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    delay = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.005
+    n_workers = int(sys.argv[4]) if len(sys.argv) > 4 else 8
+    db = workers.db
+    payloads = [{"order_id": f"o{i}", "event": "escrow_funded", "total_sat": 60000} for i in range(events)]
+    workers.WOO_HMAC_SECRET = "bench"
+    workers.WOO_CALLBACK_URL = "http://127.0.0.1:9/unused"
+    print(f"{events} events, receiver latency {delay * 1000:.1f} ms, every {fail_every}th request rejected")
+
+    with StubReceiver(delay=delay) as receiver:
+        start = time.perf_counter()
+        for p in payloads:
+            requests.post(receiver.url, data=json.dumps(p), headers={"Content-Type": "application/json"}, timeout=10)
+        legacy = time.perf_counter() - start
+    print(f"  requests.post per event      {events / legacy:8.0f} deliveries/s")
+
+    start = time.perf_counter()
+    _enqueue(db, payloads)
+    print(f"  outbox enqueue               {events / (time.perf_counter() - start):8.0f} events/s")
+    for name, drain in (
+        ("outbox, sequential", lambda: _drain_sequential(db, requests.Session())),
+        (f"outbox, {n_workers} workers", lambda: _drain_scheduler(db, n_workers)),
+        (f"batched x{workers.WEBHOOK_BATCH_MAX}, {n_workers} workers", lambda: _drain_batched(db, n_workers)),
+    ):
+        with StubReceiver(delay=delay, fail_every=fail_every) as receiver:
+            workers.WOO_CALLBACK_URL = receiver.url
+            workers.WOO_CALLBACK_BATCH_URL = receiver.url + "/batch"
+            if not workers.update_webhook_gauge():
+                _enqueue(db, payloads)
+            start = time.perf_counter()
+            drain()
+            elapsed = time.perf_counter() - start
+        print(f"  {name:<28} {events / elapsed:8.0f} deliveries/s  ({receiver.requests} POSTs, {receiver.requests - receiver.accepted} retried)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+
+Handler = Callable[[list], Any]
+
+
+class StubCore:
+    """Minimal Bitcoin Core JSON-RPC stand-in for local benchmarks."""
+
+    def __init__(self, handlers: Optional[Dict[str, Handler]] = None, delay: float = 0.0):
+        self.handlers = handlers or {}
+        self.delay = delay
+        self.requests = 0
+        self.calls = 0
+        stub = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length))
+                stub.requests += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if isinstance(payload, list):
+                    reply = [stub._reply(p) for p in payload]
+                else:
+                    reply = stub._reply(payload)
+                body = json.dumps(reply).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def _reply(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls += 1
+        fn = self.handlers.get(payload["method"])
+        if fn is None:
+            return {"id": payload.get("id"), "result": None, "error": None}
+        try:
+            return {"id": payload.get("id"), "result": fn(payload.get("params") or []), "error": None}
+        except Exception as e:
+            return {"id": payload.get("id"), "result": None, "error": {"code": -1, "message": str(e)}}
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,54 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubReceiver:
+    """Webhook endpoint stand-in: accepts POSTs, optionally slow or failing every Nth request."""
+
+    def __init__(self, delay: float = 0.0, fail_every: int = 0):
+        self.delay = delay
+        self.fail_every = fail_every
+        self.requests = 0
+        self.accepted = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with stub._lock:
+                    stub.requests += 1
+                    fail = stub.fail_every and stub.requests % stub.fail_every == 0
+                    if not fail:
+                        stub.accepted += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                reply = b""
+                if not fail and self.path.endswith("/batch"):
+                    # the batch route answers per event, in order
+                    results = [{"ok": True, "status": 200}] * len(json.loads(body))
+                    reply = json.dumps({"ok": True, "results": results}).encode()
+                self.send_response(503 if fail else 200)
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
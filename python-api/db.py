@@ -1,24 +1,78 @@
-import os, sqlite3, time, json
-from typing import Any, Dict, List, Optional
+import os, sqlite3, time, json, threading, hashlib
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
 
 DB_PATH = os.getenv("ORDERS_DB", "orders.sqlite")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+INDEX_BLOCK_SIZE = int(os.getenv("INDEX_BLOCK_SIZE", "16"))
+
+_local = threading.local()
+_index_lock = threading.Lock()
+_index_blocks: Dict[str, List[int]] = {}
+
+
+def get_conn() -> sqlite3.Connection:
+    # one long-lived connection per thread; sqlite3 caches prepared statements per connection
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        conn = sqlite3.connect(
+            DB_PATH,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            cached_statements=DB_STATEMENT_CACHE,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        _local.conn = conn
+        _local.path = DB_PATH
+    return conn
 
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+def close_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
 
 
-def init_db():
+@contextmanager
+def transaction():
     conn = get_conn()
-    cur = conn.cursor()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def init_db():
+    with transaction() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            step(conn.cursor())
+            conn.execute(f"PRAGMA user_version={target}")
+
+
+def schema_version() -> int:
+    return get_conn().execute("PRAGMA user_version").fetchone()[0]
+
+
+def _m001_base_schema(cur: sqlite3.Cursor):
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS orders (
             order_id TEXT PRIMARY KEY,
             descriptor TEXT,
-            index INTEGER,
+            "index" INTEGER,
             min_conf INTEGER,
             label TEXT,
             amount_sat INTEGER,
@@ -59,16 +113,155 @@ def init_db():
         cur.execute("ALTER TABLE orders ADD COLUMN rbf_partials TEXT")
     if "rbf_state" not in cols:
         cur.execute("ALTER TABLE orders ADD COLUMN rbf_state TEXT")
-    conn.commit()
-    conn.close()
 
 
-def next_index() -> int:
+def _m002_order_indexes(cur: sqlite3.Cursor):
+    # (state, deadline_ts) also serves plain state lookups, so state gets no index of its own
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_state_deadline ON orders(state, deadline_ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_label ON orders(label)")
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_orders_index ON orders("index")')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_payout_txid ON orders(payout_txid)")
+
+
+def _m003_index_allocator(cur: sqlite3.Cursor):
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS index_alloc (id INTEGER PRIMARY KEY CHECK (id = 1), next_index INTEGER NOT NULL)"
+    )
+    cur.execute(
+        'INSERT OR IGNORE INTO index_alloc(id, next_index) SELECT 1, COALESCE(MAX("index") + 1, 0) FROM orders'
+    )
+
+
+def _m004_merged_psbt(cur: sqlite3.Cursor):
+    # partials/rbf_partials keep the content hashes of accepted partials,
+    # the combined PSBT itself lives next to them
+    cur.execute("ALTER TABLE orders ADD COLUMN merged_psbt TEXT")
+    cur.execute("ALTER TABLE orders ADD COLUMN rbf_merged_psbt TEXT")
+
+
+def _m005_webhook_outbox(cur: sqlite3.Cursor):
+    # pending rows have failed_at NULL; next_attempt_at doubles as the claim lease
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS webhook_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT,
+            event TEXT,
+            body TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at INTEGER NOT NULL,
+            created_at INTEGER NOT NULL,
+            failed_at INTEGER,
+            last_error TEXT
+        )
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_due ON webhook_outbox(next_attempt_at) WHERE failed_at IS NULL"
+    )
+
+def _m006_created_index(cur: sqlite3.Cursor):
+    # update_state stamps created_at on every write, so this finds orders whose
+    # deadlines changed since the last scheduler sync
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at)")
+
+
+def _m007_escalation_lease(cur: sqlite3.Cursor):
+    # set while a deadline escalation owns the order; merges are refused until it expires
+    cur.execute("ALTER TABLE orders ADD COLUMN lease_until INTEGER")
+
+
+def _m008_leader_lease(cur: sqlite3.Cursor):
+    # one row per singleton role; the holder renews expires_at while it is alive
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS leader_lease (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+    )
+
+
+def _m009_funding_watcher(cur: sqlite3.Cursor):
+    # listsinceblock cursors of chain followers, and the funding summary /status serves
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS chain_cursors "
+        "(name TEXT PRIMARY KEY, blockhash TEXT NOT NULL, height INTEGER, updated_at REAL NOT NULL)"
+    )
+    cur.execute("ALTER TABLE orders ADD COLUMN funding TEXT")
+
+
+def _m010_child_tables(cur: sqlite3.Cursor):
+    # one row per accepted partial and per stored output instead of JSON lists on the
+    # order. A partial row holds its content hash, plus the PSBT itself for orders
+    # merged before merged_psbt existed. partial_count mirrors the non-RBF rows.
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS order_partials ("
+        "order_id TEXT NOT NULL, rbf INTEGER NOT NULL, hash TEXT NOT NULL, psbt TEXT, "
+        "UNIQUE (order_id, rbf, hash))"
+    )
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS order_outputs ("
+        "order_id TEXT NOT NULL, address TEXT NOT NULL, value_sat INTEGER NOT NULL, "
+        "PRIMARY KEY (order_id, address)) WITHOUT ROWID"
+    )
+    cur.execute("ALTER TABLE orders ADD COLUMN partial_count INTEGER NOT NULL DEFAULT 0")
+    rows = cur.execute(
+        "SELECT order_id, partials, rbf_partials, outputs, merged_psbt, rbf_merged_psbt FROM orders "
+        "WHERE partials IS NOT NULL OR rbf_partials IS NOT NULL OR outputs IS NOT NULL"
+    ).fetchall()
+    for order_id, partials, rbf_partials, outputs, merged, rbf_merged in rows:
+        for rbf, text, raw in ((0, partials, merged is None), (1, rbf_partials, rbf_merged is None)):
+            try:
+                parts = json.loads(text) if text else []
+            except ValueError:
+                parts = []
+            _insert_parts(cur, order_id, rbf, parts, raw)
+        try:
+            outs = json.loads(outputs) if outputs else {}
+        except ValueError:
+            outs = {}
+        _insert_outputs(cur, order_id, outs)
+    cur.execute(
+        "UPDATE orders SET partials=NULL, rbf_partials=NULL, outputs=NULL, partial_count="
+        "(SELECT COUNT(*) FROM order_partials p WHERE p.order_id=orders.order_id AND p.rbf=0)"
+    )
+
+
+# Ordered schema steps; PRAGMA user_version records how many have been applied.
+# Append new steps, never edit or reorder released ones.
+MIGRATIONS = [
+    _m001_base_schema,
+    _m002_order_indexes,
+    _m003_index_allocator,
+    _m004_merged_psbt,
+    _m005_webhook_outbox,
+    _m006_created_index,
+    _m007_escalation_lease,
+    _m008_leader_lease,
+    _m009_funding_watcher,
+    _m010_child_tables,
+]
+
+
+def reserve_index_block(size: int) -> int:
+    with transaction() as conn:
+        start = conn.execute("SELECT next_index FROM index_alloc WHERE id=1").fetchone()[0]
+        conn.execute("UPDATE index_alloc SET next_index=? WHERE id=1", (start + size,))
+    return start
+
+
+def claim_index(index: int):
     conn = get_conn()
-    cur = conn.execute("SELECT MAX(index) FROM orders")
-    row = cur.fetchone()
-    conn.close()
-    return (row[0] + 1) if row and row[0] is not None else 0
+    conn.execute("UPDATE index_alloc SET next_index=MAX(next_index, ?) WHERE id=1", (index + 1,))
+
+
+def next_index() -> int:
+    # each process reserves INDEX_BLOCK_SIZE indexes at a time and hands them out locally
+    with _index_lock:
+        block = _index_blocks.get(DB_PATH)
+        if not block or block[0] >= block[1]:
+            start = reserve_index_block(INDEX_BLOCK_SIZE)
+            block = _index_blocks[DB_PATH] = [start, start + INDEX_BLOCK_SIZE]
+        idx = block[0]
+        block[0] += 1
+        return idx
 
 
 def upsert_order(order_id: str, descriptor: str, index: int, min_conf: int, label: str, amount_sat: int, fee_est_sat: int):
@@ -76,11 +269,11 @@ def upsert_order(order_id: str, descriptor: str, index: int, min_conf: int, labe
     now = int(time.time())
     conn.execute(
         """
-        INSERT INTO orders(order_id, descriptor, index, min_conf, label, amount_sat, fee_est_sat, created_at, state)
+        INSERT INTO orders(order_id, descriptor, "index", min_conf, label, amount_sat, fee_est_sat, created_at, state)
         VALUES(?,?,?,?,?,?,?,?,?)
         ON CONFLICT(order_id) DO UPDATE SET
             descriptor=excluded.descriptor,
-            index=excluded.index,
+            "index"=excluded."index",
             min_conf=excluded.min_conf,
             label=excluded.label,
             amount_sat=excluded.amount_sat,
@@ -88,42 +281,87 @@ def upsert_order(order_id: str, descriptor: str, index: int, min_conf: int, labe
         """,
         (order_id, descriptor, index, min_conf, label, amount_sat, fee_est_sat, now, "awaiting_deposit"),
     )
-    conn.commit()
-    conn.close()
 
 
 def get_order(order_id: str) -> Optional[Dict[str, Any]]:
     conn = get_conn()
     cur = conn.execute("SELECT * FROM orders WHERE order_id=?", (order_id,))
     row = cur.fetchone()
-    conn.close()
     return dict(row) if row else None
 
 
-def get_partials(order_id: str) -> List[str]:
+def get_orders(order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    if not order_ids:
+        return {}
     conn = get_conn()
-    cur = conn.execute("SELECT partials FROM orders WHERE order_id=?", (order_id,))
-    row = cur.fetchone()
-    conn.close()
-    if not row or not row["partials"]:
-        return []
+    qmarks = ",".join(["?"] * len(order_ids))
+    cur = conn.execute(f"SELECT * FROM orders WHERE order_id IN ({qmarks})", order_ids)
+    return {r["order_id"]: dict(r) for r in cur.fetchall()}
 
 
-def get_rbf_partials(order_id: str) -> List[str]:
+def get_status_rows(order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    # just what StatusRes is built from; used by the order stream
+    if not order_ids:
+        return {}
     conn = get_conn()
-    cur = conn.execute("SELECT rbf_partials FROM orders WHERE order_id=?", (order_id,))
-    row = cur.fetchone()
-    conn.close()
-    if not row or not row["rbf_partials"]:
-        return []
-    try:
-        return json.loads(row["rbf_partials"])
-    except Exception:
-        return []
-    try:
-        return json.loads(row["partials"])
-    except Exception:
-        return []
+    rows: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(order_ids), 500):
+        chunk = order_ids[i:i + 500]
+        qmarks = ",".join(["?"] * len(chunk))
+        cur = conn.execute(
+            f"SELECT order_id, state, deadline_ts, fee_est_sat, funding FROM orders WHERE order_id IN ({qmarks})",
+            chunk,
+        )
+        rows.update((r["order_id"], dict(r)) for r in cur.fetchall())
+    return rows
+
+
+def _insert_parts(cur: sqlite3.Cursor, order_id: str, rbf: int, parts: List[str], raw: bool) -> int:
+    # raw partials are keyed by a hash of their text; returns the rows actually added
+    added = 0
+    for p in parts:
+        key = hashlib.sha256(p.encode()).hexdigest() if raw else p
+        added += cur.execute(
+            "INSERT OR IGNORE INTO order_partials(order_id, rbf, hash, psbt) VALUES(?,?,?,?)",
+            (order_id, rbf, key, p if raw else None),
+        ).rowcount
+    return added
+
+
+def _insert_outputs(cur: sqlite3.Cursor, order_id: str, outputs: Dict[str, int]):
+    cur.executemany(
+        "INSERT OR REPLACE INTO order_outputs(order_id, address, value_sat) VALUES(?,?,?)",
+        [(order_id, addr, int(sat)) for addr, sat in outputs.items()],
+    )
+
+
+def _get_parts(order_id: str, rbf: int) -> List[str]:
+    # raw partials where present, content hashes otherwise, in the order they were accepted
+    cur = get_conn().execute(
+        "SELECT hash, psbt FROM order_partials WHERE order_id=? AND rbf=? ORDER BY rowid",
+        (order_id, rbf),
+    )
+    return [r["psbt"] or r["hash"] for r in cur.fetchall()]
+
+
+def _replace_parts(order_id: str, rbf: int, partials: List[str]):
+    with transaction() as conn:
+        conn.execute("DELETE FROM order_partials WHERE order_id=? AND rbf=?", (order_id, rbf))
+        _insert_parts(conn.cursor(), order_id, rbf, partials, True)
+        if not rbf:
+            conn.execute(
+                "UPDATE orders SET partial_count=(SELECT COUNT(*) FROM order_partials WHERE order_id=? AND rbf=0) "
+                "WHERE order_id=?",
+                (order_id, order_id),
+            )
+
+
+def get_partials(order_id: str) -> List[str]:
+    return _get_parts(order_id, 0)
+
+
+def get_rbf_partials(order_id: str) -> List[str]:
+    return _get_parts(order_id, 1)
 
 
 def update_state(
@@ -145,61 +383,94 @@ def update_state(
     sql = f"UPDATE orders SET {', '.join(fields)} WHERE order_id=?"
     params.append(order_id)
     conn.execute(sql, params)
-    conn.commit()
-    conn.close()
 
 
 def save_partials(order_id: str, partials: List[str]):
+    _replace_parts(order_id, 0, partials)
+
+
+_MERGE_COLUMNS = {False: "merged_psbt", True: "rbf_merged_psbt"}
+
+
+def get_merge_state(order_id: str, rbf: bool = False) -> Tuple[Optional[str], List[str]]:
+    merged_col = _MERGE_COLUMNS[rbf]
     conn = get_conn()
-    conn.execute(
-        "UPDATE orders SET partials=? WHERE order_id=?",
-        (json.dumps(partials), order_id),
+    row = conn.execute(f"SELECT {merged_col} FROM orders WHERE order_id=?", (order_id,)).fetchone()
+    if not row:
+        return None, []
+    return row[0], _get_parts(order_id, int(rbf))
+
+
+def save_merge_state(order_id: str, merged: str, hashes: List[str], expected: Optional[str], rbf: bool = False) -> bool:
+    # compare-and-swap on the previous merged PSBT so concurrent merges cannot drop
+    # signatures; accepted hashes are only ever inserted
+    merged_col = _MERGE_COLUMNS[rbf]
+    with transaction() as conn:
+        cur = conn.execute(
+            f"UPDATE orders SET {merged_col}=? "
+            f"WHERE order_id=? AND {merged_col} IS ? AND (lease_until IS NULL OR lease_until < ?)",
+            (merged, order_id, expected, int(time.time())),
+        )
+        if cur.rowcount != 1:
+            return False
+        added = 0
+        if expected is None:
+            # raw partials from before merged PSBTs were stored are folded into merged now
+            added -= conn.execute(
+                "DELETE FROM order_partials WHERE order_id=? AND rbf=? AND psbt IS NOT NULL",
+                (order_id, int(rbf)),
+            ).rowcount
+        added += _insert_parts(conn.cursor(), order_id, int(rbf), hashes, False)
+        if added and not rbf:
+            conn.execute("UPDATE orders SET partial_count=partial_count+? WHERE order_id=?", (added, order_id))
+    return True
+
+
+def acquire_escalation_lease(order_id: str, now: int, until: int) -> bool:
+    # only a signing order past its deadline that nobody else holds
+    conn = get_conn()
+    cur = conn.execute(
+        "UPDATE orders SET lease_until=? WHERE order_id=? AND state='signing' "
+        "AND deadline_ts < ? AND (lease_until IS NULL OR lease_until < ?)",
+        (until, order_id, now, now),
     )
-    conn.commit()
-    conn.close()
+    return cur.rowcount == 1
 
 
-def save_rbf_partials(order_id: str, partials: List[str]):
+def release_escalation_lease(order_id: str):
     conn = get_conn()
-    conn.execute(
-        "UPDATE orders SET rbf_partials=? WHERE order_id=?",
-        (json.dumps(partials), order_id),
-    )
-    conn.commit()
-    conn.close()
+    conn.execute("UPDATE orders SET lease_until=NULL WHERE order_id=?", (order_id,))
 
 
-def set_outputs(order_id: str, outputs: Dict[str, int], output_type: str):
+def escalation_leased(order_id: str) -> bool:
     conn = get_conn()
-    conn.execute(
-        "UPDATE orders SET outputs=?, output_type=? WHERE order_id=?",
-        (json.dumps(outputs), output_type, order_id),
-    )
-    conn.commit()
-    conn.close()
+    row = conn.execute("SELECT lease_until FROM orders WHERE order_id=?", (order_id,)).fetchone()
+    return bool(row and row["lease_until"] and row["lease_until"] >= int(time.time()))
+
+
+def save_rbf_partials(order_id: str, partials: List[str]):
+    _replace_parts(order_id, 1, partials)
+
+
+def set_outputs(order_id: str, outputs: Dict[str, int], output_type: str):
+    with transaction() as conn:
+        conn.execute("DELETE FROM order_outputs WHERE order_id=?", (order_id,))
+        _insert_outputs(conn.cursor(), order_id, outputs)
+        conn.execute("UPDATE orders SET output_type=? WHERE order_id=?", (output_type, order_id))
 
 
 def get_outputs(order_id: str) -> Dict[str, int]:
     conn = get_conn()
-    cur = conn.execute("SELECT outputs FROM orders WHERE order_id=?", (order_id,))
-    row = cur.fetchone()
-    conn.close()
-    if not row or not row["outputs"]:
-        return {}
-    try:
-        return json.loads(row["outputs"])
-    except Exception:
-        return {}
+    cur = conn.execute("SELECT address, value_sat FROM order_outputs WHERE order_id=?", (order_id,))
+    return {r["address"]: r["value_sat"] for r in cur.fetchall()}
 
 
-def update_funding(order_id: str, txid: str, vout: int, confirmations: int):
+def update_funding(order_id: str, txid: str, vout: int, confirmations: int, funding: Optional[Dict[str, Any]] = None):
     conn = get_conn()
     conn.execute(
-        "UPDATE orders SET funding_txid=?, vout=?, confirmations=? WHERE order_id=?",
-        (txid, vout, confirmations, order_id),
+        "UPDATE orders SET funding_txid=?, vout=?, confirmations=?, funding=? WHERE order_id=?",
+        (txid, vout, confirmations, json.dumps(funding) if funding is not None else None, order_id),
     )
-    conn.commit()
-    conn.close()
 
 
 def set_last_webhook_ts(order_id: str, ts: int):
@@ -208,8 +479,6 @@ def set_last_webhook_ts(order_id: str, ts: int):
         "UPDATE orders SET last_webhook_ts=? WHERE order_id=?",
         (ts, order_id),
     )
-    conn.commit()
-    conn.close()
 
 
 def set_payout_txid(order_id: str, txid: str):
@@ -218,58 +487,44 @@ def set_payout_txid(order_id: str, txid: str):
         "UPDATE orders SET payout_txid=? WHERE order_id=?",
         (txid, order_id),
     )
-    conn.commit()
-    conn.close()
 
 
 def start_rbf(order_id: str, psbt: str):
-    conn = get_conn()
-    cur = conn.execute("SELECT state FROM orders WHERE order_id=?", (order_id,))
-    row = cur.fetchone()
-    prev_state = row["state"] if row else None
-    conn.execute(
-        "UPDATE orders SET rbf_psbt=?, rbf_partials=NULL, partials=NULL, rbf_state=?, state='rbf_signing' WHERE order_id=?",
-        (psbt, prev_state, order_id),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.execute("SELECT state FROM orders WHERE order_id=?", (order_id,))
+        row = cur.fetchone()
+        prev_state = row["state"] if row else None
+        conn.execute(
+            "UPDATE orders SET rbf_psbt=?, rbf_merged_psbt=NULL, merged_psbt=NULL, partial_count=0, "
+            "rbf_state=?, state='rbf_signing' WHERE order_id=?",
+            (psbt, prev_state, order_id),
+        )
+        conn.execute("DELETE FROM order_partials WHERE order_id=?", (order_id,))
 
 
 def get_rbf_psbt(order_id: str) -> Optional[str]:
     conn = get_conn()
     cur = conn.execute("SELECT rbf_psbt FROM orders WHERE order_id=?", (order_id,))
     row = cur.fetchone()
-    conn.close()
     return row["rbf_psbt"] if row and row["rbf_psbt"] else None
 
 
 def clear_rbf(order_id: str):
-    conn = get_conn()
-    cur = conn.execute("SELECT rbf_state FROM orders WHERE order_id=?", (order_id,))
-    row = cur.fetchone()
-    next_state = row["rbf_state"] if row else None
-    conn.execute(
-        "UPDATE orders SET rbf_psbt=NULL, rbf_partials=NULL, rbf_state=NULL, state=? WHERE order_id=?",
-        (next_state, order_id),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.execute("SELECT rbf_state FROM orders WHERE order_id=?", (order_id,))
+        row = cur.fetchone()
+        next_state = row["rbf_state"] if row else None
+        conn.execute(
+            "UPDATE orders SET rbf_psbt=NULL, rbf_merged_psbt=NULL, rbf_state=NULL, state=? WHERE order_id=?",
+            (next_state, order_id),
+        )
+        conn.execute("DELETE FROM order_partials WHERE order_id=? AND rbf=1", (order_id,))
 
 
 def count_pending_signatures() -> int:
     conn = get_conn()
-    cur = conn.execute("SELECT partials FROM orders WHERE state='signing'")
-    rows = cur.fetchall()
-    conn.close()
-    pending = 0
-    for r in rows:
-        try:
-            parts = json.loads(r["partials"]) if r["partials"] else []
-        except Exception:
-            parts = []
-        if len(parts) < 2:
-            pending += 2 - len(parts)
-    return pending
+    cur = conn.execute("SELECT COALESCE(SUM(MAX(2 - partial_count, 0)), 0) FROM orders WHERE state='signing'")
+    return cur.fetchone()[0]
 
 
 def list_orders_by_states(states: List[str]) -> List[Dict[str, Any]]:
@@ -280,6 +535,110 @@ def list_orders_by_states(states: List[str]) -> List[Dict[str, Any]]:
         states,
     )
     rows = cur.fetchall()
-    conn.close()
     return [dict(r) for r in rows]
 
+
+def list_deadline_orders(states: List[str], since: Optional[int] = None) -> List[Dict[str, Any]]:
+    # only the columns the deadline scheduler needs; since limits it to rows written after that time
+    conn = get_conn()
+    qmarks = ",".join(["?"] * len(states))
+    params: List[Any] = list(states)
+    if since is None:
+        sql = f"SELECT order_id, state, created_at, deadline_ts FROM orders WHERE state IN ({qmarks})"
+    else:
+        # unary + keeps the planner on idx_orders_created instead of scanning every open order
+        sql = f"SELECT order_id, state, created_at, deadline_ts FROM orders WHERE +state IN ({qmarks}) AND created_at >= ?"
+        params.append(since)
+    return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+
+def acquire_leader_lease(name: str, holder: str, now: float, until: float) -> bool:
+    # take the role if it is free or expired, or renew it if we already hold it
+    conn = get_conn()
+    cur = conn.execute(
+        "INSERT INTO leader_lease(name, holder, expires_at) VALUES(?,?,?) "
+        "ON CONFLICT(name) DO UPDATE SET holder=excluded.holder, expires_at=excluded.expires_at "
+        "WHERE leader_lease.holder=excluded.holder OR leader_lease.expires_at < ?",
+        (name, holder, until, now),
+    )
+    return cur.rowcount == 1
+
+
+def release_leader_lease(name: str, holder: str):
+    conn = get_conn()
+    conn.execute("DELETE FROM leader_lease WHERE name=? AND holder=?", (name, holder))
+
+
+def list_funding_orders(seen_only: bool = False) -> List[str]:
+    # orders whose deposit the funding watcher follows; seen_only skips those without one yet
+    conn = get_conn()
+    sql = "SELECT order_id FROM orders WHERE state IN ('awaiting_deposit', 'escrow_funded')"
+    if seen_only:
+        sql += " AND funding_txid IS NOT NULL"
+    return [r["order_id"] for r in conn.execute(sql).fetchall()]
+
+
+def get_chain_cursor(name: str) -> Optional[Dict[str, Any]]:
+    conn = get_conn()
+    row = conn.execute("SELECT blockhash, height, updated_at FROM chain_cursors WHERE name=?", (name,)).fetchone()
+    return dict(row) if row else None
+
+
+def set_chain_cursor(name: str, blockhash: str, height: Optional[int]):
+    conn = get_conn()
+    conn.execute(
+        "INSERT INTO chain_cursors(name, blockhash, height, updated_at) VALUES(?,?,?,?) "
+        "ON CONFLICT(name) DO UPDATE SET blockhash=excluded.blockhash, height=excluded.height, updated_at=excluded.updated_at",
+        (name, blockhash, height, time.time()),
+    )
+
+
+def enqueue_webhook(order_id: Optional[str], event: Optional[str], body: str):
+    now = int(time.time())
+    get_conn().execute(
+        "INSERT INTO webhook_outbox(order_id, event, body, next_attempt_at, created_at) VALUES(?,?,?,?,?)",
+        (order_id, event, body, now, now),
+    )
+
+
+def claim_webhooks(limit: int, lease: int) -> List[Dict[str, Any]]:
+    # claimed rows are pushed lease seconds into the future; a crashed worker's rows come due again
+    now = int(time.time())
+    with transaction() as conn:
+        rows = conn.execute(
+            "SELECT * FROM webhook_outbox WHERE failed_at IS NULL AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        if rows:
+            ids = [r["id"] for r in rows]
+            conn.execute(
+                f"UPDATE webhook_outbox SET next_attempt_at=? WHERE id IN ({','.join(['?'] * len(ids))})",
+                [now + lease, *ids],
+            )
+    return [dict(r) for r in rows]
+
+
+def complete_webhooks(webhook_ids: List[int], order_ids: List[Optional[str]]):
+    if not webhook_ids:
+        return
+    now = int(time.time())
+    with transaction() as conn:
+        conn.executemany("DELETE FROM webhook_outbox WHERE id=?", [(i,) for i in webhook_ids])
+        conn.executemany(
+            "UPDATE orders SET last_webhook_ts=? WHERE order_id=?",
+            [(now, o) for o in dict.fromkeys(order_ids) if o],
+        )
+
+
+def retry_webhook(webhook_id: int, attempts: int, next_attempt_at: Optional[int], error: str):
+    # next_attempt_at None gives up on the row; it stays for inspection
+    now = int(time.time())
+    get_conn().execute(
+        "UPDATE webhook_outbox SET attempts=?, next_attempt_at=COALESCE(?, next_attempt_at), "
+        "failed_at=CASE WHEN ? IS NULL THEN ? END, last_error=? WHERE id=?",
+        (attempts, next_attempt_at, next_attempt_at, now, error[:500], webhook_id),
+    )
+
+
+def count_webhook_backlog() -> int:
+    return get_conn().execute("SELECT COUNT(*) FROM webhook_outbox WHERE failed_at IS NULL").fetchone()[0]
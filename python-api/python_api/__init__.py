@@ -1,12 +1,12 @@
 import db
 
 from .main import app
-from .rpc import rpc
+from .rpc import rpc, rpc_batch
 from .workers import (
     advance_state,
     woo_callback,
     update_pending_gauge,
-    _webhook_q,
+    deliver_webhooks,
     _stuck_worker,
 )
 from .routes.psbt import psbt_finalize
@@ -17,10 +17,11 @@ from .metrics import STUCK_COUNTER
 __all__ = [
     "app",
     "rpc",
+    "rpc_batch",
     "advance_state",
     "woo_callback",
     "update_pending_gauge",
-    "_webhook_q",
+    "deliver_webhooks",
     "psbt_finalize",
     "tx_broadcast",
     "log",
@@ -0,0 +1,19 @@
+from typing import Any, Awaitable, Callable
+
+from starlette.concurrency import run_in_threadpool
+
+import db
+
+
+class _AsyncDB:
+    # db.* functions are resolved on every call so monkeypatched functions are honoured
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
+        fn = getattr(db, name)
+
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(fn, *args, **kwargs)
+
+        return call
+
+
+adb = _AsyncDB()
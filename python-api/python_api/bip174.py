@@ -0,0 +1,388 @@
+import base64
+import binascii
+import hashlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+NETWORK_HRP = {
+    "main": "bc",
+    "test": "tb",
+    "testnet4": "tb",
+    "signet": "tb",
+    "regtest": "bcrt",
+}
+
+PSBT_MAGIC = b"psbt\xff"
+
+PSBT_GLOBAL_UNSIGNED_TX = 0x00
+PSBT_GLOBAL_VERSION = 0xFB
+PSBT_IN_NON_WITNESS_UTXO = 0x00
+PSBT_IN_WITNESS_UTXO = 0x01
+PSBT_IN_PARTIAL_SIG = 0x02
+PSBT_IN_SIGHASH_TYPE = 0x03
+PSBT_IN_WITNESS_SCRIPT = 0x05
+PSBT_IN_FINAL_SCRIPTSIG = 0x07
+PSBT_IN_FINAL_SCRIPTWITNESS = 0x08
+
+Pair = Tuple[memoryview, memoryview]
+
+
+class PSBTError(ValueError):
+    pass
+
+
+class _Reader:
+    __slots__ = ("buf", "pos")
+
+    def __init__(self, buf: memoryview, pos: int = 0):
+        self.buf = buf
+        self.pos = pos
+
+    def take(self, n: int) -> memoryview:
+        end = self.pos + n
+        if n < 0 or end > len(self.buf):
+            raise PSBTError("truncated psbt")
+        view = self.buf[self.pos:end]
+        self.pos = end
+        return view
+
+    def u8(self) -> int:
+        if self.pos >= len(self.buf):
+            raise PSBTError("truncated psbt")
+        self.pos += 1
+        return self.buf[self.pos - 1]
+
+    def uint(self, n: int) -> int:
+        return int.from_bytes(self.take(n), "little")
+
+    def compact(self) -> int:
+        n = self.u8()
+        if n < 0xFD:
+            return n
+        return self.uint({0xFD: 2, 0xFE: 4, 0xFF: 8}[n])
+
+    def var_bytes(self) -> memoryview:
+        return self.take(self.compact())
+
+
+def _compact(n: int) -> bytes:
+    if n < 0xFD:
+        return bytes([n])
+    if n <= 0xFFFF:
+        return b"\xfd" + n.to_bytes(2, "little")
+    if n <= 0xFFFFFFFF:
+        return b"\xfe" + n.to_bytes(4, "little")
+    return b"\xff" + n.to_bytes(8, "little")
+
+
+def parse_tx(r: _Reader) -> Dict[str, Any]:
+    version = r.uint(4)
+    # BIP-144 marker/flag; only seen in full previous txs, never in the unsigned tx
+    segwit = r.buf[r.pos:r.pos + 2].tobytes() == b"\x00\x01"
+    if segwit:
+        r.take(2)
+    vin = []
+    for _ in range(r.compact()):
+        prev = r.take(32)
+        vin.append({
+            "txid": prev.tobytes()[::-1].hex(),
+            "vout": r.uint(4),
+            "scriptSig": r.var_bytes(),
+            "sequence": r.uint(4),
+        })
+    vout = []
+    for n in range(r.compact()):
+        vout.append({"value_sat": r.uint(8), "n": n, "script": r.var_bytes()})
+    if segwit:
+        for _ in vin:
+            for _ in range(r.compact()):
+                r.var_bytes()
+    locktime = r.uint(4)
+    return {"version": version, "locktime": locktime, "vin": vin, "vout": vout}
+
+
+def _read_map(r: _Reader) -> List[Pair]:
+    # hot loop: single-byte lengths are read inline, anything larger goes through the reader
+    buf, end = r.buf, len(r.buf)
+    pairs: List[Pair] = []
+    seen = set()
+    while True:
+        if r.pos >= end:
+            raise PSBTError("truncated psbt")
+        n = buf[r.pos]
+        if n == 0:
+            r.pos += 1
+            return pairs
+        if n < 0xFD and r.pos + 1 + n < end and buf[r.pos + 1 + n] < 0xFD:
+            k0 = r.pos + 1
+            v0 = k0 + n + 1
+            v1 = v0 + buf[k0 + n]
+            if v1 > end:
+                raise PSBTError("truncated psbt")
+            key, val = buf[k0:v0 - 1], buf[v0:v1]
+            r.pos = v1
+        else:
+            key = r.var_bytes()
+            val = r.var_bytes()
+        raw = key.tobytes()
+        if raw in seen:
+            raise PSBTError("duplicate psbt key")
+        seen.add(raw)
+        pairs.append((key, val))
+
+
+class PSBT:
+    __slots__ = ("globals", "inputs", "outputs", "tx")
+
+    def __init__(self, global_map: List[Pair], inputs: List[List[Pair]], outputs: List[List[Pair]], tx: Dict[str, Any]):
+        self.globals = global_map
+        self.inputs = inputs
+        self.outputs = outputs
+        self.tx = tx
+
+    @classmethod
+    def from_base64(cls, data: str) -> "PSBT":
+        try:
+            raw = base64.b64decode(data, validate=True)
+        except (binascii.Error, ValueError, TypeError):
+            raise PSBTError("invalid base64")
+        return cls.from_bytes(raw)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "PSBT":
+        buf = memoryview(raw)
+        if buf[:5].tobytes() != PSBT_MAGIC:
+            raise PSBTError("bad psbt magic")
+        r = _Reader(buf, 5)
+        global_map = _read_map(r)
+        tx = None
+        for key, val in global_map:
+            if key[0] == PSBT_GLOBAL_VERSION and int.from_bytes(val, "little") != 0:
+                raise PSBTError("unsupported psbt version")
+            if key[0] == PSBT_GLOBAL_UNSIGNED_TX and len(key) == 1:
+                tx = parse_tx(_Reader(val))
+        if tx is None:
+            raise PSBTError("missing unsigned tx")
+        inputs = [_read_map(r) for _ in tx["vin"]]
+        outputs = [_read_map(r) for _ in tx["vout"]]
+        if r.pos != len(buf):
+            raise PSBTError("trailing data")
+        return cls(global_map, inputs, outputs, tx)
+
+    def _maps(self) -> List[List[Pair]]:
+        return [self.globals, *self.inputs, *self.outputs]
+
+    def serialize(self) -> bytes:
+        parts = [PSBT_MAGIC]
+        for m in self._maps():
+            for key, val in m:
+                parts += [_compact(len(key)), key, _compact(len(val)), val]
+            parts.append(b"\x00")
+        return b"".join(bytes(p) for p in parts)
+
+    def content_hash(self) -> str:
+        # key order inside a map carries no meaning, so hash each map sorted by key
+        h = hashlib.sha256()
+        for m in self._maps():
+            for key, val in sorted(m, key=lambda kv: kv[0].tobytes()):
+                h.update(_compact(len(key)) + key.tobytes() + _compact(len(val)) + val.tobytes())
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def unsigned_tx(self) -> bytes:
+        for key, val in self.globals:
+            if key[0] == PSBT_GLOBAL_UNSIGNED_TX and len(key) == 1:
+                return val.tobytes()
+        raise PSBTError("missing unsigned tx")
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.serialize()).decode()
+
+    def partial_signatures(self, i: int) -> Dict[str, str]:
+        return {
+            key[1:].hex(): val.hex()
+            for key, val in self.inputs[i]
+            if key[0] == PSBT_IN_PARTIAL_SIG
+        }
+
+    def input_value(self, i: int) -> Optional[int]:
+        for key, val in self.inputs[i]:
+            if key[0] == PSBT_IN_WITNESS_UTXO:
+                return int.from_bytes(val[:8], "little")
+        for key, val in self.inputs[i]:
+            if key[0] == PSBT_IN_NON_WITNESS_UTXO:
+                prev = parse_tx(_Reader(val))
+                n = self.tx["vin"][i]["vout"]
+                if n < len(prev["vout"]):
+                    return prev["vout"][n]["value_sat"]
+        return None
+
+    def decode(self, hrp: str) -> Dict[str, Any]:
+        # mirrors the subset of Core's decodepsbt output the API relies on
+        vout = []
+        for o in self.tx["vout"]:
+            vout.append({
+                "value": o["value_sat"] / 1e8,
+                "n": o["n"],
+                "scriptPubKey": _script_pubkey(o["script"], hrp),
+            })
+        inputs = []
+        in_total: Optional[int] = 0
+        for i in range(len(self.tx["vin"])):
+            entry: Dict[str, Any] = {}
+            for key, val in self.inputs[i]:
+                if key[0] == PSBT_IN_WITNESS_UTXO:
+                    r = _Reader(val)
+                    amount = r.uint(8)
+                    entry["witness_utxo"] = {"amount": amount / 1e8, "scriptPubKey": _script_pubkey(r.var_bytes(), hrp)}
+                elif key[0] == PSBT_IN_WITNESS_SCRIPT:
+                    entry["witness_script"] = {"hex": val.hex()}
+                elif key[0] == PSBT_IN_FINAL_SCRIPTWITNESS:
+                    r = _Reader(val)
+                    entry["final_scriptwitness"] = [r.var_bytes().hex() for _ in range(r.compact())]
+            sigs = self.partial_signatures(i)
+            if sigs:
+                entry["partial_signatures"] = sigs
+            value = self.input_value(i)
+            in_total = in_total + value if in_total is not None and value is not None else None
+            inputs.append(entry)
+        res: Dict[str, Any] = {
+            "tx": {
+                "version": self.tx["version"],
+                "locktime": self.tx["locktime"],
+                "vin": [
+                    {"txid": v["txid"], "vout": v["vout"], "scriptSig": {"hex": v["scriptSig"].hex()}, "sequence": v["sequence"]}
+                    for v in self.tx["vin"]
+                ],
+                "vout": vout,
+            },
+            "inputs": inputs,
+            "outputs": [{} for _ in self.outputs],
+        }
+        if in_total is not None:
+            res["fee"] = (in_total - sum(o["value_sat"] for o in self.tx["vout"])) / 1e8
+        return res
+
+
+def decode_psbt(data: str, hrp: str) -> Dict[str, Any]:
+    return PSBT.from_base64(data).decode(hrp)
+
+
+def _merge_map(base: List[Pair], other: List[Pair]) -> List[Pair]:
+    keys = {key.tobytes() for key, _ in base}
+    extra = [(key, val) for key, val in other if key.tobytes() not in keys]
+    return base + extra if extra else base
+
+
+def combine(psbts: Sequence[PSBT]) -> PSBT:
+    # BIP-174 combiner: union of all key/value pairs per map, first value wins on conflicts
+    if not psbts:
+        raise PSBTError("nothing to combine")
+    base = psbts[0]
+    tx = base.unsigned_tx()
+    global_map, inputs, outputs = base.globals, list(base.inputs), list(base.outputs)
+    for other in psbts[1:]:
+        if other.unsigned_tx() != tx:
+            raise PSBTError("psbts spend different transactions")
+        global_map = _merge_map(global_map, other.globals)
+        inputs = [_merge_map(a, b) for a, b in zip(inputs, other.inputs)]
+        outputs = [_merge_map(a, b) for a, b in zip(outputs, other.outputs)]
+    return PSBT(global_map, inputs, outputs, base.tx)
+
+
+def combine_psbts(data: Sequence[str]) -> str:
+    return combine([PSBT.from_base64(d) for d in data]).to_base64()
+
+
+def psbt_hash(data: str) -> str:
+    # identical partials dedupe even when re-encoded or with reordered keys;
+    # strings the parser rejects fall back to hashing the text itself
+    try:
+        return PSBT.from_base64(data).content_hash()
+    except PSBTError:
+        return hashlib.sha256(data.strip().encode()).hexdigest()
+
+
+# ---- bech32 / bech32m (BIP-173, BIP-350) ----
+
+_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+_BECH32M_CONST = 0x2BC830A3
+
+
+def _polymod(values: List[int]) -> int:
+    gen = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+    chk = 1
+    for v in values:
+        top = chk >> 25
+        chk = (chk & 0x1FFFFFF) << 5 ^ v
+        for i in range(5):
+            chk ^= gen[i] if ((top >> i) & 1) else 0
+    return chk
+
+
+def _convertbits(data: memoryview, frombits: int, tobits: int) -> List[int]:
+    acc = bits = 0
+    ret = []
+    maxv = (1 << tobits) - 1
+    for value in data:
+        acc = (acc << frombits) | value
+        bits += frombits
+        while bits >= tobits:
+            bits -= tobits
+            ret.append((acc >> bits) & maxv)
+    if bits:
+        ret.append((acc << (tobits - bits)) & maxv)
+    return ret
+
+
+def segwit_address(hrp: str, version: int, program: memoryview) -> str:
+    data = [version] + _convertbits(program, 8, 5)
+    const = 1 if version == 0 else _BECH32M_CONST
+    values = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp] + data
+    mod = _polymod(values + [0] * 6) ^ const
+    checksum = [(mod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(_CHARSET[d] for d in data + checksum)
+
+
+def decode_segwit_address(address: str) -> Tuple[str, int, bytes]:
+    # (hrp, witness version, program); anything that is not a valid segwit address raises
+    addr = address.lower()
+    hrp, sep, data = addr.rpartition("1")
+    if address not in (addr, address.upper()) or not hrp or len(data) < 8 or any(c not in _CHARSET for c in data):
+        raise PSBTError("not a segwit address")
+    values = [_CHARSET.index(c) for c in data]
+    version = values[0]
+    expanded = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+    if _polymod(expanded + values) != (1 if version == 0 else _BECH32M_CONST):
+        raise PSBTError("bad address checksum")
+    num = 0
+    for v in values[1:-6]:
+        num = num << 5 | v
+    bits = 5 * (len(values) - 7)
+    pad = bits % 8
+    if pad >= 5 or num & ((1 << pad) - 1):
+        raise PSBTError("bad address padding")
+    program = (num >> pad).to_bytes(bits // 8, "big")
+    if version > 16 or not 2 <= len(program) <= 40 or (version == 0 and len(program) not in (20, 32)):
+        raise PSBTError("bad witness program")
+    return hrp, version, program
+
+
+_SCRIPT_TYPES = {(0, 22): "witness_v0_keyhash", (0, 34): "witness_v0_scripthash", (1, 34): "witness_v1_taproot"}
+
+
+@lru_cache(maxsize=4096)
+def _address(script: bytes, hrp: str) -> Tuple[str, str]:
+    # every input of an escrow spend pays the same few scripts; encode each once
+    n = len(script)
+    if n < 4 or n > 42 or script[1] != n - 2 or not (script[0] == 0 or 0x51 <= script[0] <= 0x60):
+        # legacy or non-standard scripts are left to Core
+        raise PSBTError("non-segwit output script")
+    version = 0 if script[0] == 0 else script[0] - 0x50
+    return segwit_address(hrp, version, memoryview(script)[2:]), _SCRIPT_TYPES.get((version, n), "witness_unknown")
+
+
+def _script_pubkey(script: memoryview, hrp: str) -> Dict[str, Any]:
+    raw = script.tobytes()
+    addr, kind = _address(raw, hrp)
+    return {"hex": raw.hex(), "address": addr, "addresses": [addr], "type": kind}
@@ -10,6 +10,14 @@ BTC_CORE_URL     = os.getenv("BTC_CORE_URL", "http://127.0.0.1:8332/")
 BTC_CORE_USER    = os.getenv("BTC_CORE_USER", "")
 BTC_CORE_PASS    = os.getenv("BTC_CORE_PASS", "")
 BTC_CORE_WALLET  = os.getenv("BTC_CORE_WALLET", "escrowwatch")
+# main|test|testnet4|signet|regtest; empty = ask Core once (getblockchaininfo)
+BTC_NETWORK      = os.getenv("BTC_NETWORK", "")
+RPC_POOL_SIZE    = int(os.getenv("RPC_POOL_SIZE", "16"))
+RPC_TIMEOUT      = float(os.getenv("RPC_TIMEOUT", "25"))
+FINALIZE_RPC_BATCH   = int(os.getenv("FINALIZE_RPC_BATCH", "50"))
+FINALIZE_CONCURRENCY = int(os.getenv("FINALIZE_CONCURRENCY", "4"))
+# also run Core's combinepsbt on every merge and compare with the local result
+PSBT_COMBINE_CHECK = os.getenv("PSBT_COMBINE_CHECK", "0").lower() in ("1", "true", "yes")
 API_KEYS         = {k.strip() for k in os.getenv("API_KEYS", "").split(",") if k.strip()}
 API_KEY_REVOKED  = {k.strip() for k in os.getenv("API_KEY_REVOKED", "").split(",") if k.strip()}
 
@@ -21,10 +29,60 @@ WOO_CALLBACK_URL = os.getenv("WOO_CALLBACK_URL", "")
 WOO_HMAC_SECRET  = os.getenv("WOO_HMAC_SECRET", "")
 WEBHOOK_RETRIES  = int(os.getenv("WEBHOOK_RETRIES", "3"))
 WEBHOOK_BACKOFF  = float(os.getenv("WEBHOOK_BACKOFF", "2"))
+WEBHOOK_TIMEOUT  = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+WEBHOOK_BATCH    = int(os.getenv("WEBHOOK_BATCH", "50"))
+WEBHOOK_POLL     = float(os.getenv("WEBHOOK_POLL", "1"))
+WEBHOOK_LEASE    = int(os.getenv("WEBHOOK_LEASE", "60"))
+WEBHOOK_WORKERS  = int(os.getenv("WEBHOOK_WORKERS", "8"))
+# batch mode: events gathered for WEBHOOK_BATCH_WINDOW seconds go out as one JSON array
+WEBHOOK_BATCH_MODE   = os.getenv("WEBHOOK_BATCH_MODE", "0").lower() in ("1", "true", "yes")
+WEBHOOK_BATCH_WINDOW = float(os.getenv("WEBHOOK_BATCH_WINDOW", "0.5"))
+WEBHOOK_BATCH_MAX    = int(os.getenv("WEBHOOK_BATCH_MAX", "100"))
+WOO_CALLBACK_BATCH_URL = os.getenv("WOO_CALLBACK_BATCH_URL", "") or (
+    WOO_CALLBACK_URL.rstrip("/") + "/batch" if WOO_CALLBACK_URL else ""
+)
 STUCK_ORDER_HOURS = int(os.getenv("STUCK_ORDER_HOURS", "24"))
 STUCK_CHECK_INTERVAL = int(os.getenv("STUCK_CHECK_INTERVAL", "600"))
 SIGNING_DEADLINE_DAYS = int(os.getenv("SIGNING_DEADLINE_DAYS", "7"))
+# parallel deadline escalation; the lease must outlive the per-order timeout
+DEADLINE_WORKERS = int(os.getenv("DEADLINE_WORKERS", "4"))
+DEADLINE_TIMEOUT = int(os.getenv("DEADLINE_TIMEOUT", "120"))
+DEADLINE_LEASE = int(os.getenv("DEADLINE_LEASE", "300"))
+# singleton workers run in the process holding the leader lease; renewed every LEADER_TTL / 3
+LEADER_TTL = float(os.getenv("LEADER_TTL", "10"))
+# funding watcher poll in seconds (0 disables it); /status reads the database while
+# the watcher's cursor is younger than FUNDING_STALE seconds
+FUNDING_POLL = float(os.getenv("FUNDING_POLL", "2"))
+FUNDING_STALE = float(os.getenv("FUNDING_STALE", "30"))
+# computed /status answers per order while the chain tip and wallet are unchanged
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "10000"))
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "10"))
+# estimatesmartfee results are reused until the next block, and never longer than this
+FEE_CACHE_TTL = float(os.getenv("FEE_CACHE_TTL", "300"))
+# order stream: re-read subscribed orders every STREAM_POLL seconds to catch changes
+# made by other processes; idle connections get a keep-alive comment every STREAM_PING
+STREAM_POLL = float(os.getenv("STREAM_POLL", "2"))
+STREAM_PING = float(os.getenv("STREAM_PING", "15"))
+STREAM_MAX_ORDERS = int(os.getenv("STREAM_MAX_ORDERS", "200"))
+# pending_signatures moves by per-order deltas; a full recount every this many seconds fixes drift
+PENDING_RECONCILE = float(os.getenv("PENDING_RECONCILE", "60"))
+# token bucket per API key shared by all processes: capacity N, refilled at N per period;
+# routes declare how many tokens a call costs (python_api.ratelimit.cost)
 RATE_LIMIT = os.getenv("RATE_LIMIT", "100/minute")
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB") or "{0}-ratelimit{1}".format(
+    *os.path.splitext(os.getenv("ORDERS_DB", "orders.sqlite"))
+)
+UTXO_INDEX_POLL = float(os.getenv("UTXO_INDEX_POLL", "2"))
+UTXO_INDEX_REBUILD = int(os.getenv("UTXO_INDEX_REBUILD", "3600"))
+# log records are rendered and written by a background thread; 0 writes on the calling thread
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# longer strings are cut and tagged with a hash of the full value (base64 PSBTs in rpc params)
+LOG_MAX_FIELD = int(os.getenv("LOG_MAX_FIELD", "256"))
+# event=rate pairs, e.g. "rpc_start=0.1,rpc_success=0.1"; unlisted events are always kept
+LOG_SAMPLE = {
+    k.strip(): float(v)
+    for k, v in (item.split("=", 1) for item in os.getenv("LOG_SAMPLE", "").split(",") if "=" in item)
+}
 
 # ---- State machine ----
 STATES = [
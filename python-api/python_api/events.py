@@ -0,0 +1,165 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from .adb import adb
+from .config import STREAM_POLL, STREAM_PING
+from .logging import log
+from .metrics import STREAM_SUBSCRIBERS
+from .models import StatusRes
+
+
+def status_from_row(row: Optional[Dict[str, Any]]) -> StatusRes:
+    # StatusRes as last recorded in the database; unknown orders read as awaiting_deposit
+    if not row:
+        return StatusRes(state="awaiting_deposit")
+    funding = json.loads(row["funding"]) if row.get("funding") else None
+    return StatusRes(
+        funding=funding,
+        state=row["state"],
+        deadline_ts=row.get("deadline_ts"),
+        fee_est_sat=row.get("fee_est_sat"),
+    )
+
+
+class _Subscriber:
+    __slots__ = ("order_ids", "pending", "wake")
+
+    def __init__(self, order_ids: List[str]):
+        self.order_ids = order_ids
+        # everything is pending at first so the stream opens with a full snapshot
+        self.pending: Set[str] = set(order_ids)
+        self.wake = asyncio.Event()
+        self.wake.set()
+
+
+# In-process fan-out of order status changes to stream subscribers. Writers call
+# publish() from any thread; the event loop re-reads the changed orders once per
+# burst and wakes only the subscribers of orders whose row actually changed, so
+# an idle subscriber costs one Event and a few set entries. Changes made by other
+# processes are picked up by re-reading every subscribed order each `poll` seconds.
+class OrderEvents:
+    def __init__(self, poll: float = STREAM_POLL, ping: float = STREAM_PING):
+        self.poll = poll
+        self.ping = ping
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subs: Dict[str, Set[_Subscriber]] = {}
+        self._rows: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._dirty: Set[str] = set()
+        self._refreshing = False
+        self._poller: Optional[asyncio.Task] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def publish(self, order_id: str):
+        loop = self._loop
+        if loop is None or loop.is_closed() or order_id not in self._subs:
+            return
+        try:
+            loop.call_soon_threadsafe(self._mark, order_id)
+        except RuntimeError:
+            # loop shut down between the check and the call
+            pass
+
+    def _mark(self, order_id: str):
+        self._dirty.add(order_id)
+        if not self._refreshing:
+            self._refreshing = True
+            asyncio.ensure_future(self._refresh_dirty())
+
+    async def _refresh_dirty(self):
+        try:
+            while self._dirty:
+                order_ids = list(self._dirty)
+                self._dirty.clear()
+                await self.refresh(order_ids)
+        except Exception as e:
+            log.error("order_stream_refresh_failed", error=str(e))
+        finally:
+            self._refreshing = False
+
+    async def refresh(self, order_ids: List[str]):
+        order_ids = [o for o in order_ids if o in self._subs]
+        if not order_ids:
+            return
+        rows = await adb.get_status_rows(order_ids)
+        for oid in order_ids:
+            row = rows.get(oid)
+            if oid not in self._subs or (oid in self._rows and self._rows[oid] == row):
+                continue
+            self._rows[oid] = row
+            for sub in self._subs[oid]:
+                sub.pending.add(oid)
+                sub.wake.set()
+
+    async def _poll_loop(self):
+        try:
+            while self._subs:
+                await asyncio.sleep(self.poll)
+                try:
+                    await self.refresh(list(self._subs))
+                except Exception as e:
+                    log.error("order_stream_refresh_failed", error=str(e))
+        finally:
+            self._poller = None
+
+    async def subscribe(self, order_ids: List[str]) -> _Subscriber:
+        sub = _Subscriber(order_ids)
+        for oid in order_ids:
+            self._subs.setdefault(oid, set()).add(sub)
+        STREAM_SUBSCRIBERS.inc()
+        try:
+            await self.refresh([o for o in order_ids if o not in self._rows])
+        except BaseException:
+            self.unsubscribe(sub)
+            raise
+        if self.poll > 0 and self._poller is None:
+            self._poller = asyncio.ensure_future(self._poll_loop())
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber):
+        for oid in sub.order_ids:
+            subs = self._subs.get(oid)
+            if subs is None:
+                continue
+            subs.discard(sub)
+            if not subs:
+                del self._subs[oid]
+                self._rows.pop(oid, None)
+        STREAM_SUBSCRIBERS.dec()
+
+    async def stream(
+        self,
+        order_ids: List[str],
+        disconnected: Callable[[], Awaitable[bool]],
+    ) -> AsyncIterator[str]:
+        # text/event-stream: one `status` event per order carrying the StatusRes
+        # fields that changed since the last event for it (all of them at first)
+        sub = await self.subscribe(order_ids)
+        sent: Dict[str, Dict[str, Any]] = {}
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(sub.wake.wait(), self.ping)
+                except asyncio.TimeoutError:
+                    if await disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                sub.wake.clear()
+                pending, sub.pending = sub.pending, set()
+                for oid in sorted(pending):
+                    status = status_from_row(self._rows.get(oid)).model_dump()
+                    prev = sent.get(oid)
+                    delta = {k: v for k, v in status.items() if prev is None or prev.get(k) != v}
+                    if not delta:
+                        continue
+                    sent[oid] = status
+                    delta["order_id"] = oid
+                    yield f"event: status\ndata: {json.dumps(delta, separators=(',', ':'))}\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+
+order_events = OrderEvents()
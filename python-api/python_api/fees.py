@@ -0,0 +1,74 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .config import FEE_CACHE_TTL
+from .metrics import FEE_CACHE, FEE_RATE_AGE
+from .status_cache import status_cache
+
+Batch = Callable[[List], Awaitable[List[Any]]]
+
+
+# estimatesmartfee results per conf target, in sat/vB. Estimates only move when a
+# block arrives, so an entry is reused until the best block changes (seen through
+# the shared chain tag) or FEE_CACHE_TTL passes; concurrent misses for one target
+# share a single RPC. None means Core had no estimate and callers fall back to
+# conf_target.
+class FeeRates:
+    def __init__(self, ttl: float = FEE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[str, float, Optional[float]]] = {}
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+    def age(self, target: int) -> float:
+        entry = self._entries.get(target)
+        return time.time() - entry[1] if entry else 0.0
+
+    async def get(self, target: int, batch: Batch) -> Optional[float]:
+        best = (await status_cache.chain_tag(batch))[0]
+        entry = self._entries.get(target)
+        if entry is not None and entry[0] == best and time.time() - entry[1] < self.ttl:
+            FEE_CACHE.labels(result="hit").inc()
+            return entry[2]
+        FEE_CACHE.labels(result="miss").inc()
+        fut = self._inflight.get(target)
+        if fut is None:
+            fut = asyncio.ensure_future(self._fetch(target, best, batch))
+            self._inflight[target] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(target, None))
+        return await asyncio.shield(fut)
+
+    async def _fetch(self, target: int, best: str, batch: Batch) -> Optional[float]:
+        (res,) = await batch([("estimatesmartfee", [target])])
+        feerate = res.get("feerate") if isinstance(res, dict) else None
+        # BTC/kvB -> sat/vB, the unit walletcreatefundedpsbt's fee_rate takes
+        rate = round(feerate * 1e5, 3) if feerate else None
+        if target not in self._entries:
+            FEE_RATE_AGE.labels(target=str(target)).set_function(lambda: self.age(target))
+        self._entries[target] = (best, time.time(), rate)
+        return rate
+
+    def clear(self):
+        self._entries.clear()
+
+
+fee_rates = FeeRates()
+
+
+async def funding_opts(rbf: bool, target_conf: int, batch: Batch) -> Dict[str, Any]:
+    # walletcreatefundedpsbt options for the escrow spends: the cached estimate as an
+    # explicit fee_rate, so quotes and builds within one block agree
+    opts: Dict[str, Any] = {
+        "includeWatching": True,
+        "replaceable": rbf,
+        "subtractFeeFromOutputs": [0],
+    }
+    try:
+        rate = await fee_rates.get(target_conf, batch)
+    except Exception:
+        rate = None  # without an estimate the wallet estimates for conf_target itself
+    if rate:
+        opts["fee_rate"] = rate
+    else:
+        opts["conf_target"] = target_conf
+    return opts
@@ -0,0 +1,99 @@
+import threading
+import time
+from typing import Iterable, List, Optional, Set
+
+import db
+
+from .config import FUNDING_POLL, FUNDING_STALE
+from .logging import log
+from .rpc import rpc_batch, find_utxos_for_labels
+
+CURSOR = "funding"
+LABEL_PREFIX = "escrow:"
+_CHUNK = 100
+
+
+def funding_watcher_live() -> bool:
+    # /status may answer from the database while the watcher keeps its cursor fresh
+    if FUNDING_POLL <= 0:
+        return False
+    cursor = db.get_chain_cursor(CURSOR)
+    return cursor is not None and time.time() - cursor["updated_at"] < FUNDING_STALE
+
+
+# Follows the wallet with listsinceblock from a cursor kept in the database, so
+# deposits advance orders to escrow_funded (and fire the webhook) without anyone
+# polling /status. Orders touched by new receives are re-evaluated right away; every
+# order with a known deposit is re-evaluated once per new block for its confirmations.
+# Mempool transactions are relisted on every poll and only evaluated once per tip.
+class FundingWatcher:
+    def __init__(self, poll: float = FUNDING_POLL):
+        self.poll = poll
+        self._tip: Optional[int] = None
+        self._seen: Set[str] = set()
+        self._stop = threading.Event()
+
+    def _evaluate(self, order_ids: Iterable[str]) -> Set[str]:
+        # the /status logic, batched; returns the funding txids it found
+        from .routes.orders import _status_batch
+
+        found: Set[str] = set()
+        ids = list(order_ids)
+        for i in range(0, len(ids), _CHUNK):
+            metas = db.get_orders(ids[i:i + _CHUNK])
+            metas = {o: m for o, m in metas.items() if m.get("state") in ("awaiting_deposit", "escrow_funded")}
+            if not metas:
+                continue
+            buckets = find_utxos_for_labels([m["label"] for m in metas.values()], 0)
+            txids = list(dict.fromkeys(u["txid"] for utxos in buckets.values() for u in utxos))
+            txs = dict(zip(txids, rpc_batch([("gettransaction", [t]) for t in txids]))) if txids else {}
+            res = _status_batch(list(metas), metas, buckets, txs)
+            for oid, err in res.errors.items():
+                log.error("funding_watch_failed", order_id=oid, error=err)
+            found.update(txids)
+        return found
+
+    def step(self):
+        cursor = db.get_chain_cursor(CURSOR)
+        if cursor is None:
+            # first run: catch up on every open order, then follow from the current tip
+            tip, best = rpc_batch([("getblockcount", []), ("getbestblockhash", [])])
+            self._evaluate(db.list_funding_orders())
+            db.set_chain_cursor(CURSOR, best, int(tip))
+            self._tip = int(tip)
+            return
+        tip, since = rpc_batch([
+            ("getblockcount", []),
+            ("listsinceblock", [cursor["blockhash"], 1, True, True]),
+        ])
+        tip = int(tip)
+        order_ids: Set[str] = set()
+        if tip != self._tip:
+            self._tip = tip
+            self._seen.clear()
+            order_ids.update(db.list_funding_orders(seen_only=True))
+        mempool: List[str] = []
+        for t in since.get("transactions", []) + since.get("removed", []):
+            label = t.get("label") or ""
+            if t.get("category") != "receive" or not label.startswith(LABEL_PREFIX) or t.get("txid") in self._seen:
+                continue
+            order_ids.add(label[len(LABEL_PREFIX):])
+            if not t.get("confirmations"):
+                mempool.append(t["txid"])
+        if since.get("removed"):
+            log.warning("funding_watch_reorg", cursor=cursor["blockhash"], removed=len(since["removed"]))
+        if order_ids:
+            found = self._evaluate(sorted(order_ids))
+            self._seen.update(t for t in mempool if t in found)
+        db.set_chain_cursor(CURSOR, since.get("lastblock") or cursor["blockhash"], tip)
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                log.error("funding_watch_error", error=str(e))
+            self._stop.wait(self.poll)
@@ -0,0 +1,80 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+import db
+
+from .config import LEADER_TTL
+from .logging import log
+from .metrics import WORKER_LEADER
+
+
+# Lease-based leader election over a row in the shared SQLite database. Every
+# API process runs one; the holder renews every ttl / 3 seconds and the others
+# try to take over at the same pace, so a crashed leader is replaced within
+# about 1.3 * ttl and a clean shutdown (which releases the row) within ttl / 3.
+class LeaderElection:
+    def __init__(
+        self,
+        name: str,
+        on_elected: Callable[[], None],
+        on_deposed: Callable[[], None],
+        ttl: float = LEADER_TTL,
+    ):
+        self.name = name
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl = ttl
+        self.is_leader = False
+        self._on_elected = on_elected
+        self._on_deposed = on_deposed
+        self._expires = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _set_leader(self, leader: bool):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        WORKER_LEADER.set(1 if leader else 0)
+        log.info("leader_elected" if leader else "leader_deposed", role=self.name, holder=self.holder)
+        try:
+            (self._on_elected if leader else self._on_deposed)()
+        except Exception as e:
+            log.error("leader_callback_error", role=self.name, error=str(e))
+
+    def step(self) -> bool:
+        now = time.time()
+        try:
+            held = db.acquire_leader_lease(self.name, self.holder, now, now + self.ttl)
+        except Exception as e:
+            # a busy database does not cost the role until our lease would have lapsed
+            log.error("leader_lease_error", role=self.name, error=str(e))
+            held = self.is_leader and now < self._expires
+        else:
+            if held:
+                self._expires = now + self.ttl
+        self._set_leader(held)
+        return held
+
+    def run(self):
+        while not self._stop.is_set():
+            self.step()
+            self._stop.wait(self.ttl / 3)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.ttl)
+        if self.is_leader:
+            self._set_leader(False)
+            try:
+                db.release_leader_lease(self.name, self.holder)
+            except Exception as e:
+                log.error("leader_lease_error", role=self.name, error=str(e))
@@ -1,21 +1,141 @@
 import sys
+import atexit
+import hashlib
+import json
 import logging
+import queue
+import random
+import threading
 import time
 import uuid
 from contextvars import ContextVar
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
 
 import structlog
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from .config import LOG_QUEUE_SIZE, LOG_MAX_FIELD, LOG_SAMPLE
+from .metrics import LOG_DROPPED
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional, json is the fallback
+    orjson = None
+
+_WRITE_BATCH = 512
+_KEEP_CHARS = 64
+
+
+def _shorten(value: Any, depth: int = 0) -> Any:
+    if isinstance(value, str):
+        if LOG_MAX_FIELD <= 0 or len(value) <= LOG_MAX_FIELD:
+            return value
+        digest = hashlib.sha256(value.encode()).hexdigest()[:16]
+        return f"{value[:_KEEP_CHARS]}...[{len(value)} chars sha256:{digest}]"
+    if depth < 3:
+        if isinstance(value, (list, tuple)):
+            return [_shorten(v, depth + 1) for v in value]
+        if isinstance(value, dict):
+            return {k: _shorten(v, depth + 1) for k, v in value.items()}
+    return value
+
+
+def _render(event: Dict[str, Any]) -> str:
+    out = {k: _shorten(v) for k, v in event.items()}
+    out["timestamp"] = datetime.fromtimestamp(event["timestamp"], timezone.utc).isoformat().replace("+00:00", "Z")
+    if orjson is not None:
+        try:
+            return orjson.dumps(out, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits
+    return json.dumps(out, default=str, separators=(",", ":"))
+
+
+# Renders and writes log records on a background thread so request threads only
+# pay for a queue put. The queue is bounded: when stdout cannot keep up, records
+# are dropped and counted rather than blocking requests. With maxsize 0 records
+# are written on the calling thread.
+class LogWriter:
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE):
+        self._queue: Optional[queue.Queue] = queue.Queue(maxsize) if maxsize > 0 else None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def put(self, event: Dict[str, Any]):
+        if self._queue is None:
+            self._write([event])
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+    def _write(self, events: List[Dict[str, Any]]):
+        lines = "".join(_render(e) + "\n" for e in events)
+        with self._lock:
+            sys.stdout.write(lines)
+            sys.stdout.flush()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < _WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            events = [e for e in batch if e is not None]
+            if events:
+                try:
+                    self._write(events)
+                except Exception:
+                    pass  # stdout closed; nothing left to report to
+            if len(events) < len(batch):
+                return
+
+    def flush(self, timeout: float = 5.0):
+        # writes everything queued so far; the next record starts a new writer
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+def _sample(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    # warnings and errors are never sampled
+    rate = LOG_SAMPLE.get(event_dict.get("event"))
+    if rate is not None and method_name in ("debug", "info") and random.random() >= rate:
+        raise structlog.DropEvent
+    return event_dict
+
+
+def _enqueue(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    event_dict["timestamp"] = time.time()
+    _writer.put(event_dict)
+    raise structlog.DropEvent
+
+
+_writer = LogWriter()
+atexit.register(_writer.flush)
 
 logging.basicConfig(stream=sys.stdout, format="%(message)s", level=logging.INFO)
 structlog.configure(
     processors=[
-        structlog.processors.TimeStamper(fmt="iso"),
+        structlog.stdlib.filter_by_level,
+        _sample,
         structlog.processors.add_log_level,
-        structlog.processors.JSONRenderer(),
+        _enqueue,
     ],
     logger_factory=structlog.stdlib.LoggerFactory(),
 )
@@ -26,27 +146,46 @@ order_id_var: ContextVar[Optional[str]] = ContextVar("order_id", default=None)
 actor_var: ContextVar[Optional[str]] = ContextVar("actor", default=None)
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        req_id_var.set(request_id)
-        actor = request.headers.get("X-Actor")
-        if actor:
-            actor_var.set(actor)
-        start = time.time()
-        response = await call_next(request)
-        duration = time.time() - start
-        log.info(
-            "request",
-            request_id=request_id,
-            method=request.method,
-            path=str(request.url.path),
-            status=response.status_code,
-            duration=duration,
-            order_id=order_id_var.get(),
-            actor=actor_var.get(),
+# Plain ASGI rather than BaseHTTPMiddleware: the route runs in this task, so no
+# extra task or response stream per request, and context variables set by the
+# route are visible here afterwards.
+class LoggingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        request_id = headers.get("x-request-id") or str(uuid.uuid4())
+        tokens = (
+            req_id_var.set(request_id),
+            order_id_var.set(None),
+            actor_var.set(headers.get("x-actor")),
         )
-        order_id_var.set(None)
-        actor_var.set(None)
-        req_id_var.set(None)
-        return response
+        status = 500
+
+        async def send_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.time()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            log.info(
+                "request",
+                request_id=request_id,
+                method=scope["method"],
+                path=scope["path"],
+                status=status,
+                duration=time.time() - start,
+                # a BaseHTTPMiddleware further in runs the route in its own task
+                order_id=order_id_var.get() or scope.get("path_params", {}).get("order_id"),
+                actor=actor_var.get(),
+            )
+            for var, token in zip((req_id_var, order_id_var, actor_var), tokens):
+                var.reset(token)
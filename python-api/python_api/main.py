@@ -1,31 +1,35 @@
+import asyncio
 import threading
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
 
 import db
 from .config import (
     ALLOW_ORIGINS,
-    RATE_LIMIT,
-    WOO_CALLBACK_URL,
-    WOO_HMAC_SECRET,
+    UTXO_INDEX_POLL,
+    PENDING_RECONCILE,
 )
-from .workers import update_pending_gauge, _webhook_worker, _stuck_worker
+from . import workers
+from .workers import (
+    update_pending_gauge,
+    start_singleton_workers,
+    stop_singleton_workers,
+    _pending_reconciler,
+    _utxo_watcher,
+)
+from .leader import LeaderElection
+from .events import order_events
+from .rpc import aclose as aclose_rpc
 from .logging import LoggingMiddleware
+from .ratelimit import rate_limit
 from .routes import orders, psbt, admin
 
 
-def _rate_limit_key(request: Request) -> str:
-    return request.headers.get("x-api-key") or get_remote_address(request)
-
-
 db.init_db()
 update_pending_gauge()
 
-app = FastAPI(title="Escrow API (2-of-3 P2WSH, PSBT)")
+app = FastAPI(title="Escrow API (2-of-3 P2WSH, PSBT)", dependencies=[Depends(rate_limit)])
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOW_ORIGINS,
@@ -33,18 +37,27 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-limiter = Limiter(key_func=_rate_limit_key, default_limits=[RATE_LIMIT])
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-app.add_middleware(SlowAPIMiddleware)
 app.add_middleware(LoggingMiddleware)
 
+# webhook delivery and deadline escalation run in one process however many are started
+leader = LeaderElection("workers", start_singleton_workers, stop_singleton_workers)
+
 
 @app.on_event("startup")
-def _startup_worker():
-    if WOO_CALLBACK_URL and WOO_HMAC_SECRET:
-        threading.Thread(target=_webhook_worker, daemon=True).start()
-    threading.Thread(target=_stuck_worker, daemon=True).start()
+async def _startup_worker():
+    workers._loop = asyncio.get_running_loop()
+    order_events.bind(workers._loop)
+    leader.start()
+    if UTXO_INDEX_POLL > 0:
+        threading.Thread(target=_utxo_watcher, daemon=True).start()
+    if PENDING_RECONCILE > 0:
+        threading.Thread(target=_pending_reconciler, daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def _shutdown_rpc():
+    await run_in_threadpool(leader.stop)
+    await aclose_rpc()
 
 
 app.include_router(admin.router)
@@ -26,7 +26,55 @@ BROADCAST_FAIL = _metric(
     'broadcast_fail_total',
     lambda: Counter('broadcast_fail_total', 'Failed transaction broadcasts')
 )
+WEBHOOK_LATENCY = _metric(
+    'webhook_attempt_seconds',
+    lambda: Histogram('webhook_attempt_seconds', 'Webhook delivery attempt duration', ['status'])
+)
 WEBHOOK_QUEUE_SIZE = _metric(
     'webhook_queue_size',
     lambda: Gauge('webhook_queue_size', 'Pending webhooks in queue')
 )
+DEADLINE_ESCALATIONS = _metric(
+    'deadline_escalations_total',
+    lambda: Counter('deadline_escalations_total', 'Deadline escalation attempts', ['result'])
+)
+DEADLINE_QUEUE = _metric(
+    'deadline_queue_size',
+    lambda: Gauge('deadline_queue_size', 'Deadline escalations queued or running')
+)
+WORKER_LEADER = _metric(
+    'worker_leader',
+    lambda: Gauge('worker_leader', 'Whether this process runs the singleton background workers')
+)
+STATUS_CACHE = _metric(
+    'status_cache_total',
+    lambda: Counter('status_cache_total', 'Order status cache lookups', ['result'])
+)
+FEE_CACHE = _metric(
+    'fee_rate_cache_total',
+    lambda: Counter('fee_rate_cache_total', 'Fee rate cache lookups', ['result'])
+)
+FEE_RATE_AGE = _metric(
+    'fee_rate_age_seconds',
+    lambda: Gauge('fee_rate_age_seconds', 'Age of the cached fee estimate', ['target'])
+)
+PAYOUT_QUOTES = _metric(
+    'payout_quotes_total',
+    lambda: Counter('payout_quotes_total', 'Payout quotes by how the fee was computed', ['source'])
+)
+STREAM_SUBSCRIBERS = _metric(
+    'order_stream_subscribers',
+    lambda: Gauge('order_stream_subscribers', 'Open order stream connections')
+)
+RATE_LIMITED = _metric(
+    'rate_limited_total',
+    lambda: Counter('rate_limited_total', 'Requests refused by the rate limiter', ['route'])
+)
+LOG_DROPPED = _metric(
+    'log_records_dropped_total',
+    lambda: Counter('log_records_dropped_total', 'Log records dropped because the writer queue was full')
+)
+UTXO_INDEX_SIZE = _metric(
+    'utxo_index_size',
+    lambda: Gauge('utxo_index_size', 'UTXOs held in the label index')
+)
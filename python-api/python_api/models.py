@@ -35,6 +35,16 @@ class StatusRes(BaseModel):
     fee_est_sat: Optional[int] = None
 
 
+class StatusBatchReq(BaseModel):
+    # the plugin splits larger lists by WEO_STATUS_BATCH_MAX (includes/helpers.php); keep in step
+    order_ids: List[OrderID] = Field(..., min_length=1, max_length=200)
+
+
+class StatusBatchRes(BaseModel):
+    orders: Dict[str, StatusRes]
+    errors: Dict[str, str] = {}
+
+
 class PSBTBuildReq(BaseModel):
     order_id: OrderID
     outputs: Dict[str, int]
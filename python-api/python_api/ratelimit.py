@@ -0,0 +1,126 @@
+import math
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from .config import API_KEYS, API_KEY_REVOKED, RATE_LIMIT, RATE_LIMIT_DB
+from .logging import log
+from .metrics import RATE_LIMITED
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_PRUNE_EVERY = 60
+
+
+def parse_rate(limit: str) -> Optional[Tuple[float, float]]:
+    # "100/minute" -> (capacity 100, refill 100/60 per second); empty disables
+    limit = limit.strip()
+    if not limit:
+        return None
+    count, _, unit = limit.partition("/")
+    unit = unit.strip().lower().rstrip("s")
+    if unit not in _PERIODS or float(count) <= 0:
+        raise ValueError(f"bad rate limit {limit!r}")
+    return float(count), float(count) / _PERIODS[unit]
+
+
+def cost(weight: float) -> Callable:
+    # rate-limit budget one call of the decorated route uses (default 1, 0 is free)
+    def wrap(fn):
+        fn.rate_cost = weight
+        return fn
+
+    return wrap
+
+
+# Token buckets in a SQLite file shared by every API process, so the limit holds
+# however many workers are started. One bucket per configured API key (client
+# address otherwise) holds up to `capacity` tokens and refills continuously; a check is
+# one read and one upsert of that row. The file is separate from the orders
+# database so limiter writes never queue behind order writes.
+class TokenBucketLimiter:
+    def __init__(self, path: str = RATE_LIMIT_DB, limit: str = RATE_LIMIT):
+        self.path = path
+        rate = parse_rate(limit)
+        self.capacity, self.refill = rate if rate else (0.0, 0.0)
+        self._local = threading.local()
+        self._pruned_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.refill > 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=0.25, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, weight: float = 1, now: Optional[float] = None) -> float:
+        # 0 if the tokens were taken, otherwise seconds until they will be there
+        now = time.time() if now is None else now
+        weight = min(weight, self.capacity)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key=?", (key,)).fetchone()
+            tokens = self.capacity
+            if row is not None:
+                tokens = min(self.capacity, row[0] + max(now - row[1], 0) * self.refill)
+            wait = 0.0
+            if tokens >= weight:
+                tokens -= weight
+            else:
+                wait = (weight - tokens) / self.refill
+            conn.execute(
+                "INSERT INTO rate_buckets(key, tokens, updated_at) VALUES(?,?,?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens=excluded.tokens, updated_at=excluded.updated_at",
+                (key, tokens, now),
+            )
+            if now - self._pruned_at > _PRUNE_EVERY:
+                # a bucket idle long enough to be full again is the same as no row
+                self._pruned_at = now
+                conn.execute("DELETE FROM rate_buckets WHERE updated_at < ?", (now - self.capacity / self.refill,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return wait
+
+
+limiter = TokenBucketLimiter()
+
+
+def _client_key(request: Request) -> str:
+    # the header is only trusted once it names a configured key; otherwise rotating
+    # made-up values would get a fresh bucket (and a new row) on every request
+    key = request.headers.get("x-api-key")
+    if key and key in API_KEYS and key not in API_KEY_REVOKED:
+        return f"key:{key}"
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(request: Request):
+    # app-wide dependency; the matched route's @cost decides how much budget the call uses
+    route = request.scope.get("route")
+    weight = getattr(getattr(route, "endpoint", None), "rate_cost", 1)
+    if not weight or not limiter.enabled:
+        return
+    try:
+        wait = limiter.take(_client_key(request), weight)
+    except sqlite3.Error as e:
+        # a busy or broken limiter store must not take the API down with it
+        log.error("rate_limit_error", error=str(e))
+        return
+    if wait > 0:
+        RATE_LIMITED.labels(route=getattr(route, "path", request.url.path)).inc()
+        raise HTTPException(429, "rate limit exceeded", headers={"Retry-After": str(math.ceil(wait))})
@@ -3,41 +3,43 @@ from typing import Dict
 from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.responses import PlainTextResponse
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from starlette.concurrency import run_in_threadpool
 
 import db
-from ..rpc import rpc
+from ..adb import adb
+from ..rpc import arpc
 from ..models import BroadcastReq, BumpFeeReq, PSBTRes
 from ..config import require_api_key
-from ..metrics import WEBHOOK_QUEUE_SIZE, BROADCAST_FAIL
+from ..ratelimit import cost
+from ..metrics import BROADCAST_FAIL
 from ..logging import order_id_var, log
-from ..workers import _webhook_q, advance_state, woo_callback
+from ..workers import advance_state, order_changed, adjust_pending_gauge, pending_of, update_webhook_gauge
 
 router = APIRouter()
 
 
 @router.get("/live")
-def live():
+@cost(0)
+async def live():
     return {"ok": True}
 
 
 @router.get("/health", dependencies=[Depends(require_api_key)])
-def health(response: Response):
+@cost(2)
+async def health(response: Response):
     db_ok = True
     try:
-        conn = db.get_conn()
-        conn.execute("SELECT 1")
-        conn.close()
+        await run_in_threadpool(lambda: db.get_conn().execute("SELECT 1"))
     except Exception:
         db_ok = False
 
     rpc_ok = True
     try:
-        rpc("getblockchaininfo")
+        await arpc("getblockchaininfo")
     except Exception:
         rpc_ok = False
 
-    qlen = _webhook_q.qsize()
-    WEBHOOK_QUEUE_SIZE.set(qlen)
+    qlen = await run_in_threadpool(update_webhook_gauge)
     ok = db_ok and rpc_ok
     if not ok:
         response.status_code = 503
@@ -45,48 +47,55 @@ def health(response: Response):
 
 
 @router.get("/metrics", dependencies=[Depends(require_api_key)])
+@cost(1)
 def metrics():
     return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 @router.post("/tx/broadcast", dependencies=[Depends(require_api_key)])
-def tx_broadcast(body: BroadcastReq):
+@cost(5)
+async def tx_broadcast(body: BroadcastReq):
     meta = None
     if getattr(body, 'order_id', None):
         order_id_var.set(body.order_id)
-        meta = db.get_order(body.order_id)
+        meta = await adb.get_order(body.order_id)
         if not meta:
             raise HTTPException(404, "order not found")
     try:
-        txid = rpc("sendrawtransaction", [body.hex])
+        txid = await arpc("sendrawtransaction", [body.hex])
     except HTTPException as e:
         BROADCAST_FAIL.inc()
         log.error("broadcast_fail", error=e.detail, order_id=getattr(body, 'order_id', None))
         raise
     if getattr(body, 'order_id', None) and meta:
-        db.set_payout_txid(body.order_id, txid)
+        await adb.set_payout_txid(body.order_id, txid)
         if body.state not in {"completed", "refunded", "dispute"}:
             raise HTTPException(400, "invalid final state")
-        advance_state(meta, body.state)
+        webhook = None
         if not meta.get("last_webhook_ts"):
             event = "settled" if body.state == "completed" else body.state
-            woo_callback({"order_id": body.order_id, "event": event, "txid": txid})
+            webhook = {"order_id": body.order_id, "event": event, "txid": txid}
+        await run_in_threadpool(advance_state, meta, body.state, None, webhook)
     return {"txid": txid}
 
 
 @router.post("/tx/bumpfee", response_model=PSBTRes, dependencies=[Depends(require_api_key)])
-def tx_bumpfee(body: BumpFeeReq):
+@cost(5)
+async def tx_bumpfee(body: BumpFeeReq):
     order_id_var.set(body.order_id)
-    meta = db.get_order(body.order_id)
+    meta = await adb.get_order(body.order_id)
     if not meta or not meta.get("payout_txid"):
         raise HTTPException(404, "txid not found")
     if meta.get("state") == "dispute":
         raise HTTPException(400, "cannot bump fee during dispute")
-    res = rpc("bumpfee", [meta["payout_txid"], {"confTarget": body.target_conf, "psbt": True}])
+    res = await arpc("bumpfee", [meta["payout_txid"], {"confTarget": body.target_conf, "psbt": True}])
     psbt = res.get("psbt") if isinstance(res, dict) else None
     if not psbt:
         raise HTTPException(500, "bumpfee failed")
-    db.start_rbf(body.order_id, psbt)
+    await adb.start_rbf(body.order_id, psbt)
+    order_changed(body.order_id)
+    # start_rbf drops the accepted partials and leaves signing, if it was there
+    adjust_pending_gauge(-pending_of(meta))
     return PSBTRes(psbt=psbt)
 
 
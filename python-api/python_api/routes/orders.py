@@ -1,63 +1,87 @@
+import asyncio
 from typing import Any, Dict, List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 import db
+from ..adb import adb
 from ..models import (
     CreateOrderReq,
     CreateOrderRes,
     StatusRes,
+    StatusBatchReq,
+    StatusBatchRes,
     PayoutQuoteReq,
     PayoutQuoteRes,
+    OrderID,
 )
-from ..rpc import rpc, build_descriptor, find_utxos_for_label
-from ..config import require_api_key
-from ..logging import order_id_var
-from ..workers import advance_state, woo_callback
+from ..rpc import arpc, arpc_batch, adecode_psbt, anetwork_hrp, build_descriptor, afind_utxos_for_label, afind_utxos_for_labels
+from ..config import require_api_key, STREAM_MAX_ORDERS
+from ..ratelimit import cost
+from ..logging import order_id_var, log
+from ..metrics import PAYOUT_QUOTES
+from ..workers import advance_state
+from ..funding import funding_watcher_live
+from ..status_cache import status_cache
+from ..fees import fee_rates, funding_opts
+from ..events import order_events, status_from_row
+from ..bip174 import PSBTError
+from .. import txsize
 
 router = APIRouter()
 
 
 @router.post("/orders", response_model=CreateOrderRes, dependencies=[Depends(require_api_key)])
-def create_order(body: CreateOrderReq):
+@cost(5)
+async def create_order(body: CreateOrderReq):
     order_id_var.set(body.order_id)
-    existing = db.get_order(body.order_id)
+    existing = await adb.get_order(body.order_id)
     if existing:
-        addr = rpc("deriveaddresses", [existing["descriptor"], [existing["index"], existing["index"]]])[0]
+        addr = (await arpc("deriveaddresses", [existing["descriptor"], [existing["index"], existing["index"]]]))[0]
         return CreateOrderRes(
             escrow_address=addr,
             descriptor=existing["descriptor"],
             watch_id=f"escrow_{body.order_id}_{existing['index']}"
         )
 
-    idx = body.index if body.index is not None else db.next_index()
+    if body.index is not None:
+        idx = body.index
+        await adb.claim_index(idx)
+    else:
+        idx = await adb.next_index()
     desc = build_descriptor(body.buyer.xpub, body.seller.xpub, body.escrow.xpub, idx)
-    info = rpc("getdescriptorinfo", [desc])
+    info, fee_rate = await asyncio.gather(
+        arpc("getdescriptorinfo", [desc]),
+        fee_rates.get(3, arpc_batch),
+        return_exceptions=True,
+    )
+    if isinstance(info, BaseException):
+        raise info
     desc_ck = f"{desc}#{info['checksum']}"
     label = f"escrow:{body.order_id}"
 
     fee_est_sat = 0
-    try:
-        fee_res = rpc("estimatesmartfee", [3])
-        feerate = fee_res.get("feerate")
-        if feerate:
-            fee_est_sat = int(round(feerate * 1e5 * 150))
-    except Exception:
-        fee_est_sat = 0
-
-    imp = rpc("importdescriptors", [[{
-        "desc": desc_ck,
-        "timestamp": "now",
-        "label": label,
-        "internal": False,
-        "active": False,
-        "range": [idx, idx]
-    }]])
+    if fee_rate and not isinstance(fee_rate, BaseException):
+        fee_est_sat = int(round(fee_rate * 150))
+
+    imp, derived = await arpc_batch([
+        ("importdescriptors", [[{
+            "desc": desc_ck,
+            "timestamp": "now",
+            "label": label,
+            "internal": False,
+            "active": False,
+            "range": [idx, idx]
+        }]]),
+        ("deriveaddresses", [desc_ck, [idx, idx]]),
+    ])
     if not imp or not imp[0].get("success"):
         raise HTTPException(500, "descriptor import failed")
-    addr = rpc("deriveaddresses", [desc_ck, [idx, idx]])[0]
+    addr = derived[0]
 
-    db.upsert_order(body.order_id, desc_ck, idx, body.min_conf, label, body.amount_sat, fee_est_sat)
+    await adb.upsert_order(body.order_id, desc_ck, idx, body.min_conf, label, body.amount_sat, fee_est_sat)
     return CreateOrderRes(
         escrow_address=addr,
         descriptor=desc_ck,
@@ -66,20 +90,107 @@ def create_order(body: CreateOrderReq):
 
 
 @router.get("/orders/{order_id}/status", response_model=StatusRes, dependencies=[Depends(require_api_key)])
-def order_status(order_id: str):
+@cost(2)
+async def order_status(order_id: str):
     order_id_var.set(order_id)
-    meta = db.get_order(order_id)
+    meta = await adb.get_order(order_id)
     if not meta:
         return StatusRes(state="awaiting_deposit")
-    utxos = find_utxos_for_label(meta["label"], 0)
+    if await run_in_threadpool(funding_watcher_live):
+        # what the funding watcher last recorded; no Core round trip
+        return status_from_row(meta)
+    tag = await status_cache.chain_tag(arpc_batch)
+    cached = status_cache.get(order_id, tag)
+    if cached is not None:
+        return cached
+    utxos = await afind_utxos_for_label(meta["label"], 0)
+    txs = await arpc_batch([("gettransaction", [u["txid"]]) for u in utxos])
+    res = await run_in_threadpool(_status_from_utxos, order_id, meta, utxos, txs)
+    status_cache.put(order_id, tag, res)
+    return res
+
+
+@router.post("/orders/status:batch", response_model=StatusBatchRes, dependencies=[Depends(require_api_key)])
+@cost(10)
+async def order_status_batch(body: StatusBatchReq):
+    order_ids = list(dict.fromkeys(body.order_ids))
+    metas = await adb.get_orders(order_ids)
+    if await run_in_threadpool(funding_watcher_live):
+        return StatusBatchRes(
+            orders={o: status_from_row(metas.get(o)) for o in order_ids},
+            errors={},
+        )
+    tag = await status_cache.chain_tag(arpc_batch)
+    cached = {o: r for o, r in ((o, status_cache.get(o, tag)) for o in metas) if r is not None}
+    misses = {o: m for o, m in metas.items() if o not in cached}
+    labels = [m["label"] for m in misses.values()]
+    buckets = await afind_utxos_for_labels(labels, 0) if labels else {}
+    # one gettransaction per distinct funding tx across the whole page
+    txids = list(dict.fromkeys(u["txid"] for utxos in buckets.values() for u in utxos))
+    txs = dict(zip(txids, await arpc_batch([("gettransaction", [t]) for t in txids]))) if txids else {}
+    res = await run_in_threadpool(_status_batch, [o for o in order_ids if o not in cached], misses, buckets, txs)
+    for oid, status in res.orders.items():
+        if oid in misses:
+            status_cache.put(oid, tag, status)
+    res.orders.update(cached)
+    res.orders = {o: res.orders[o] for o in order_ids if o in res.orders}
+    return res
+
+
+@router.get("/orders/stream", dependencies=[Depends(require_api_key)])
+@cost(5)
+async def order_stream(
+    request: Request,
+    order_id: List[OrderID] = Query(..., min_length=1, max_length=STREAM_MAX_ORDERS),
+):
+    # server-sent events: a snapshot per order, then only the fields that change
+    return StreamingResponse(
+        order_events.stream(list(dict.fromkeys(order_id)), request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _status_batch(
+    order_ids: List[str],
+    metas: Dict[str, Dict[str, Any]],
+    buckets: Dict[str, List[Dict[str, Any]]],
+    txs: Dict[str, Dict[str, Any]],
+) -> StatusBatchRes:
+    res: Dict[str, StatusRes] = {}
+    errors: Dict[str, str] = {}
+    for oid in order_ids:
+        meta = metas.get(oid)
+        order_id_var.set(oid)
+        if not meta:
+            res[oid] = StatusRes(state="awaiting_deposit")
+            continue
+        utxos = buckets.get(meta["label"], [])
+        try:
+            res[oid] = _status_from_utxos(oid, meta, utxos, [txs[u["txid"]] for u in utxos])
+        except HTTPException as e:
+            errors[oid] = str(e.detail)
+    order_id_var.set(None)
+    return StatusBatchRes(orders=res, errors=errors)
+
+
+def _status_from_utxos(
+    order_id: str,
+    meta: Dict[str, Any],
+    utxos: List[Dict[str, Any]],
+    txs: List[Dict[str, Any]],
+) -> StatusRes:
     if not utxos:
+        if meta.get("funding_txid") or meta.get("funding"):
+            # the deposit was spent, replaced or evicted; the row must stop reporting it
+            db.update_funding(order_id, None, None, 0, None)
+            order_events.publish(order_id)
         return StatusRes(state=meta["state"], deadline_ts=meta.get("deadline_ts"), fee_est_sat=meta.get("fee_est_sat"))
 
     total_sat = 0
     funding_utxos: List[Dict[str, Any]] = []
     min_conf = None
-    for u in utxos:
-        tx = rpc("gettransaction", [u["txid"]])
+    for u, tx in zip(utxos, txs):
         conf = int(tx.get("confirmations", 0))
         sat = int(round(u.get("amount", 0) * 1e8))
         total_sat += sat
@@ -92,9 +203,6 @@ def order_status(order_id: str):
         if min_conf is None or conf < min_conf:
             min_conf = conf
 
-    first = utxos[0]
-    db.update_funding(order_id, first["txid"], first["vout"], min_conf or 0)
-
     state = meta["state"]
     fee_est = int(meta.get("fee_est_sat") or 0)
     expected = int(meta.get("amount_sat") or 0) + fee_est
@@ -102,16 +210,17 @@ def order_status(order_id: str):
     if expected > 0 and min_conf is not None and min_conf >= int(meta["min_conf"]):
         tolerance = int(expected * 0.005)
         if total_sat + tolerance >= expected:
-            changed = advance_state(meta, "escrow_funded", min_conf)
-            state = "escrow_funded"
-            if changed:
-                woo_callback({
+            webhook = None
+            if state != "escrow_funded":
+                webhook = {
                     "order_id": order_id,
                     "event": "escrow_funded",
                     "utxos": funding_utxos,
                     "total_sat": total_sat,
                     "confs": min_conf,
-                })
+                }
+            advance_state(meta, "escrow_funded", min_conf, webhook)
+            state = "escrow_funded"
             if total_sat < expected:
                 shortfall = expected - total_sat
         else:
@@ -124,6 +233,9 @@ def order_status(order_id: str):
     }
     if shortfall > 0:
         funding["shortfall_sat"] = shortfall
+    first = utxos[0]
+    db.update_funding(order_id, first["txid"], first["vout"], min_conf or 0, funding)
+    order_events.publish(order_id)
 
     res = StatusRes(
         funding=funding,
@@ -134,31 +246,56 @@ def order_status(order_id: str):
     return res
 
 
-@router.post("/orders/{order_id}/payout_quote", response_model=PayoutQuoteRes, dependencies=[Depends(require_api_key)])
-def payout_quote(order_id: str, body: PayoutQuoteReq):
-    order_id_var.set(order_id)
-    meta = db.get_order(order_id)
-    if not meta:
-        raise HTTPException(404, "order not found")
-    utxos = find_utxos_for_label(meta["label"], int(meta["min_conf"]))
-    if not utxos:
-        raise HTTPException(400, "no funded utxo")
+async def _core_quote(meta: Dict[str, Any], utxos: List[Dict[str, Any]], body: PayoutQuoteReq) -> int:
     ins = [{"txid": u["txid"], "vout": u["vout"]} for u in utxos]
-    opts = {
-        "includeWatching": True,
-        "replaceable": body.rbf,
-        "conf_target": body.target_conf,
-        "subtractFeeFromOutputs": [0],
-    }
+    opts = await funding_opts(body.rbf, body.target_conf, arpc_batch)
     outs = {body.address: meta["amount_sat"] / 1e8}
-    res = rpc("walletcreatefundedpsbt", [ins, outs, 0, opts])
+    res = await arpc("walletcreatefundedpsbt", [ins, outs, 0, opts])
     psbt = res.get("psbt")
-    dec = rpc("decodepsbt", [psbt])
+    dec = await adecode_psbt(psbt)
     vout0 = dec.get("tx", {}).get("vout", [{}])[0]
     payout_sat = int(round(vout0.get("value", 0) * 1e8))
     if payout_sat != meta["amount_sat"]:
         raise HTTPException(400, "payout mismatch")
     if res.get("changepos", -1) != -1:
         raise HTTPException(400, "unexpected change output")
-    fee_sat = int(round(res.get("fee", 0) * 1e8))
+    return int(round(res.get("fee", 0) * 1e8))
+
+
+@router.post("/orders/{order_id}/payout_quote", response_model=PayoutQuoteRes, dependencies=[Depends(require_api_key)])
+@cost(5)
+async def payout_quote(order_id: str, body: PayoutQuoteReq, verify: bool = False):
+    order_id_var.set(order_id)
+    meta = await adb.get_order(order_id)
+    if not meta:
+        raise HTTPException(404, "order not found")
+    utxos = await afind_utxos_for_label(meta["label"], int(meta["min_conf"]))
+    if not utxos:
+        raise HTTPException(400, "no funded utxo")
+    # the spend shape is fixed, so with a cached fee rate the fee is computed here;
+    # Core funds a throwaway PSBT only without an estimate, for addresses the local
+    # sizing does not handle, for labels holding more or less than the payout (the
+    # spend would need change, which Core's path refuses, or cannot be funded), or
+    # to cross-check with ?verify=true
+    local = None
+    in_total = sum(int(round(u.get("amount", 0) * 1e8)) for u in utxos)
+    try:
+        rate = await fee_rates.get(body.target_conf, arpc_batch)
+    except Exception:
+        rate = None
+    if rate and in_total == meta["amount_sat"]:
+        try:
+            weight = txsize.spend_weight(len(utxos), [body.address], await anetwork_hrp())
+            local = txsize.fee_sat(txsize.vsize(weight), rate)
+        except PSBTError:
+            pass
+    if local is not None and not verify:
+        if local >= meta["amount_sat"]:
+            raise HTTPException(400, "payout too small to pay the fee")
+        PAYOUT_QUOTES.labels(source="local").inc()
+        return PayoutQuoteRes(fee_sat=local)
+    fee_sat = await _core_quote(meta, utxos, body)
+    PAYOUT_QUOTES.labels(source="core").inc()
+    if local is not None and local != fee_sat:
+        log.error("payout_quote_mismatch", local_fee_sat=local, core_fee_sat=fee_sat, inputs=len(utxos))
     return PayoutQuoteRes(fee_sat=fee_sat)
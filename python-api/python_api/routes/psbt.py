@@ -1,8 +1,10 @@
-from typing import Dict, List
+import asyncio
+from typing import Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
 
-import db
+from ..adb import adb
 from ..models import (
     PSBTBuildReq,
     PSBTRefundReq,
@@ -12,16 +14,20 @@ from ..models import (
     DecodeRes,
     FinalizeReq,
 )
-from ..rpc import rpc, find_utxos_for_label
-from ..config import require_api_key
+from ..bip174 import psbt_hash
+from ..fees import funding_opts
+from ..rpc import arpc, arpc_batch, acombine_psbts, adecode_psbt, afind_utxos_for_label
+from ..config import require_api_key, FINALIZE_RPC_BATCH, FINALIZE_CONCURRENCY
+from ..ratelimit import cost
 from ..logging import order_id_var, log
-from ..workers import advance_state, update_pending_gauge, woo_callback
+from ..workers import advance_state, order_changed, adjust_pending_gauge, missing_signatures, pending_of, woo_callback
 
 router = APIRouter()
 
+MERGE_RETRIES = 3
 
-def _decode_outputs(psbt: str) -> Dict[str, int]:
-    dec = rpc("decodepsbt", [psbt])
+
+def _decoded_outputs(dec: Dict) -> Dict[str, int]:
     outs = dec.get("tx", {}).get("vout", [])
     res: Dict[str, int] = {}
     for o in outs:
@@ -33,12 +39,13 @@ def _decode_outputs(psbt: str) -> Dict[str, int]:
 
 
 @router.post("/psbt/build", response_model=PSBTRes, dependencies=[Depends(require_api_key)])
-def psbt_build(body: PSBTBuildReq):
+@cost(5)
+async def psbt_build(body: PSBTBuildReq):
     order_id_var.set(body.order_id)
-    meta = db.get_order(body.order_id)
+    meta = await adb.get_order(body.order_id)
     if not meta:
         raise HTTPException(404, "order not found")
-    utxos = find_utxos_for_label(meta["label"], int(meta["min_conf"]))
+    utxos = await afind_utxos_for_label(meta["label"], int(meta["min_conf"]))
     if not utxos:
         raise HTTPException(400, "no funded utxo")
 
@@ -48,17 +55,12 @@ def psbt_build(body: PSBTBuildReq):
     if in_total < required:
         raise HTTPException(400, "insufficient funds")
     outs_btc = {addr: sats / 1e8 for addr, sats in body.outputs.items()}
-    opts = {
-        "includeWatching": True,
-        "replaceable": body.rbf,
-        "conf_target": body.target_conf,
-        "subtractFeeFromOutputs": [0],
-    }
-    res = rpc("walletcreatefundedpsbt", [ins, outs_btc, 0, opts])
+    opts = await funding_opts(body.rbf, body.target_conf, arpc_batch)
+    res = await arpc("walletcreatefundedpsbt", [ins, outs_btc, 0, opts])
     if res.get("changepos", -1) != -1:
         raise HTTPException(400, "unexpected change output")
     psbt = res.get("psbt")
-    dec = rpc("decodepsbt", [psbt])
+    dec = await adecode_psbt(psbt)
     outs = dec.get("tx", {}).get("vout", [])
     if len(outs) != len(body.outputs):
         raise HTTPException(400, "unexpected outputs")
@@ -71,32 +73,28 @@ def psbt_build(body: PSBTBuildReq):
         if addrs[0] in body.outputs and val_sat != meta["amount_sat"]:
             raise HTTPException(400, "payout mismatch")
         out_map[addrs[0]] = val_sat
-    db.set_outputs(body.order_id, out_map, "payout")
-    advance_state(meta, "signing")
+    await adb.set_outputs(body.order_id, out_map, "payout")
+    await run_in_threadpool(advance_state, meta, "signing")
     return PSBTRes(psbt=psbt)
 
 
 @router.post("/psbt/build_refund", response_model=PSBTRes, dependencies=[Depends(require_api_key)])
-def psbt_build_refund(body: PSBTRefundReq):
+@cost(5)
+async def psbt_build_refund(body: PSBTRefundReq):
     order_id_var.set(body.order_id)
-    meta = db.get_order(body.order_id)
+    meta = await adb.get_order(body.order_id)
     if not meta:
         raise HTTPException(404, "order not found")
-    utxos = find_utxos_for_label(meta["label"], int(meta["min_conf"]))
+    utxos = await afind_utxos_for_label(meta["label"], int(meta["min_conf"]))
     if not utxos:
         raise HTTPException(400, "no funded utxo")
     ins = [{"txid": u["txid"], "vout": u["vout"]} for u in utxos]
-    opts = {
-        "includeWatching": True,
-        "replaceable": body.rbf,
-        "conf_target": body.target_conf,
-        "subtractFeeFromOutputs": [0],
-    }
-    res = rpc("walletcreatefundedpsbt", [ins, {body.address: 0}, 0, opts])
+    opts = await funding_opts(body.rbf, body.target_conf, arpc_batch)
+    res = await arpc("walletcreatefundedpsbt", [ins, {body.address: 0}, 0, opts])
     if res.get("changepos", -1) != -1:
         raise HTTPException(400, "unexpected change output")
     psbt = res.get("psbt")
-    dec = rpc("decodepsbt", [psbt])
+    dec = await adecode_psbt(psbt)
     outs = dec.get("tx", {}).get("vout", [])
     if len(outs) != 1:
         raise HTTPException(400, "unexpected outputs")
@@ -104,97 +102,152 @@ def psbt_build_refund(body: PSBTRefundReq):
     if len(addrs) != 1 or addrs[0] != body.address:
         raise HTTPException(400, "outputs mismatch")
     val_sat = int(round(outs[0].get("value", 0) * 1e8))
-    db.set_outputs(body.order_id, {body.address: val_sat}, "refund")
-    advance_state(meta, "signing")
+    await adb.set_outputs(body.order_id, {body.address: val_sat}, "refund")
+    await run_in_threadpool(advance_state, meta, "signing")
     return PSBTRes(psbt=psbt)
 
 
 @router.post("/psbt/merge", response_model=PSBTRes, dependencies=[Depends(require_api_key)])
-def psbt_merge(body: MergeReq):
+@cost(2)
+async def psbt_merge(body: MergeReq):
     if not body.partials:
         raise HTTPException(400, "no partials")
-    merged_list = body.partials
-    if body.order_id:
-        order_id_var.set(body.order_id)
-        existing = db.get_order(body.order_id)
-        if not existing:
-            raise HTTPException(404, "order not found")
-        rbf = existing.get("state") == "rbf_signing"
-        prev = db.get_rbf_partials(body.order_id) if rbf else db.get_partials(body.order_id)
-        new_parts = [p for p in body.partials if p not in prev]
-        merged_list = prev + new_parts
-        if rbf:
-            db.save_rbf_partials(body.order_id, merged_list)
-        else:
-            db.save_partials(body.order_id, merged_list)
-        update_pending_gauge()
-    merged = rpc("combinepsbt", [merged_list])
-    return PSBTRes(psbt=merged)
+    if not body.order_id:
+        return PSBTRes(psbt=await acombine_psbts(body.partials))
+    order_id_var.set(body.order_id)
+    existing = await adb.get_order(body.order_id)
+    if not existing:
+        raise HTTPException(404, "order not found")
+    rbf = existing.get("state") == "rbf_signing"
+    for _ in range(MERGE_RETRIES):
+        prev, seen = await adb.get_merge_state(body.order_id, rbf)
+        accepted = len(seen)
+        base = [prev] if prev else []
+        if prev is None and seen:
+            # rows written before merged PSBTs were stored hold the raw partials
+            base, seen = seen, [psbt_hash(p) for p in seen]
+        hashes = list(seen)
+        new_parts = []
+        for p in body.partials:
+            h = psbt_hash(p)
+            if h not in hashes:
+                hashes.append(h)
+                new_parts.append(p)
+        if prev and not new_parts:
+            return PSBTRes(psbt=prev)
+        merged = await acombine_psbts(base + new_parts)
+        if await adb.save_merge_state(body.order_id, merged, hashes, prev, rbf):
+            if existing.get("state") == "signing":
+                adjust_pending_gauge(missing_signatures(len(hashes)) - missing_signatures(accepted))
+            return PSBTRes(psbt=merged)
+        if await adb.escalation_leased(body.order_id):
+            raise HTTPException(409, "order is being escalated, retry")
+    raise HTTPException(409, "concurrent merge, retry")
 
 
 @router.post("/psbt/decode", response_model=DecodeRes, dependencies=[Depends(require_api_key)])
-def psbt_decode(body: DecodeReq):
-    dec = rpc("decodepsbt", [body.psbt])
+@cost(2)
+async def psbt_decode(body: DecodeReq):
+    dec = await adecode_psbt(body.psbt)
     vout = dec.get("tx", {}).get("vout", [])
     outs: Dict[str, int] = {}
     for o in vout:
         addrs = o.get("scriptPubKey", {}).get("addresses", [])
         if addrs:
             outs[addrs[0]] = int(round(o.get("value", 0) * 1e8))
-    ana = rpc("analyzepsbt", [body.psbt])
-    fee_sat = int(round(ana.get("fee", 0) * 1e8)) if ana.get("fee") is not None else 0
+    fee = dec.get("fee")
+    if fee is None:
+        # no utxo data in the psbt; analyzepsbt may still know the inputs from the wallet
+        fee = (await arpc("analyzepsbt", [body.psbt])).get("fee")
+    fee_sat = int(round(fee * 1e8)) if fee is not None else 0
     inputs = dec.get("inputs", [])
     count = sum(len(inp.get("partial_signatures") or {}) for inp in inputs)
     return DecodeRes(sign_count=count, outputs=outs, fee_sat=fee_sat)
 
 
-@router.post("/psbt/finalize", dependencies=[Depends(require_api_key)])
-def psbt_finalize(body: FinalizeReq):
-    meta = None
-    if body.order_id:
-        order_id_var.set(body.order_id)
-        meta = db.get_order(body.order_id)
-        if not meta:
-            raise HTTPException(404, "order not found")
+async def _verify_inputs(vins: List[Dict], label: Optional[str], check_label: bool) -> int:
+    # one gettransaction per distinct txid plus one gettxout per input, sent as a few
+    # bounded-concurrency JSON-RPC batches; checks and RPC errors then surface in
+    # input order
+    txids = list(dict.fromkeys(vin.get("txid") for vin in vins))
+    calls = [("gettransaction", [t]) for t in txids]
+    calls += [("gettxout", [vin.get("txid"), vin.get("vout")]) for vin in vins]
+    sem = asyncio.Semaphore(FINALIZE_CONCURRENCY)
 
-    if not body.psbt:
-        if meta and body.state == "dispute":
-            advance_state(meta, "dispute")
-            woo_callback({"event": "dispute_opened", "order_id": body.order_id})
-            return {"hex": ""}
-        raise HTTPException(400, "missing psbt")
+    async def run(chunk):
+        async with sem:
+            try:
+                return await arpc_batch(chunk)
+            except Exception:
+                if len(chunk) == 1:
+                    raise
+        # one failing call fails its whole batch; resend the calls singly so each
+        # error belongs to its input and is raised when the checks reach that input
+        singles = await asyncio.gather(*[run([c]) for c in chunk], return_exceptions=True)
+        return [r if isinstance(r, BaseException) else r[0] for r in singles]
 
-    dec = rpc("decodepsbt", [body.psbt])
-    tx = dec.get("tx") or {}
-    vins = tx.get("vin", [])
-    vouts = tx.get("vout", [])
+    chunks = [calls[i:i + FINALIZE_RPC_BATCH] for i in range(0, len(calls), FINALIZE_RPC_BATCH)]
+    parts = await asyncio.gather(*[run(c) for c in chunks], return_exceptions=True)
+    results: List = []
+    for chunk, part in zip(chunks, parts):
+        results.extend([part] * len(chunk) if isinstance(part, BaseException) else part)
+    txinfos = dict(zip(txids, results[:len(txids)]))
+    txouts = results[len(txids):]
 
-    allowed = db.get_outputs(body.order_id) if body.order_id else {}
-    if body.order_id and not allowed:
-        log.error("psbt_missing_outputs", order_id=body.order_id)
-        raise HTTPException(400, "missing stored outputs")
     in_total = 0
-    for vin in vins:
+    for vin, txout in zip(vins, txouts):
         txid, vout = vin.get("txid"), vin.get("vout")
-        txinfo = rpc("gettransaction", [txid])
+        if isinstance(txinfos[txid], BaseException):
+            raise txinfos[txid]
         ok = False
-        label = meta.get("label") if meta else None
-        for det in txinfo.get("details", []):
+        for det in txinfos[txid].get("details", []):
             if det.get("vout") == vout and det.get("label") == label:
                 ok = True
                 break
-        if meta and not ok:
+        if check_label and not ok:
             log.error("psbt_invalid_input", txid=txid, vout=vout)
             raise HTTPException(400, "input not from escrow label")
         seq = vin.get("sequence", 0xffffffff)
         if seq >= 0xfffffffe:
             log.error("psbt_non_rbf", txid=txid, sequence=seq)
             raise HTTPException(400, "RBF disabled")
-        txout = rpc("gettxout", [txid, vout])
+        if isinstance(txout, BaseException):
+            raise txout
         if not txout or "value" not in txout:
             log.error("psbt_missing_txout", txid=txid, vout=vout)
             raise HTTPException(400, "missing input value")
         in_total += int(round(txout["value"] * 1e8))
+    return in_total
+
+
+@router.post("/psbt/finalize", dependencies=[Depends(require_api_key)])
+@cost(20)
+async def psbt_finalize(body: FinalizeReq):
+    meta = None
+    if body.order_id:
+        order_id_var.set(body.order_id)
+        meta = await adb.get_order(body.order_id)
+        if not meta:
+            raise HTTPException(404, "order not found")
+
+    if not body.psbt:
+        if meta and body.state == "dispute":
+            await run_in_threadpool(
+                advance_state, meta, "dispute", None, {"event": "dispute_opened", "order_id": body.order_id}
+            )
+            return {"hex": ""}
+        raise HTTPException(400, "missing psbt")
+
+    dec = await adecode_psbt(body.psbt)
+    tx = dec.get("tx") or {}
+    vins = tx.get("vin", [])
+    vouts = tx.get("vout", [])
+
+    allowed = await adb.get_outputs(body.order_id) if body.order_id else {}
+    if body.order_id and not allowed:
+        log.error("psbt_missing_outputs", order_id=body.order_id)
+        raise HTTPException(400, "missing stored outputs")
+    in_total = await _verify_inputs(vins, meta.get("label") if meta else None, bool(meta))
 
     decoded_outputs: Dict[str, int] = {}
     for o in vouts:
@@ -220,13 +273,13 @@ def psbt_finalize(body: FinalizeReq):
         raise HTTPException(400, "fee mismatch")
 
     if meta:
-        funding_utxos = find_utxos_for_label(meta["label"], 0)
+        funding_utxos = await afind_utxos_for_label(meta["label"], 0)
         funded_total = sum(int(round(u.get("amount", 0) * 1e8)) for u in funding_utxos)
         if out_total + fee > funded_total:
             log.error("psbt_exceeds_funding", funded=funded_total, spending=out_total + fee)
             raise HTTPException(400, "spends more than funded amount")
 
-    fin = rpc("finalizepsbt", [body.psbt])
+    fin = await arpc("finalizepsbt", [body.psbt])
     if not fin.get("complete"):
         raise HTTPException(400, "not enough signatures")
     if meta and body.state not in {"completed", "refunded", "dispute"}:
@@ -235,17 +288,17 @@ def psbt_finalize(body: FinalizeReq):
 
 
 @router.post("/tx/bumpfee/finalize", dependencies=[Depends(require_api_key)])
-def tx_bumpfee_finalize(body: FinalizeReq):
+@cost(10)
+async def tx_bumpfee_finalize(body: FinalizeReq):
     order_id_var.set(body.order_id)
-    meta = db.get_order(body.order_id)
+    meta = await adb.get_order(body.order_id)
     if not meta or meta.get("state") != "rbf_signing":
         raise HTTPException(404, "rbf not in progress")
-    base_psbt = db.get_rbf_psbt(body.order_id)
+    base_psbt = await adb.get_rbf_psbt(body.order_id)
     if not base_psbt:
         raise HTTPException(404, "rbf psbt not found")
 
-    base_dec = rpc("decodepsbt", [base_psbt])
-    new_dec = rpc("decodepsbt", [body.psbt])
+    base_dec, new_dec = await asyncio.gather(adecode_psbt(base_psbt), adecode_psbt(body.psbt))
     base_ins = base_dec.get("tx", {}).get("vin", [])
     new_ins = new_dec.get("tx", {}).get("vin", [])
     if len(base_ins) != len(new_ins):
@@ -256,12 +309,12 @@ def tx_bumpfee_finalize(body: FinalizeReq):
         if b.get("sequence", 0xffffffff) >= 0xfffffffe:
             raise HTTPException(400, "RBF disabled")
 
-    base_outs = _decode_outputs(base_psbt)
-    new_outs = _decode_outputs(body.psbt)
+    base_outs = _decoded_outputs(base_dec)
+    new_outs = _decoded_outputs(new_dec)
     if new_outs != base_outs:
         raise HTTPException(400, "outputs mismatch")
 
-    orig_outs = db.get_outputs(body.order_id)
+    orig_outs = await adb.get_outputs(body.order_id)
     decreased = []
     for addr, amt in orig_outs.items():
         new_amt = new_outs.get(addr)
@@ -276,15 +329,17 @@ def tx_bumpfee_finalize(body: FinalizeReq):
     if sum(new_outs.values()) >= sum(orig_outs.values()):
         raise HTTPException(400, "no fee bump")
 
-    fin = rpc("finalizepsbt", [body.psbt])
+    fin = await arpc("finalizepsbt", [body.psbt])
     if not fin.get("complete"):
         raise HTTPException(400, "not enough signatures")
-    txid = rpc("sendrawtransaction", [fin["hex"]])
-    db.set_payout_txid(body.order_id, txid)
-    db.clear_rbf(body.order_id)
-    meta = db.get_order(body.order_id)
+    txid = await arpc("sendrawtransaction", [fin["hex"]])
+    await adb.set_payout_txid(body.order_id, txid)
+    await adb.clear_rbf(body.order_id)
+    order_changed(body.order_id)
+    meta = await adb.get_order(body.order_id)
     if meta:
+        adjust_pending_gauge(pending_of(meta))
         event = "settled" if meta.get("state") == "completed" else meta.get("state")
         if event:
-            woo_callback({"order_id": body.order_id, "event": event, "txid": txid})
+            await run_in_threadpool(woo_callback, {"order_id": body.order_id, "event": event, "txid": txid})
     return {"txid": txid}
@@ -1,52 +1,296 @@
+import asyncio
 import time
-from typing import Any, List, Dict
+from typing import Any, List, Dict, Optional, Sequence, Tuple
 
-import time
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from fastapi import HTTPException
 
+from . import bip174
 from .config import (
+    BTC_NETWORK,
     BTC_CORE_URL,
     BTC_CORE_USER,
     BTC_CORE_PASS,
     BTC_CORE_WALLET,
+    PSBT_COMBINE_CHECK,
+    RPC_POOL_SIZE,
+    RPC_TIMEOUT,
 )
 from .logging import log, req_id_var, order_id_var, actor_var
 from .metrics import RPC_HIST
 
+Calls = Sequence[Tuple[str, Optional[List[Any]]]]
+
+
+class _RPCBase:
+    def __init__(
+        self,
+        url: str = BTC_CORE_URL,
+        user: str = BTC_CORE_USER,
+        password: str = BTC_CORE_PASS,
+        wallet: str = BTC_CORE_WALLET,
+        pool_size: int = RPC_POOL_SIZE,
+        timeout: float = RPC_TIMEOUT,
+    ):
+        self.url = url.rstrip("/") + f"/wallet/{wallet}"
+        self.auth = (user, password) if user or password else None
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+    def _bound(self, method: str):
+        return log.bind(
+            request_id=req_id_var.get(),
+            order_id=order_id_var.get(),
+            actor=actor_var.get(),
+            rpc_method=method,
+        )
+
+    def _bad_response(self, e: Exception, status: Any, bound, start: float):
+        bound.error("rpc_error", error=str(e), duration=time.time() - start)
+        return HTTPException(status_code=502, detail=f"Core RPC bad response ({status})")
+
+    def _call_payload(self, method: str, params: Optional[List[Any]], bound) -> Dict[str, Any]:
+        bound.info("rpc_start", params=params)
+        return {"jsonrpc": "1.0", "id": "escrow", "method": method, "params": params or []}
+
+    def _call_result(self, j: Dict[str, Any], method: str, bound, start: float) -> Any:
+        if j.get("error"):
+            bound.error("rpc_error", error=j["error"], duration=time.time() - start)
+            raise HTTPException(status_code=500, detail=j["error"]["message"])
+        duration = time.time() - start
+        bound.info("rpc_success", duration=duration)
+        RPC_HIST.labels(method=method).observe(duration)
+        return j["result"]
+
+    def _batch_payload(self, calls: Calls, bound) -> List[Dict[str, Any]]:
+        bound.info("rpc_start", methods=[m for m, _ in calls])
+        return [
+            {"jsonrpc": "1.0", "id": i, "method": m, "params": p or []}
+            for i, (m, p) in enumerate(calls)
+        ]
+
+    def _batch_results(self, j: Any, calls: Calls, bound, start: float) -> List[Any]:
+        methods = [m for m, _ in calls]
+        if not isinstance(j, list):
+            bound.error("rpc_error", error=j.get("error") if isinstance(j, dict) else j, duration=time.time() - start)
+            raise HTTPException(status_code=502, detail="Core RPC bad batch response")
+        by_id = {item.get("id"): item for item in j}
+        results: List[Any] = []
+        for i, m in enumerate(methods):
+            item = by_id.get(i)
+            if item is None:
+                bound.error("rpc_error", error="missing batch reply", method=m, duration=time.time() - start)
+                raise HTTPException(status_code=502, detail="Core RPC bad batch response")
+            if item.get("error"):
+                bound.error("rpc_error", error=item["error"], method=m, duration=time.time() - start)
+                raise HTTPException(status_code=500, detail=item["error"]["message"])
+            results.append(item.get("result"))
+        duration = time.time() - start
+        bound.info("rpc_success", methods=methods, duration=duration)
+        RPC_HIST.labels(method="batch").observe(duration)
+        return results
+
+
+class CoreRPC(_RPCBase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.auth = self.auth
+
+    def _post(self, payload: Any, bound) -> Any:
+        start = time.time()
+        r = None
+        try:
+            r = self.session.post(self.url, json=payload, timeout=self.timeout)
+            return r.json()
+        except Exception as e:
+            raise self._bad_response(e, getattr(r, "status_code", "n/a"), bound, start)
+
+    def call(self, method: str, params: Optional[List[Any]] = None) -> Any:
+        bound = self._bound(method)
+        start = time.time()
+        j = self._post(self._call_payload(method, params, bound), bound)
+        return self._call_result(j, method, bound, start)
+
+    def batch(self, calls: Calls) -> List[Any]:
+        if not calls:
+            return []
+        bound = self._bound("batch")
+        start = time.time()
+        j = self._post(self._batch_payload(calls, bound), bound)
+        return self._batch_results(j, calls, bound, start)
+
+
+class AsyncCoreRPC(_RPCBase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # pooled connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            self._client = httpx.AsyncClient(auth=self.auth, timeout=self.timeout, limits=limits)
+            self._loop = loop
+        return self._client
+
+    async def _post(self, payload: Any, bound) -> Any:
+        start = time.time()
+        r = None
+        try:
+            r = await self._get_client().post(self.url, json=payload)
+            return r.json()
+        except Exception as e:
+            raise self._bad_response(e, getattr(r, "status_code", "n/a"), bound, start)
+
+    async def call(self, method: str, params: Optional[List[Any]] = None) -> Any:
+        bound = self._bound(method)
+        start = time.time()
+        j = await self._post(self._call_payload(method, params, bound), bound)
+        return self._call_result(j, method, bound, start)
+
+    async def batch(self, calls: Calls) -> List[Any]:
+        if not calls:
+            return []
+        bound = self._bound("batch")
+        start = time.time()
+        j = await self._post(self._batch_payload(calls, bound), bound)
+        return self._batch_results(j, calls, bound, start)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_client = CoreRPC()
+_aclient = AsyncCoreRPC()
+
 
 def rpc(method: str, params: List[Any] = None) -> Any:
-    bound = log.bind(
-        request_id=req_id_var.get(),
-        order_id=order_id_var.get(),
-        actor=actor_var.get(),
-        rpc_method=method,
-    )
-    url = BTC_CORE_URL.rstrip("/") + f"/wallet/{BTC_CORE_WALLET}"
-    payload = {"jsonrpc": "1.0", "id": "escrow", "method": method, "params": params or []}
-    auth = (BTC_CORE_USER, BTC_CORE_PASS) if BTC_CORE_USER or BTC_CORE_PASS else None
-    start = time.time()
-    bound.info("rpc_start", params=params)
-    r = None
+    return _client.call(method, params)
+
+
+def rpc_batch(calls: Calls) -> List[Any]:
+    return _client.batch(calls)
+
+
+async def arpc(method: str, params: List[Any] = None) -> Any:
+    return await _aclient.call(method, params)
+
+
+async def arpc_batch(calls: Calls) -> List[Any]:
+    return await _aclient.batch(calls)
+
+
+async def aclose():
+    await _aclient.aclose()
+
+
+_hrp: Optional[str] = None
+
+
+def _hrp_for(chain: str) -> str:
+    global _hrp
+    _hrp = bip174.NETWORK_HRP.get(chain, "tb")
+    return _hrp
+
+
+def network_hrp() -> str:
+    if _hrp is not None:
+        return _hrp
+    return _hrp_for(BTC_NETWORK or rpc("getblockchaininfo").get("chain", "main"))
+
+
+async def anetwork_hrp() -> str:
+    if _hrp is not None:
+        return _hrp
+    return _hrp_for(BTC_NETWORK or (await arpc("getblockchaininfo")).get("chain", "main"))
+
+
+def decode_psbt(psbt: str) -> Dict[str, Any]:
+    # parse locally; Core only sees what the local parser does not handle (PSBTv2, legacy scripts)
     try:
-        r = requests.post(url, json=payload, auth=auth, timeout=25)
-        j = r.json()
-    except Exception as e:
-        bound.error("rpc_error", error=str(e), duration=time.time() - start)
-        raise HTTPException(status_code=502, detail=f"Core RPC bad response ({getattr(r, 'status_code', 'n/a')})")
-    if j.get("error"):
-        bound.error("rpc_error", error=j["error"], duration=time.time() - start)
-        raise HTTPException(status_code=500, detail=j["error"]["message"])
-    duration = time.time() - start
-    bound.info("rpc_success", duration=duration)
-    RPC_HIST.labels(method=method).observe(duration)
-    return j["result"]
+        parsed = bip174.PSBT.from_base64(psbt)
+        return parsed.decode(network_hrp())
+    except bip174.PSBTError:
+        return rpc("decodepsbt", [psbt])
+
+
+async def adecode_psbt(psbt: str) -> Dict[str, Any]:
+    try:
+        parsed = bip174.PSBT.from_base64(psbt)
+        return parsed.decode(await anetwork_hrp())
+    except bip174.PSBTError:
+        return await arpc("decodepsbt", [psbt])
+
+
+def _checked_combine(merged: str, core: str, count: int) -> str:
+    if bip174.psbt_hash(merged) == bip174.psbt_hash(core):
+        return merged
+    log.error("psbt_combine_mismatch", partials=count)
+    return core
+
+
+def combine_psbts(psbts: List[str]) -> str:
+    try:
+        merged = bip174.combine_psbts(psbts)
+    except bip174.PSBTError:
+        return rpc("combinepsbt", [psbts])
+    if PSBT_COMBINE_CHECK:
+        return _checked_combine(merged, rpc("combinepsbt", [psbts]), len(psbts))
+    return merged
+
+
+async def acombine_psbts(psbts: List[str]) -> str:
+    try:
+        merged = bip174.combine_psbts(psbts)
+    except bip174.PSBTError:
+        return await arpc("combinepsbt", [psbts])
+    if PSBT_COMBINE_CHECK:
+        return _checked_combine(merged, await arpc("combinepsbt", [psbts]), len(psbts))
+    return merged
 
 
 def build_descriptor(xpub_b: str, xpub_s: str, xpub_e: str, index: int) -> str:
     return f"wsh(multi(2,{xpub_b}/0/{index}/*,{xpub_s}/0/{index}/*,{xpub_e}/0/{index}/*))"
 
 
+def _bucket_by_label(utxos: List[Dict[str, Any]], labels: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    buckets: Dict[str, List[Dict[str, Any]]] = {label: [] for label in labels}
+    for u in utxos:
+        bucket = buckets.get(u.get("label") or "")
+        if bucket is not None:
+            bucket.append(u)
+    return buckets
+
+
 def find_utxos_for_label(label: str, min_conf: int) -> List[Dict[str, Any]]:
-    utxos = rpc("listunspent", [min_conf, 9999999, [], True, {}])
-    return [u for u in utxos if (u.get("label") or "") == label]
+    return find_utxos_for_labels([label], min_conf)[label]
+
+
+def find_utxos_for_labels(labels: List[str], min_conf: int) -> Dict[str, List[Dict[str, Any]]]:
+    from .utxo_index import utxo_index
+
+    if utxo_index.ready():
+        return utxo_index.lookup(labels, min_conf)
+    return _bucket_by_label(rpc("listunspent", [min_conf, 9999999, [], True, {}]), labels)
+
+
+async def afind_utxos_for_label(label: str, min_conf: int) -> List[Dict[str, Any]]:
+    return (await afind_utxos_for_labels([label], min_conf))[label]
+
+
+async def afind_utxos_for_labels(labels: List[str], min_conf: int) -> Dict[str, List[Dict[str, Any]]]:
+    from .utxo_index import utxo_index
+
+    if utxo_index.ready():
+        return utxo_index.lookup(labels, min_conf)
+    return _bucket_by_label(await arpc("listunspent", [min_conf, 9999999, [], True, {}]), labels)
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from .config import STATUS_CACHE_SIZE, STATUS_CACHE_TTL
+from .metrics import STATUS_CACHE
+
+# best block hash and wallet txcount; any block or wallet transaction changes it
+ChainTag = Tuple[str, int]
+
+_TAG_TTL = 1.0
+
+
+# Computed StatusRes per order, valid for one chain tag and at most STATUS_CACHE_TTL
+# seconds (which bounds staleness from state changes made by other processes).
+# LRU-bounded to STATUS_CACHE_SIZE orders. advance_state and the RBF routes
+# invalidate the orders they change.
+class StatusCache:
+    def __init__(self, max_entries: int = STATUS_CACHE_SIZE, ttl: float = STATUS_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[ChainTag, float, Any]]" = OrderedDict()
+        self._tag: Optional[ChainTag] = None
+        self._tag_at = 0.0
+        self._tag_lock: Optional[asyncio.Lock] = None
+
+    async def chain_tag(self, batch: Callable[[List], Awaitable[List[Any]]]) -> ChainTag:
+        # one getbestblockhash + getwalletinfo per _TAG_TTL, shared by concurrent requests
+        if self._tag is not None and time.time() - self._tag_at < _TAG_TTL:
+            return self._tag
+        if self._tag_lock is None:
+            self._tag_lock = asyncio.Lock()
+        async with self._tag_lock:
+            if self._tag is None or time.time() - self._tag_at >= _TAG_TTL:
+                best, info = await batch([("getbestblockhash", []), ("getwalletinfo", [])])
+                self._tag = (best, int(info.get("txcount") or 0))
+                self._tag_at = time.time()
+        return self._tag
+
+    def get(self, order_id: str, tag: ChainTag) -> Optional[Any]:
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is not None and entry[0] == tag and entry[1] > time.time():
+                self._entries.move_to_end(order_id)
+                STATUS_CACHE.labels(result="hit").inc()
+                return entry[2]
+        STATUS_CACHE.labels(result="miss").inc()
+        return None
+
+    def put(self, order_id: str, tag: ChainTag, res: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[order_id] = (tag, time.time() + self.ttl, res)
+            self._entries.move_to_end(order_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, order_id: str):
+        with self._lock:
+            self._entries.pop(order_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tag = None
+
+
+status_cache = StatusCache()
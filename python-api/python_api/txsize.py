@@ -0,0 +1,46 @@
+from functools import lru_cache
+from typing import Sequence
+
+from .bip174 import PSBTError, decode_segwit_address
+
+# Exact sizes of the escrow spends: every input is a 2-of-3 P2WSH output of
+# build_descriptor, every output a segwit address. Signatures are counted at 72
+# bytes, the size Core's wallet assumes when funding a transaction it cannot sign,
+# so the vsize and fee match what walletcreatefundedpsbt reports.
+_SIG_BYTES = 72
+_MULTISIG_SCRIPT = 1 + 3 * (1 + 33) + 1 + 1  # OP_2 <key> <key> <key> OP_3 OP_CHECKMULTISIG
+_INPUT_BYTES = 32 + 4 + 1 + 4  # outpoint, empty scriptSig, nSequence
+# item count, empty OP_CHECKMULTISIG dummy, two signatures, witness script
+_INPUT_WITNESS = 1 + 1 + 2 * (1 + _SIG_BYTES) + 1 + _MULTISIG_SCRIPT
+INPUT_WEIGHT = 4 * _INPUT_BYTES + _INPUT_WITNESS
+_TX_WEIGHT = 4 * (4 + 4) + 2  # nVersion and nLockTime, segwit marker and flag
+
+
+def _compact_len(n: int) -> int:
+    return 1 if n < 0xFD else 3 if n <= 0xFFFF else 5 if n <= 0xFFFFFFFF else 9
+
+
+@lru_cache(maxsize=4096)
+def output_bytes(address: str, hrp: str) -> int:
+    addr_hrp, _, program = decode_segwit_address(address)
+    if addr_hrp != hrp:
+        raise PSBTError("address is for another network")
+    # nValue, script length, OP_n <program>
+    return 8 + 1 + 2 + len(program)
+
+
+def spend_weight(n_inputs: int, addresses: Sequence[str], hrp: str) -> int:
+    # raises PSBTError for an output it cannot size; callers leave those to Core
+    outs = sum(output_bytes(a, hrp) for a in addresses)
+    base = _compact_len(n_inputs) + _compact_len(len(addresses)) + outs
+    return _TX_WEIGHT + 4 * base + n_inputs * INPUT_WEIGHT
+
+
+def vsize(weight: int) -> int:
+    return (weight + 3) // 4
+
+
+def fee_sat(vbytes: int, rate_sat_vb: float) -> int:
+    # Core keeps fee_rate as whole sat/kvB and rounds the fee up
+    per_kvb = int(round(rate_sat_vb * 1000))
+    return -(-per_kvb * vbytes // 1000)
@@ -0,0 +1,160 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .config import UTXO_INDEX_POLL, UTXO_INDEX_REBUILD
+from .logging import log
+from .metrics import UTXO_INDEX_SIZE
+from .rpc import rpc, rpc_batch
+
+Outpoint = Tuple[str, int]
+
+
+class UTXOIndex:
+    def __init__(self, poll: float = UTXO_INDEX_POLL, rebuild_every: float = UTXO_INDEX_REBUILD):
+        self.poll = poll
+        self.rebuild_every = rebuild_every
+        self._lock = threading.Lock()
+        self._by_outpoint: Dict[Outpoint, Dict[str, Any]] = {}
+        self._by_label: Dict[str, Dict[Outpoint, Dict[str, Any]]] = {}
+        self._by_address: Dict[str, Set[Outpoint]] = {}
+        self._unconfirmed: Set[Outpoint] = set()
+        self._cursor: Optional[str] = None
+        self._tip = 0
+        self._synced_at = 0.0
+        self._rebuilt_at = 0.0
+        # wallet spends already applied: confirmed ones for good, unconfirmed ones
+        # with the addresses of what they spent, re-listed until they confirm
+        self._seen_spends: Set[str] = set()
+        self._pending_spends: Dict[str, Set[str]] = {}
+
+    def ready(self) -> bool:
+        return self.poll > 0 and self._cursor is not None and time.time() - self._synced_at < 3 * self.poll
+
+    def lookup(self, labels: List[str], min_conf: int) -> Dict[str, List[Dict[str, Any]]]:
+        res: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            tip = self._tip
+            for label in labels:
+                out = []
+                for u in self._by_label.get(label, {}).values():
+                    height = u["_height"]
+                    conf = tip - height + 1 if height is not None else 0
+                    if conf >= min_conf:
+                        item = {k: v for k, v in u.items() if k != "_height"}
+                        item["confirmations"] = conf
+                        out.append(item)
+                res[label] = out
+        return res
+
+    def _add(self, u: Dict[str, Any], tip: int):
+        conf = int(u.get("confirmations") or 0)
+        entry = dict(u, _height=tip - conf + 1 if conf > 0 else None)
+        op = (u["txid"], u["vout"])
+        self._drop(op)
+        self._by_outpoint[op] = entry
+        self._by_label.setdefault(u.get("label") or "", {})[op] = entry
+        if u.get("address"):
+            self._by_address.setdefault(u["address"], set()).add(op)
+        if entry["_height"] is None:
+            self._unconfirmed.add(op)
+
+    def _drop(self, op: Outpoint):
+        old = self._by_outpoint.pop(op, None)
+        if old is None:
+            return
+        self._unconfirmed.discard(op)
+        bucket = self._by_label.get(old.get("label") or "")
+        if bucket is not None:
+            bucket.pop(op, None)
+            if not bucket:
+                self._by_label.pop(old.get("label") or "", None)
+        ops = self._by_address.get(old.get("address") or "")
+        if ops is not None:
+            ops.discard(op)
+            if not ops:
+                self._by_address.pop(old["address"], None)
+
+    def rebuild(self):
+        tip, best = rpc_batch([("getblockcount", []), ("getbestblockhash", [])])
+        utxos = rpc("listunspent", [0, 9999999, [], True, {}])
+        with self._lock:
+            self._by_outpoint.clear()
+            self._by_label.clear()
+            self._by_address.clear()
+            self._unconfirmed.clear()
+            self._seen_spends.clear()
+            self._pending_spends.clear()
+            self._tip = int(tip)
+            for u in utxos:
+                self._add(u, self._tip)
+            self._cursor = best
+            self._synced_at = self._rebuilt_at = time.time()
+        UTXO_INDEX_SIZE.set(len(self._by_outpoint))
+        log.info("utxo_index_rebuilt", utxos=len(utxos), tip=tip)
+
+    def refresh(self):
+        if self._cursor is None or time.time() - self._rebuilt_at > self.rebuild_every:
+            self.rebuild()
+            return
+        tip, since = rpc_batch([
+            ("getblockcount", []),
+            ("listsinceblock", [self._cursor, 1, True, True]),
+        ])
+        if since.get("removed"):
+            log.warning("utxo_index_reorg", cursor=self._cursor)
+            self.rebuild()
+            return
+        tip = int(tip)
+        addresses: Set[str] = set()
+        spends: Set[str] = set()
+        for t in since.get("transactions", []):
+            if t.get("category") == "send":
+                if t.get("txid") not in self._seen_spends:
+                    spends.add(t["txid"])
+            elif t.get("address"):
+                addresses.add(t["address"])
+        with self._lock:
+            # unconfirmed outputs may be confirmed, replaced or evicted since the last poll
+            addresses.update(self._by_outpoint[op].get("address") or "" for op in self._unconfirmed)
+            # so may unconfirmed spends: re-list what they spent, which brings the
+            # outputs back once Core no longer counts them as spent
+            spends.update(self._pending_spends)
+            for spent in self._pending_spends.values():
+                addresses.update(spent)
+        addresses.discard("")
+        spend_ids = sorted(spends)
+        calls = [("gettransaction", [txid, True, True]) for txid in spend_ids]
+        if addresses:
+            calls.append(("listunspent", [0, 9999999, sorted(addresses), True, {}]))
+        results = rpc_batch(calls) if calls else []
+        fresh = results.pop() if addresses else []
+        with self._lock:
+            self._tip = tip
+            for txid, tx in zip(spend_ids, results):
+                conf = int(tx.get("confirmations") or 0)
+                spent = [(vin["txid"], vin["vout"]) for vin in (tx.get("decoded") or {}).get("vin", []) if "txid" in vin]
+                if conf > 0:
+                    self._pending_spends.pop(txid, None)
+                    self._seen_spends.add(txid)
+                elif conf < 0:
+                    # conflicted (replaced or double-spent): its inputs were re-listed above
+                    self._pending_spends.pop(txid, None)
+                    continue
+                else:
+                    pending = self._pending_spends.setdefault(txid, set())
+                    pending.update(self._by_outpoint[op].get("address") or "" for op in spent if op in self._by_outpoint)
+                    pending.discard("")
+                for op in spent:
+                    self._drop(op)
+            for addr in addresses:
+                for op in list(self._by_address.get(addr, ())):
+                    self._drop(op)
+            for u in fresh:
+                self._add(u, tip)
+            self._cursor = since.get("lastblock", self._cursor)
+            self._synced_at = time.time()
+        UTXO_INDEX_SIZE.set(len(self._by_outpoint))
+
+
+utxo_index = UTXOIndex()
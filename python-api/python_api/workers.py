@@ -1,86 +1,344 @@
+import asyncio
+import heapq
 import json
 import hmac
 import hashlib
 import threading
-import queue
 import time
-from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 import db
+import requests
 from fastapi import HTTPException
+from requests.adapters import HTTPAdapter
 
 from .config import (
     WOO_CALLBACK_URL,
     WOO_HMAC_SECRET,
     WEBHOOK_RETRIES,
     WEBHOOK_BACKOFF,
+    WEBHOOK_BATCH,
+    WEBHOOK_LEASE,
+    WEBHOOK_POLL,
+    WEBHOOK_TIMEOUT,
+    WEBHOOK_BATCH_MODE,
+    WEBHOOK_BATCH_WINDOW,
+    WEBHOOK_BATCH_MAX,
+    WOO_CALLBACK_BATCH_URL,
+    WEBHOOK_WORKERS,
     STUCK_ORDER_HOURS,
     STUCK_CHECK_INTERVAL,
     SIGNING_DEADLINE_DAYS,
+    DEADLINE_WORKERS,
+    DEADLINE_TIMEOUT,
+    DEADLINE_LEASE,
     STATE_TRANSITIONS,
+    UTXO_INDEX_POLL,
+    FUNDING_POLL,
+    PENDING_RECONCILE,
 )
 from .metrics import (
     WEBHOOK_COUNTER,
+    WEBHOOK_LATENCY,
     WEBHOOK_QUEUE_SIZE,
     PENDING_SIG,
     STUCK_COUNTER,
+    DEADLINE_ESCALATIONS,
+    DEADLINE_QUEUE,
 )
 from .logging import log
-from .rpc import rpc
+from .rpc import rpc, combine_psbts, decode_psbt
+from .utxo_index import utxo_index
+from .funding import FundingWatcher
+from .status_cache import status_cache
+from .events import order_events
 
 
 def update_pending_gauge():
+    # full recount; writers adjust the gauge by deltas in between
     try:
         PENDING_SIG.set(db.count_pending_signatures())
     except Exception:
         PENDING_SIG.set(0)
 
 
-update_pending_gauge()
+def missing_signatures(partial_count: int) -> int:
+    return max(2 - partial_count, 0)
 
 
-_webhook_q: queue.Queue = queue.Queue()
+def pending_of(order: Dict[str, Any]) -> int:
+    # what one order contributes to pending_signatures
+    if order.get("state") != "signing":
+        return 0
+    return missing_signatures(int(order.get("partial_count") or 0))
+
+
+def adjust_pending_gauge(delta: int):
+    if delta:
+        PENDING_SIG.inc(delta)
+
+
+# event loop of the API process; background threads submit route coroutines to it
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _run_async(coro, timeout: Optional[float] = None):
+    if _loop is not None and _loop.is_running():
+        fut = asyncio.run_coroutine_threadsafe(coro, _loop)
+        try:
+            return fut.result(timeout)
+        except BaseException:
+            fut.cancel()
+            raise
+    return asyncio.run(asyncio.wait_for(coro, timeout))
 
 
 def woo_callback(payload: Dict[str, Any]):
+    # persisted in the outbox; joins the caller's transaction when one is open
     if not (WOO_CALLBACK_URL and WOO_HMAC_SECRET):
         return
-    body = json.dumps(payload)
-    sig = hmac.new(WOO_HMAC_SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
-    _webhook_q.put((body, sig, 0))
-    WEBHOOK_QUEUE_SIZE.set(_webhook_q.qsize())
+    db.enqueue_webhook(payload.get("order_id"), payload.get("event"), json.dumps(payload))
+    _wake_webhooks()
 
 
-def _webhook_worker():  # pragma: no cover - network interaction
-    import requests
+def update_webhook_gauge() -> int:
+    try:
+        backlog = db.count_webhook_backlog()
+    except Exception:
+        backlog = 0
+    WEBHOOK_QUEUE_SIZE.set(backlog)
+    return backlog
 
-    while True:
-        body, sig, retry = _webhook_q.get()
+
+def _signed_headers(body: str) -> Dict[str, str]:
+    # the plugin verifies x-weo-sign = HMAC(ts + body); X-Signature (body only) is kept for older receivers
+    ts = str(int(time.time()))
+    key = WOO_HMAC_SECRET.encode()
+    return {
+        "Content-Type": "application/json",
+        "X-WEO-TS": ts,
+        "X-WEO-Sign": hmac.new(key, (ts + body).encode(), hashlib.sha256).hexdigest(),
+        "X-Signature": hmac.new(key, body.encode(), hashlib.sha256).hexdigest(),
+    }
+
+
+def _reschedule(row: Dict[str, Any], error: str) -> Optional[int]:
+    WEBHOOK_COUNTER.labels(status="fail").inc()
+    attempts = row["attempts"] + 1
+    next_at = int(time.time() + WEBHOOK_BACKOFF ** (attempts - 1)) if attempts <= WEBHOOK_RETRIES else None
+    db.retry_webhook(row["id"], attempts, next_at, error)
+    if next_at is None:
+        log.error("webhook_failed", order_id=row["order_id"], webhook_event=row["event"], error=error)
+    return next_at
+
+
+def _deliver_one(session: requests.Session, row: Dict[str, Any]) -> Optional[int]:
+    # returns the retry time when the row was rescheduled
+    body = row["body"]
+    start = time.time()
+    try:
+        r = session.post(WOO_CALLBACK_URL, data=body, headers=_signed_headers(body), timeout=WEBHOOK_TIMEOUT)
+        if r.status_code >= 400:
+            raise Exception(f"status {r.status_code}")
+    except Exception as e:
+        WEBHOOK_LATENCY.labels(status="fail").observe(time.time() - start)
+        return _reschedule(row, str(e))
+    WEBHOOK_LATENCY.labels(status="ok").observe(time.time() - start)
+    WEBHOOK_COUNTER.labels(status="ok").inc()
+    db.complete_webhooks([row["id"]], [row["order_id"]])
+    return None
+
+
+def _coalesce(rows: List[Dict[str, Any]]):
+    # a newer event of the same kind for the same order supersedes the older one
+    latest: Dict[Any, Dict[str, Any]] = {}
+    for row in sorted(rows, key=lambda r: r["id"]):
+        latest[(row["order_id"], row["event"]) if row["order_id"] else row["id"]] = row
+    keep = sorted(latest.values(), key=lambda r: r["id"])
+    kept = {r["id"] for r in keep}
+    return keep, [r for r in rows if r["id"] not in kept]
+
+
+def _deliver_batch(session: requests.Session, rows: List[Dict[str, Any]]) -> List[int]:
+    # one signed JSON array per batch; returns the retry times of rescheduled rows
+    send, superseded = _coalesce(rows)
+    if superseded:
+        WEBHOOK_COUNTER.labels(status="coalesced").inc(len(superseded))
+        db.complete_webhooks([r["id"] for r in superseded], [])
+    body = "[" + ",".join(r["body"] for r in send) + "]"
+    start = time.time()
+    try:
+        r = session.post(WOO_CALLBACK_BATCH_URL, data=body, headers=_signed_headers(body), timeout=WEBHOOK_TIMEOUT)
+        if r.status_code >= 400:
+            raise Exception(f"status {r.status_code}")
+    except Exception as e:
+        WEBHOOK_LATENCY.labels(status="fail").observe(time.time() - start)
+        return [t for t in (_reschedule(row, str(e)) for row in send) if t is not None]
+    WEBHOOK_LATENCY.labels(status="ok").observe(time.time() - start)
+    try:
+        results = r.json().get("results")
+    except Exception:
+        results = None
+    if not isinstance(results, list) or len(results) != len(send) or not all(isinstance(x, dict) for x in results):
+        # a 200 that is not the batch route's answer (proxy page, plugin without
+        # the route) says nothing about which events arrived
+        error = "unmatched batch response"
+        return [t for t in (_reschedule(row, error) for row in send) if t is not None]
+    done = [row for row, res in zip(send, results) if res.get("ok")]
+    WEBHOOK_COUNTER.labels(status="ok").inc(len(done))
+    db.complete_webhooks([row["id"] for row in done], [row["order_id"] for row in done])
+    retries = []
+    for row, res in zip(send, results):
+        if not res.get("ok"):
+            t = _reschedule(row, f"status {res.get('status')}")
+            if t is not None:
+                retries.append(t)
+    return retries
+
+
+def deliver_webhooks(session: requests.Session, limit: int = WEBHOOK_BATCH) -> int:
+    rows = db.claim_webhooks(limit, WEBHOOK_LEASE)
+    if WEBHOOK_BATCH_MODE:
+        for i in range(0, len(rows), WEBHOOK_BATCH_MAX):
+            _deliver_batch(session, rows[i:i + WEBHOOK_BATCH_MAX])
+        return len(rows)
+    for row in rows:
+        _deliver_one(session, row)
+    return len(rows)
+
+
+# Claims due outbox rows and fans them out to a pool of delivery threads. Retry
+# times sit in a heap so the dispatcher wakes when the next backoff expires; rows
+# enqueued by other processes are picked up every WEBHOOK_POLL seconds. In batch mode
+# each job is one POST of up to WEBHOOK_BATCH_MAX events gathered over WEBHOOK_BATCH_WINDOW.
+class WebhookScheduler:
+    def __init__(self, workers: int = WEBHOOK_WORKERS):
+        self.workers = workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook")
+        self._cv = threading.Condition()
+        self._timers: List[float] = []
+        self._inflight = 0
+        self._wakeup = False
+        self._stopped = False
+
+    def wake(self):
+        with self._cv:
+            self._wakeup = True
+            self._cv.notify()
+
+    def stop(self):
+        with self._cv:
+            self._stopped = True
+            self._cv.notify()
+
+    def _attempt(self, rows: List[Dict[str, Any]]):
+        retries: List[int] = []
         try:
-            r = requests.post(
-                WOO_CALLBACK_URL,
-                data=body,
-                headers={"X-Signature": sig, "Content-Type": "application/json"},
-                timeout=10,
-            )
-            if r.status_code >= 400:
-                raise Exception(f"status {r.status_code}")
-            WEBHOOK_COUNTER.labels(status="ok").inc()
-        except Exception:
-            WEBHOOK_COUNTER.labels(status="fail").inc()
-            if retry < WEBHOOK_RETRIES:
-                time.sleep(WEBHOOK_BACKOFF ** retry)
-                _webhook_q.put((body, sig, retry + 1))
+            if WEBHOOK_BATCH_MODE:
+                retries = _deliver_batch(self.session, rows)
+            else:
+                retry_at = _deliver_one(self.session, rows[0])
+                retries = [retry_at] if retry_at is not None else []
+        except Exception as e:
+            log.error("webhook_worker_error", error=str(e))
         finally:
-            WEBHOOK_QUEUE_SIZE.set(_webhook_q.qsize())
+            with self._cv:
+                self._inflight -= 1
+                for t in retries:
+                    heapq.heappush(self._timers, t)
+                self._cv.notify()
+
+    def _wait(self, saturated: bool):
+        with self._cv:
+            if self._wakeup and not saturated:
+                self._wakeup = False
+                if WEBHOOK_BATCH_MODE:
+                    # let the burst accumulate before claiming
+                    deadline = time.time() + WEBHOOK_BATCH_WINDOW
+                    while not self._stopped and time.time() < deadline:
+                        self._cv.wait(deadline - time.time())
+                return
+            now = time.time()
+            while self._timers and self._timers[0] <= now:
+                heapq.heappop(self._timers)
+            timeout = WEBHOOK_POLL
+            if self._timers:
+                timeout = min(timeout, self._timers[0] - now)
+            self._cv.wait(timeout)
+            self._wakeup = False
+
+    def run(self):
+        while not self._stopped:
+            with self._cv:
+                free = self.workers - self._inflight
+            jobs: List[List[Dict[str, Any]]] = []
+            full = free <= 0
+            if free > 0:
+                limit = WEBHOOK_BATCH_MAX if WEBHOOK_BATCH_MODE else min(WEBHOOK_BATCH, free)
+                rows = []
+                try:
+                    rows = db.claim_webhooks(limit, WEBHOOK_LEASE)
+                except Exception as e:
+                    log.error("webhook_worker_error", error=str(e))
+                jobs = ([rows] if rows else []) if WEBHOOK_BATCH_MODE else [[r] for r in rows]
+                full = len(rows) == limit
+                with self._cv:
+                    self._inflight += len(jobs)
+                for job in jobs:
+                    self._pool.submit(self._attempt, job)
+                update_webhook_gauge()
+            if not full:
+                self._wait(saturated=False)
+            elif free <= 0:
+                self._wait(saturated=True)
+        self._pool.shutdown(wait=True)
+
 
+_scheduler: Optional[WebhookScheduler] = None
 
-def advance_state(order: Dict[str, Any], new_state: str, confirmations: Optional[int] = None) -> bool:
+
+def _wake_webhooks():
+    if _scheduler is not None:
+        _scheduler.wake()
+
+
+def _webhook_worker():  # pragma: no cover - network interaction
+    global _scheduler
+    _scheduler = WebhookScheduler()
+    _scheduler.run()
+
+
+def order_changed(order_id: str):
+    # after a committed write that changes what /status reports
+    status_cache.invalidate(order_id)
+    order_events.publish(order_id)
+
+
+def advance_state(
+    order: Dict[str, Any],
+    new_state: str,
+    confirmations: Optional[int] = None,
+    webhook: Optional[Dict[str, Any]] = None,
+) -> bool:
+    # webhook is queued in the same transaction as the state write
     cur = order.get("state") or "awaiting_deposit"
     if new_state == cur:
+        with db.transaction():
+            if confirmations is not None:
+                db.update_state(order["order_id"], cur, confirmations)
+            if webhook:
+                woo_callback(webhook)
+        if webhook:
+            _wake_webhooks()
         if confirmations is not None:
-            db.update_state(order["order_id"], cur, confirmations)
-            update_pending_gauge()
+            order_changed(order["order_id"])
+            # update_state restarts the stuck clock
+            _deadlines.track(order["order_id"], cur, int(time.time()), order.get("deadline_ts"))
         return False
     allowed = STATE_TRANSITIONS.get(cur, set())
     if new_state not in allowed:
@@ -88,67 +346,308 @@ def advance_state(order: Dict[str, Any], new_state: str, confirmations: Optional
     deadline = None
     if new_state in {"escrow_funded", "signing"}:
         deadline = int(time.time()) + SIGNING_DEADLINE_DAYS * 86400
-    db.update_state(order["order_id"], new_state, confirmations, deadline)
+    with db.transaction():
+        db.update_state(order["order_id"], new_state, confirmations, deadline)
+        if webhook:
+            woo_callback(webhook)
+    order_changed(order["order_id"])
+    if webhook:
+        # the wake-up inside woo_callback can race the commit
+        _wake_webhooks()
+    _deadlines.track(order["order_id"], new_state, int(time.time()), deadline or order.get("deadline_ts"))
+    pending = pending_of(order)
     order["state"] = new_state
     if deadline is not None:
         order["deadline_ts"] = deadline
     else:
         order["deadline_ts"] = None
-    update_pending_gauge()
+    adjust_pending_gauge(pending_of(order) - pending)
     return True
 
 
-def _stuck_worker():  # pragma: no cover - background worker
+def _remaining(expires: float) -> float:
+    left = expires - time.time()
+    if left <= 0:
+        raise TimeoutError("escalation timed out")
+    return left
+
+
+def _escalate_deadline(o: Dict[str, Any], expires: float) -> str:
+    # returns the outcome; skipped/failed/timeout are retried later
     from .models import FinalizeReq, BroadcastReq
     from .routes.psbt import psbt_finalize
     from .routes.admin import tx_broadcast
 
+    try:
+        merged = o.get("merged_psbt")
+        if not merged:
+            # rows from before merged PSBTs were stored still hold the raw partials
+            parts = db.get_partials(o["order_id"])
+            if not parts:
+                return "skipped"
+            merged = combine_psbts(parts)
+        pre_dec = decode_psbt(merged)
+        _remaining(expires)
+        signed = rpc("walletprocesspsbt", [merged])
+        pre_sig = sum(len(i.get("partial_signatures", {})) for i in pre_dec.get("inputs", []))
+        signed_psbt = signed.get("psbt", merged)
+        post_dec = decode_psbt(signed_psbt)
+        post_sig = sum(len(i.get("partial_signatures", {})) for i in post_dec.get("inputs", []))
+        if post_sig == pre_sig:
+            STUCK_COUNTER.labels(state="watch_only").inc()
+            log.warning(
+                "deadline_watchonly_escalated",
+                order_id=o["order_id"],
+                sign_count=post_sig,
+            )
+            advance_state(o, "dispute", None, {"event": "dispute_opened", "order_id": o["order_id"]})
+            return "dispute"
+        if post_sig < 2:
+            STUCK_COUNTER.labels(state="insufficient_signatures").inc()
+            log.info(
+                "deadline_escalation_skipped",
+                order_id=o["order_id"],
+                sign_count=post_sig,
+            )
+            return "skipped"
+        final_state = "completed" if o.get("output_type") != "refund" else "refunded"
+        fin = _run_async(
+            psbt_finalize(FinalizeReq(order_id=o["order_id"], psbt=signed_psbt, state=final_state)),
+            _remaining(expires),
+        )
+        _run_async(
+            tx_broadcast(BroadcastReq(order_id=o["order_id"], hex=fin["hex"], state=final_state)),
+            _remaining(expires),
+        )
+        log.info("deadline_escalated", order_id=o["order_id"], state=final_state)
+        return "escalated"
+    except TimeoutError:
+        log.error("deadline_escalation_timeout", order_id=o.get("order_id"), timeout=DEADLINE_TIMEOUT)
+        return "timeout"
+    except Exception as e:
+        log.error("deadline_escalation_failed", order_id=o.get("order_id"), error=str(e))
+        return "failed"
+
+
+def _escalate_order(order_id: str, now: int) -> str:
+    # the lease keeps psbt_merge and other API processes off the order meanwhile
+    if not db.acquire_escalation_lease(order_id, now, now + DEADLINE_LEASE):
+        return "leased"
+    try:
+        # read after taking the lease so no merge can land in between
+        o = db.get_order(order_id)
+        return _escalate_deadline(o, time.time() + DEADLINE_TIMEOUT)
+    finally:
+        db.release_escalation_lease(order_id)
+
+
+# seconds until an escalation with this outcome is tried again; a lease held
+# elsewhere is rechecked once it would have expired
+_ESCALATION_RETRY = {
+    "skipped": STUCK_CHECK_INTERVAL,
+    "failed": STUCK_CHECK_INTERVAL,
+    "timeout": STUCK_CHECK_INTERVAL,
+    "leased": DEADLINE_LEASE,
+}
+
+
+_WATCHED_STATES = ["awaiting_deposit", "signing"]
+
+
+def _due_at(kind: str, o: Dict[str, Any]) -> Optional[int]:
+    # first second at which the order counts as stuck / past its signing deadline
+    if kind == "stuck":
+        if o.get("state") in _WATCHED_STATES and o.get("created_at"):
+            return int(o["created_at"]) + STUCK_ORDER_HOURS * 3600 + 1
+        return None
+    if o.get("state") == "signing" and o.get("deadline_ts"):
+        return int(o["deadline_ts"]) + 1
+    return None
+
+
+# Open orders keyed by when they next need attention, in a min-heap with lazy
+# deletion (_due holds the live entry per order and kind). advance_state keeps it
+# current for this process; rows written by other processes are picked up every
+# STUCK_CHECK_INTERVAL through idx_orders_created. Work per wake-up scales
+# with the number of due orders, not open ones. Stuck orders are reported once per
+# state; escalations run on a pool of DEADLINE_WORKERS threads, each under an order
+# lease and a DEADLINE_TIMEOUT budget, and are retried per _ESCALATION_RETRY.
+class DeadlineScheduler:
+    def __init__(self, workers: int = DEADLINE_WORKERS):
+        self._cv = threading.Condition()
+        self._heap: List[Tuple[int, str, str]] = []
+        self._due: Dict[Tuple[str, str], int] = {}
+        self._running: set = set()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="deadline")
+        self._synced_at: Optional[int] = None
+        self._stopped = False
+
+    def _set(self, order_id: str, kind: str, due: Optional[int]):
+        key = (order_id, kind)
+        if due is None:
+            self._due.pop(key, None)
+        elif self._due.get(key) != due:
+            self._due[key] = due
+            heapq.heappush(self._heap, (due, order_id, kind))
+        if len(self._heap) > 2 * len(self._due) + 64:
+            # drop superseded entries left behind by frequent updates
+            self._heap = [(ts, o, k) for ts, o, k in self._heap if self._due.get((o, k)) == ts]
+            heapq.heapify(self._heap)
+
+    def track(self, order_id: str, state: str, entered_at: int, deadline_ts: Optional[int]):
+        # only a running scheduler (the leader's) keeps deadlines; elsewhere nothing
+        # would ever pop them, and its first sync reads every open order anyway
+        if self._synced_at is None or self._stopped:
+            return
+        self._track(order_id, state, entered_at, deadline_ts)
+
+    def _track(self, order_id: str, state: str, entered_at: int, deadline_ts: Optional[int]):
+        o = {"state": state, "created_at": entered_at, "deadline_ts": deadline_ts}
+        with self._cv:
+            self._set(order_id, "stuck", _due_at("stuck", o))
+            self._set(order_id, "deadline", _due_at("deadline", o))
+            self._cv.notify_all()
+
+    def sync(self, now: int):
+        # first call loads every open order, later ones only rows written since the last sync
+        rows = db.list_deadline_orders(_WATCHED_STATES, self._synced_at)
+        for r in rows:
+            self._track(r["order_id"], r["state"], r["created_at"], r["deadline_ts"])
+        self._synced_at = now
+
+    def pop_due(self, now: int) -> List[Tuple[str, str]]:
+        due = []
+        with self._cv:
+            while self._heap and self._heap[0][0] <= now:
+                ts, order_id, kind = heapq.heappop(self._heap)
+                if self._due.get((order_id, kind)) == ts:
+                    del self._due[(order_id, kind)]
+                    due.append((order_id, kind))
+        return due
+
+    def run_once(self, now: Optional[int] = None):
+        now = now or int(time.time())
+        if self._synced_at is None or now - self._synced_at >= STUCK_CHECK_INTERVAL:
+            self.sync(now)
+        for order_id, kind in self.pop_due(now):
+            o = db.get_order(order_id)
+            if not o:
+                continue
+            due = _due_at(kind, o)
+            if due is None:
+                continue
+            if due > now:
+                # changed by another process since it was scheduled
+                with self._cv:
+                    self._set(order_id, kind, due)
+                continue
+            if kind == "stuck":
+                state = o.get("state") or "unknown"
+                age_h = (now - int(o["created_at"])) / 3600
+                STUCK_COUNTER.labels(state=state).inc()
+                log.warning("order_stuck", order_id=order_id, state=state, age_hours=age_h)
+                continue
+            with self._cv:
+                if order_id in self._running:
+                    continue
+                self._running.add(order_id)
+                DEADLINE_QUEUE.set(len(self._running))
+            self._pool.submit(self._escalate, order_id, now)
+
+    def _escalate(self, order_id: str, now: int):
+        result = "failed"
+        try:
+            result = _escalate_order(order_id, now)
+        except Exception as e:
+            log.error("deadline_escalation_failed", order_id=order_id, error=str(e))
+        finally:
+            DEADLINE_ESCALATIONS.labels(result=result).inc()
+            retry = _ESCALATION_RETRY.get(result)
+            with self._cv:
+                self._running.discard(order_id)
+                DEADLINE_QUEUE.set(len(self._running))
+                if retry is not None:
+                    self._set(order_id, "deadline", int(time.time()) + retry)
+                self._cv.notify_all()
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        with self._cv:
+            return self._cv.wait_for(lambda: not self._running, timeout)
+
+    def next_wake(self) -> float:
+        with self._cv:
+            wake = (self._synced_at or 0) + STUCK_CHECK_INTERVAL
+            if self._heap:
+                wake = min(wake, self._heap[0][0])
+        return wake
+
+    def stop(self):
+        with self._cv:
+            self._stopped = True
+            self._heap.clear()
+            self._due.clear()
+            self._cv.notify_all()
+
+    def run(self):
+        try:
+            while not self._stopped:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    log.error("stuck_worker_error", error=str(e))
+                with self._cv:
+                    delay = self.next_wake() - time.time()
+                    if delay > 0 and not self._stopped:
+                        self._cv.wait(delay)
+        finally:
+            self._pool.shutdown(wait=False)
+
+
+_deadlines = DeadlineScheduler()
+
+
+def _stuck_worker():  # pragma: no cover - background worker
+    _deadlines.run()
+
+
+_funding: Optional[FundingWatcher] = None
+
+
+def start_singleton_workers():
+    # run by the elected leader only; fresh schedulers so a re-elected process resyncs
+    global _scheduler, _deadlines, _funding
+    _deadlines = DeadlineScheduler()
+    threading.Thread(target=_deadlines.run, daemon=True).start()
+    if FUNDING_POLL > 0:
+        _funding = FundingWatcher()
+        threading.Thread(target=_funding.run, daemon=True).start()
+    if WOO_CALLBACK_URL and WOO_HMAC_SECRET:
+        _scheduler = WebhookScheduler()
+        threading.Thread(target=_scheduler.run, daemon=True).start()
+
+
+def stop_singleton_workers():
+    global _scheduler, _funding
+    if _scheduler is not None:
+        _scheduler.stop()
+        _scheduler = None
+    if _funding is not None:
+        _funding.stop()
+        _funding = None
+    _deadlines.stop()
+
+
+def _pending_reconciler():  # pragma: no cover - background worker
+    # every process keeps its own gauge and only sees its own deltas
+    while True:
+        time.sleep(PENDING_RECONCILE)
+        update_pending_gauge()
+
+
+def _utxo_watcher():  # pragma: no cover - background worker
     while True:
         try:
-            now = int(time.time())
-            orders = db.list_orders_by_states(["awaiting_deposit", "signing"])
-            for o in orders:
-                age_h = (now - (o.get("created_at") or now)) / 3600
-                if age_h > STUCK_ORDER_HOURS:
-                    state = o.get("state") or "unknown"
-                    STUCK_COUNTER.labels(state=state).inc()
-                    log.warning("order_stuck", order_id=o.get("order_id"), state=state, age_hours=age_h)
-                if (o.get("state") == "signing" and o.get("deadline_ts") and now > int(o["deadline_ts"])):
-                    try:
-                        parts = db.get_partials(o["order_id"])
-                        if not parts:
-                            continue
-                        merged = rpc("combinepsbt", [parts])
-                        pre_dec = rpc("decodepsbt", [merged])
-                        pre_sig = sum(len(i.get("partial_signatures", {})) for i in pre_dec.get("inputs", []))
-                        signed = rpc("walletprocesspsbt", [merged])
-                        signed_psbt = signed.get("psbt", merged)
-                        post_dec = rpc("decodepsbt", [signed_psbt])
-                        post_sig = sum(len(i.get("partial_signatures", {})) for i in post_dec.get("inputs", []))
-                        if post_sig == pre_sig:
-                            STUCK_COUNTER.labels(state="watch_only").inc()
-                            log.warning(
-                                "deadline_watchonly_escalated",
-                                order_id=o["order_id"],
-                                sign_count=post_sig,
-                            )
-                            advance_state(o, "dispute")
-                            woo_callback({"event": "dispute_opened", "order_id": o["order_id"]})
-                            continue
-                        if post_sig < 2:
-                            STUCK_COUNTER.labels(state="insufficient_signatures").inc()
-                            log.info(
-                                "deadline_escalation_skipped",
-                                order_id=o["order_id"],
-                                sign_count=post_sig,
-                            )
-                            continue
-                        final_state = "completed" if o.get("output_type") != "refund" else "refunded"
-                        fin = psbt_finalize(FinalizeReq(order_id=o["order_id"], psbt=signed_psbt, state=final_state))
-                        tx_broadcast(BroadcastReq(order_id=o["order_id"], hex=fin["hex"], state=final_state))
-                        log.info("deadline_escalated", order_id=o["order_id"], state=final_state)
-                    except Exception as e:
-                        log.error("deadline_escalation_failed", order_id=o.get("order_id"), error=str(e))
+            utxo_index.refresh()
         except Exception as e:
-            log.error("stuck_worker_error", error=str(e))
-        time.sleep(STUCK_CHECK_INTERVAL)
+            log.error("utxo_watcher_error", error=str(e))
+        time.sleep(UTXO_INDEX_POLL)
@@ -0,0 +1,149 @@
+import base64
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ.setdefault("ALLOW_ORIGINS", "http://test")
+os.environ.setdefault("ORDERS_DB", tempfile.mkstemp()[1])
+sys.path.insert(0, os.path.dirname(__file__))
+
+# BIP-173 / BIP-350 vectors
+P2WPKH = bytes.fromhex("0014751e76e8199196d454941c45d1b3a323f1433bd6")
+P2WSH = bytes.fromhex("00201863143c14c5166804bd19203356da136c985678cd4d27a1b8c6329604903262")
+P2TR = bytes.fromhex("512079be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798")
+
+
+def _cs(n):
+    return bytes([n])
+
+
+def _kv(key, val):
+    return _cs(len(key)) + key + _cs(len(val)) + val
+
+
+def make_psbt(outputs, in_values, sigs=(), extra_global=b""):
+    tx = (1).to_bytes(4, "little") + _cs(len(in_values))
+    for i in range(len(in_values)):
+        tx += bytes([i + 1]) * 32 + i.to_bytes(4, "little") + b"\x00" + (0xFFFFFFFD).to_bytes(4, "little")
+    tx += _cs(len(outputs))
+    for script, value in outputs:
+        tx += value.to_bytes(8, "little") + _cs(len(script)) + script
+    tx += (0).to_bytes(4, "little")
+    out = b"psbt\xff" + _kv(b"\x00", tx) + extra_global + b"\x00"
+    for i, value in enumerate(in_values):
+        out += _kv(b"\x01", value.to_bytes(8, "little") + _cs(len(P2WSH)) + P2WSH)
+        for signer in (sigs[i] if i < len(sigs) else ()):
+            out += _kv(b"\x02" + bytes([2, signer]) + b"\x00" * 31, bytes([0x30, signer]) * 35)
+        out += b"\x00"
+    out += b"\x00" * len(outputs)
+    return base64.b64encode(out).decode()
+
+
+@pytest.fixture
+def bip174():
+    return importlib.import_module("python_api.bip174")
+
+
+def test_decode_matches_core_shape(bip174):
+    psbt = make_psbt([(P2WPKH, 50000), (P2TR, 1000)], [40000, 12000], sigs=((0,), (0, 1)))
+    dec = bip174.decode_psbt(psbt, "bc")
+    vout = dec["tx"]["vout"]
+    assert vout[0]["scriptPubKey"]["addresses"] == ["bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4"]
+    assert vout[1]["scriptPubKey"]["address"] == "bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqzk5jj0"
+    assert int(round(vout[0]["value"] * 1e8)) == 50000
+    assert dec["tx"]["vin"][1]["txid"] == "02" * 32
+    assert dec["tx"]["vin"][1]["vout"] == 1
+    assert [len(i["partial_signatures"]) for i in dec["inputs"]] == [1, 2]
+    assert dec["inputs"][0]["witness_utxo"]["scriptPubKey"]["address"] == (
+        "bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3qccfmv3"
+    )
+    assert int(round(dec["fee"] * 1e8)) == 1000
+    assert bip174.decode_psbt(psbt, "tb")["inputs"][0]["witness_utxo"]["scriptPubKey"]["address"] == (
+        "tb1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3q0sl5k7"
+    )
+    assert bip174.PSBT.from_base64(psbt).to_base64() == psbt
+
+
+@pytest.mark.parametrize("bad", [
+    "merged",
+    base64.b64encode(b"psbt\xff").decode(),
+    make_psbt([(P2WPKH, 1)], [2])[:-8],
+    make_psbt([(bytes.fromhex("76a914") + b"\x00" * 20 + bytes.fromhex("88ac"), 1)], [2]),
+    make_psbt([(P2WPKH, 1)], [2], extra_global=_kv(b"\x00", b"\x00")),
+    make_psbt([(P2WPKH, 1)], [2], extra_global=_kv(b"\xfb", (2).to_bytes(4, "little"))),
+])
+def test_unsupported_input_raises(bip174, bad):
+    with pytest.raises(bip174.PSBTError):
+        bip174.decode_psbt(bad, "tb")
+
+
+def test_core_only_used_as_fallback(bip174, monkeypatch):
+    rpc_module = importlib.import_module("python_api.rpc")
+    calls = []
+
+    def stub_rpc(method, params=None):
+        calls.append(method)
+        if method == "getblockchaininfo":
+            return {"chain": "test"}
+        return {"tx": {"vout": []}, "inputs": []}
+
+    monkeypatch.setattr(rpc_module, "rpc", stub_rpc)
+    monkeypatch.setattr(rpc_module, "BTC_NETWORK", "")
+    monkeypatch.setattr(rpc_module, "_hrp", None)
+    for _ in range(3):
+        dec = rpc_module.decode_psbt(make_psbt([(P2WSH, 1000)], [2000]))
+        assert dec["tx"]["vout"][0]["scriptPubKey"]["address"].startswith("tb1q")
+    assert calls == ["getblockchaininfo"]
+    rpc_module.decode_psbt("merged")
+    assert calls == ["getblockchaininfo", "decodepsbt"]
+
+
+def test_combine_merges_signatures_per_key(bip174):
+    a = make_psbt([(P2WSH, 1000)], [2000, 3000], sigs=((0,), ()))
+    b = make_psbt([(P2WSH, 1000)], [2000, 3000], sigs=((1,), (1,)))
+    merged = bip174.combine_psbts([a, b, a])
+    dec = bip174.decode_psbt(merged, "tb")
+    assert [sorted(i["partial_signatures"]) for i in dec["inputs"]] == [
+        ["02" + "00" * 32, "02" + "01" + "00" * 31],
+        ["02" + "01" + "00" * 31],
+    ]
+    assert bip174.psbt_hash(bip174.combine_psbts([b, a])) == bip174.psbt_hash(merged)
+    assert bip174.psbt_hash(merged) != bip174.psbt_hash(a)
+    other_tx = make_psbt([(P2WSH, 999)], [2000, 3000], sigs=((1,), ()))
+    with pytest.raises(bip174.PSBTError):
+        bip174.combine_psbts([a, other_tx])
+
+
+def test_segwit_address_decode(bip174):
+    for script, addr in ((P2WPKH, "BC1QW508D6QEJXTDG4Y5R3ZARVARY0C5XW7KV8F3T4"), (P2TR, None)):
+        addr = addr or bip174.segwit_address("tb", 1, memoryview(script)[2:])
+        hrp, version, program = bip174.decode_segwit_address(addr)
+        assert (version, program) == (script[0] and script[0] - 0x50, script[2:])
+    assert bip174.decode_segwit_address(bip174.segwit_address("bcrt", 0, memoryview(P2WSH)[2:]))[0] == "bcrt"
+    for bad in ("tb1qseller111", "bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t5", "Bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4",
+                bip174.segwit_address("bc", 0, memoryview(bytes(21)))):
+        with pytest.raises(bip174.PSBTError):
+            bip174.decode_segwit_address(bad)
+
+
+@pytest.mark.parametrize("n_inputs, scripts", [(1, [P2WPKH]), (2, [P2WSH]), (3, [P2TR, P2WPKH]), (300, [P2WPKH])])
+def test_spend_weight_matches_signed_tx(bip174, n_inputs, scripts):
+    txsize = importlib.import_module("python_api.txsize")
+
+    def cs(n):
+        return bytes([n]) if n < 0xFD else b"\xfd" + n.to_bytes(2, "little")
+
+    # a fully signed escrow spend: 72-byte signatures, 2-of-3 witness script
+    script = b"\x52" + (b"\x21" + b"\x02" * 33) * 3 + b"\x53\xae"
+    witness = b"\x04\x00" + (b"\x48" + b"\x30" * 72) * 2 + cs(len(script)) + script
+    ins = cs(n_inputs) + (b"\x11" * 36 + b"\x00" + b"\xfd\xff\xff\xff") * n_inputs
+    outs = cs(len(scripts)) + b"".join((1000).to_bytes(8, "little") + cs(len(s)) + s for s in scripts)
+    base = (2).to_bytes(4, "little") + ins + outs + bytes(4)
+    full = (2).to_bytes(4, "little") + b"\x00\x01" + ins + outs + witness * n_inputs + bytes(4)
+    addrs = [bip174.segwit_address("tb", s[0] and s[0] - 0x50, memoryview(s)[2:]) for s in scripts]
+    assert txsize.spend_weight(n_inputs, addrs, "tb") == 3 * len(base) + len(full)
+    with pytest.raises(bip174.PSBTError):
+        txsize.spend_weight(n_inputs, addrs, "bc")
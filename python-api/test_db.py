@@ -0,0 +1,179 @@
+import importlib
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def real_db(monkeypatch):
+    fd, db_path = tempfile.mkstemp()
+    os.close(fd)
+    sys.path.insert(0, os.path.dirname(__file__))
+    sys.modules.pop("db", None)
+    db = importlib.import_module("db")
+    monkeypatch.setattr(db, "DB_PATH", db_path)
+    db.init_db()
+    yield db
+    db.close_conn()
+
+
+def test_connection_reuse_and_wal(real_db):
+    db = real_db
+    conn = db.get_conn()
+    assert db.get_conn() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    db.upsert_order("o1", "desc", db.next_index(), 1, "escrow:o1", 1000, 10)
+    db.save_partials("o1", ["p1", "p2"])
+    assert db.get_partials("o1") == ["p1", "p2"]
+    assert db.get_order("o1")["index"] == 0
+    assert db.next_index() == 1
+
+
+def test_threads_get_own_connections(real_db):
+    db = real_db
+    db.upsert_order("o1", "desc", 0, 1, "escrow:o1", 1000, 10)
+    conns = []
+
+    def work(i):
+        conns.append(db.get_conn())
+        db.update_funding("o1", f"tx{i}", i, i)
+        assert db.get_order("o1") is not None
+        db.close_conn()
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(c) for c in conns}) == 4
+    assert db.get_conn() not in conns
+
+
+def test_rbf_roundtrip(real_db):
+    db = real_db
+    db.upsert_order("o1", "desc", 0, 1, "escrow:o1", 1000, 10)
+    db.update_state("o1", "completed")
+    db.start_rbf("o1", "psbt")
+    assert db.get_order("o1")["state"] == "rbf_signing"
+    assert db.get_rbf_psbt("o1") == "psbt"
+    db.clear_rbf("o1")
+    assert db.get_order("o1")["state"] == "completed"
+
+
+def test_merge_state_compare_and_swap(real_db):
+    db = real_db
+    db.upsert_order("o1", "desc", 0, 1, "escrow:o1", 1000, 10)
+    assert db.get_merge_state("o1") == (None, [])
+    assert db.save_merge_state("o1", "m1", ["h1"], None)
+    assert not db.save_merge_state("o1", "m2", ["h1", "h2"], None)
+    assert db.save_merge_state("o1", "m2", ["h1", "h2"], "m1")
+    assert db.get_merge_state("o1") == ("m2", ["h1", "h2"])
+    assert db.count_pending_signatures() == 0
+    db.update_state("o1", "completed")
+    db.start_rbf("o1", "psbt")
+    assert db.get_merge_state("o1") == (None, [])
+    assert db.save_merge_state("o1", "r1", ["h3"], None, rbf=True)
+    assert db.get_merge_state("o1", rbf=True) == ("r1", ["h3"])
+
+
+def test_migrations_upgrade_legacy_schema(monkeypatch):
+    fd, db_path = tempfile.mkstemp()
+    os.close(fd)
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE orders(order_id TEXT PRIMARY KEY, descriptor TEXT, "index" INTEGER, min_conf INTEGER, label TEXT, created_at INTEGER, state TEXT, funding_txid TEXT, vout INTEGER, confirmations INTEGER, partials TEXT, last_webhook_ts INTEGER)')
+    conn.execute("INSERT INTO orders(order_id, label, state) VALUES('old', 'escrow:old', 'signing')")
+    conn.commit()
+    conn.close()
+    sys.modules.pop("db", None)
+    db = importlib.import_module("db")
+    monkeypatch.setattr(db, "DB_PATH", db_path)
+    db.init_db()
+    assert db.schema_version() == len(db.MIGRATIONS)
+    assert db.get_order("old")["deadline_ts"] is None
+    plan = db.get_conn().execute("EXPLAIN QUERY PLAN SELECT * FROM orders WHERE state IN ('signing')").fetchall()
+    assert "idx_orders_state_deadline" in " ".join(r[-1] for r in plan)
+    db.init_db()
+    assert db.schema_version() == len(db.MIGRATIONS)
+    db.close_conn()
+
+
+def test_partials_and_outputs_move_to_child_tables(monkeypatch):
+    fd, db_path = tempfile.mkstemp()
+    os.close(fd)
+    sys.modules.pop("db", None)
+    db = importlib.import_module("db")
+    monkeypatch.setattr(db, "DB_PATH", db_path)
+    migrations = db.MIGRATIONS
+    monkeypatch.setattr(db, "MIGRATIONS", migrations[:9])
+    db.init_db()
+    conn = db.get_conn()
+    for oid in ("old", "new", "rbf"):
+        db.upsert_order(oid, "desc", 0, 1, f"escrow:{oid}", 1000, 10)
+    # raw partials from before merged PSBTs, hashes next to a merged PSBT, RBF hashes
+    conn.execute(
+        "UPDATE orders SET state='signing', partials=?, outputs=? WHERE order_id='old'",
+        ('["p1", "p2"]', '{"bc1qa": 1000}'),
+    )
+    conn.execute("UPDATE orders SET state='signing', partials='[\"h1\"]', merged_psbt='m' WHERE order_id='new'")
+    conn.execute("UPDATE orders SET rbf_partials='[\"r1\"]', rbf_merged_psbt='rm' WHERE order_id='rbf'")
+    monkeypatch.setattr(db, "MIGRATIONS", migrations)
+    db.init_db()
+
+    assert db.get_partials("old") == ["p1", "p2"]
+    assert db.get_merge_state("old") == (None, ["p1", "p2"])
+    assert db.get_outputs("old") == {"bc1qa": 1000}
+    assert db.get_merge_state("new") == ("m", ["h1"])
+    assert db.get_merge_state("rbf", rbf=True) == ("rm", ["r1"])
+    assert db.get_order("old")["partials"] is None
+    assert db.count_pending_signatures() == 1
+
+    # folding the raw partials into a merged PSBT keeps one row per signature
+    assert db.save_merge_state("old", "m2", ["hp1", "hp2"], None)
+    assert db.get_merge_state("old") == ("m2", ["hp1", "hp2"])
+    assert db.save_merge_state("new", "m3", ["h1", "h2"], "m")
+    assert db.save_merge_state("new", "m4", ["h1", "h2"], "m3")
+    assert db.get_order("new")["partial_count"] == 2
+    assert db.count_pending_signatures() == 0
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT SUM(MAX(2 - partial_count, 0)) FROM orders WHERE state='signing'"
+    ).fetchall()
+    assert "idx_orders_state_deadline" in " ".join(r[-1] for r in plan)
+
+    db.set_outputs("old", {"bc1qb": 900}, "refund")
+    assert db.get_outputs("old") == {"bc1qb": 900}
+    db.update_state("new", "completed")
+    db.start_rbf("new", "psbt")
+    assert db.get_merge_state("new") == (None, [])
+    assert db.get_order("new")["partial_count"] == 0
+    db.close_conn()
+
+
+def _allocate(args):
+    db_path, count = args
+    sys.modules.pop("db", None)
+    db = importlib.import_module("db")
+    db.DB_PATH = db_path
+    db.INDEX_BLOCK_SIZE = 3
+    return [db.next_index() for _ in range(count)]
+
+
+def test_index_allocator_no_collisions(real_db, monkeypatch):
+    import multiprocessing
+    from concurrent.futures import ThreadPoolExecutor
+    db = real_db
+    db.upsert_order("existing", "desc", 41, 1, "escrow:existing", 1000, 10)
+    db.get_conn().execute("UPDATE index_alloc SET next_index=42")
+    monkeypatch.setattr(db, "INDEX_BLOCK_SIZE", 5)
+    with ThreadPoolExecutor(8) as ex:
+        local = [i for part in ex.map(lambda _: [db.next_index() for _ in range(50)], range(8)) for i in part]
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        remote = [i for part in pool.map(_allocate, [(db.DB_PATH, 50)] * 4) for i in part]
+    allocated = local + remote
+    assert len(allocated) == len(set(allocated)) == 600
+    assert min(allocated) == 42
+    db.claim_index(10_000)
+    assert db.reserve_index_block(1) == 10_001
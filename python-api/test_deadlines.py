@@ -0,0 +1,155 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    fd, db_path = tempfile.mkstemp()
+    os.close(fd)
+    monkeypatch.setenv("ORDERS_DB", db_path)
+    monkeypatch.setenv("ALLOW_ORIGINS", "http://test")
+    sys.path.insert(0, os.path.dirname(__file__))
+    sys.modules.pop("db", None)
+    for m in [k for k in list(sys.modules) if k.startswith("python_api")]:
+        sys.modules.pop(m, None)
+    import python_api.workers as workers
+
+    yield workers
+    workers.db.close_conn()
+
+
+def _order(db, order_id, state, created_at, deadline_ts=None):
+    db.upsert_order(order_id, "desc", 0, 1, f"escrow:{order_id}", 1000, 10)
+    db.get_conn().execute(
+        "UPDATE orders SET state=?, created_at=?, deadline_ts=? WHERE order_id=?",
+        (state, created_at, deadline_ts, order_id),
+    )
+
+
+def test_scheduler_only_loads_due_orders(workers, monkeypatch):
+    db = workers.db
+    now = int(time.time())
+    _order(db, "stuck", "awaiting_deposit", now - 25 * 3600)
+    _order(db, "late", "signing", now - 60, now - 1)
+    _order(db, "soon", "signing", now - 60, now + 100)
+    for i in range(50):
+        _order(db, f"done{i}", "completed", now - 30 * 86400)
+
+    loaded, escalated, stuck = [], [], []
+    get_order = db.get_order
+    monkeypatch.setattr(db, "get_order", lambda oid: loaded.append(oid) or get_order(oid))
+    monkeypatch.setattr(workers, "_escalate_deadline", lambda o, expires: escalated.append(o["order_id"]) or "skipped")
+    monkeypatch.setattr(workers.log, "warning", lambda event, **kw: stuck.append(kw["order_id"]))
+
+    s = workers.DeadlineScheduler()
+    s.run_once(now)
+    assert s.wait_idle(5)
+    assert set(loaded) == {"late", "stuck"}
+    n = len(loaded)
+    assert escalated == ["late"] and stuck == ["stuck"]
+    assert s.next_wake() == now + 101
+    assert get_order("late")["lease_until"] is None
+
+    # the failed escalation comes back after STUCK_CHECK_INTERVAL, the stuck report does not
+    s.run_once(now + 1)
+    assert len(loaded) == n
+    workers._deadlines = s
+    order = get_order("soon")
+    workers.advance_state(order, "dispute")
+    s.run_once(now + 200)
+    assert len(loaded) == n
+
+    # rows written by another process are picked up on the next sync
+    _order(db, "other", "signing", now + 500, now + 550)
+    s.run_once(now + workers.STUCK_CHECK_INTERVAL)
+    assert s.wait_idle(5)
+    assert set(loaded[n:]) == {"late", "other"}
+    assert sorted(escalated) == ["late", "late", "other"]
+
+
+def test_followers_do_not_track_deadlines(workers, monkeypatch):
+    db = workers.db
+    now = int(time.time())
+    for i in range(20):
+        _order(db, f"o{i}", "awaiting_deposit", now - 60)
+    # a process that is not the leader never runs its scheduler
+    s = workers.DeadlineScheduler()
+    monkeypatch.setattr(workers, "_deadlines", s)
+    for i in range(20):
+        workers.advance_state(db.get_order(f"o{i}"), "escrow_funded")
+    assert s._heap == [] and s._due == {}
+
+    # once running, changes are tracked; a stopped scheduler lets go of them
+    s.run_once(now)
+    workers.advance_state(db.get_order("o0"), "signing")
+    assert s._due[("o0", "deadline")] == workers._due_at("deadline", db.get_order("o0"))
+    s.stop()
+    workers.advance_state(db.get_order("o1"), "signing")
+    assert s._heap == [] and s._due == {}
+
+
+def test_escalations_run_in_parallel_under_a_lease(workers, monkeypatch):
+    db = workers.db
+    now = int(time.time())
+    for i in range(8):
+        _order(db, f"o{i}", "signing", now - 60, now - 1)
+    db.get_conn().execute("UPDATE orders SET merged_psbt='m' WHERE order_id='o0'")
+    merges = []
+
+    def slow(o, expires):
+        # psbt_merge's compare-and-swap is refused while the lease is held
+        merges.append(db.save_merge_state(o["order_id"], "m2", [], o["merged_psbt"]))
+        assert not db.acquire_escalation_lease(o["order_id"], now, now + 60)
+        time.sleep(0.2)
+        return "escalated"
+
+    monkeypatch.setattr(workers, "_escalate_deadline", slow)
+    s = workers.DeadlineScheduler(workers=4)
+    start = time.time()
+    s.run_once(now)
+    s.run_once(now)  # already running orders are not queued twice
+    assert s.wait_idle(5)
+    assert time.time() - start < 0.7
+    assert merges == [False] * 8
+    assert not db.escalation_leased("o0")
+    assert db.save_merge_state("o0", "m2", [], "m")
+
+
+def test_pending_gauge_follows_deltas(workers, monkeypatch):
+    import asyncio
+    import python_api.routes.psbt as psbt
+    from python_api.models import MergeReq
+
+    db = workers.db
+    gauge = workers.PENDING_SIG._value
+    now = int(time.time())
+    _order(db, "a", "escrow_funded", now)
+    _order(db, "b", "escrow_funded", now)
+    workers.update_pending_gauge()
+    assert gauge.get() == 0
+
+    recounts = []
+    monkeypatch.setattr(db, "count_pending_signatures", lambda: recounts.append(1) or 0)
+    workers.advance_state(db.get_order("a"), "signing")
+    workers.advance_state(db.get_order("b"), "signing")
+    assert gauge.get() == 4
+
+    async def combine(parts):
+        return "+".join(parts)
+
+    monkeypatch.setattr(psbt, "acombine_psbts", combine)
+    monkeypatch.setattr(psbt, "psbt_hash", lambda p: p)
+    asyncio.run(psbt.psbt_merge(MergeReq(order_id="a", partials=["cDE="])))
+    asyncio.run(psbt.psbt_merge(MergeReq(order_id="a", partials=["cDE=", "cDI=", "cDM="])))
+    assert gauge.get() == 2
+    workers.advance_state(db.get_order("b"), "dispute")
+    assert gauge.get() == 0
+    assert recounts == []
+
+    monkeypatch.undo()
+    workers.update_pending_gauge()
+    assert gauge.get() == db.count_pending_signatures() == 0
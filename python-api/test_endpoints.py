@@ -9,10 +9,10 @@ def create_client(monkeypatch):
     monkeypatch.setenv("ALLOW_ORIGINS", "http://test")
     monkeypatch.setenv("API_KEYS", "testkey")
     stub = types.ModuleType("db")
-    import sqlite3, json, time
+    import contextlib, sqlite3, json, time
     def init_db():
         conn = sqlite3.connect(db_path); conn.row_factory=sqlite3.Row; cur = conn.cursor()
-        cur.execute("CREATE TABLE orders(order_id TEXT PRIMARY KEY, descriptor TEXT, idx INTEGER, min_conf INTEGER, label TEXT, amount_sat INTEGER, fee_est_sat INTEGER, created_at INTEGER, state TEXT, funding_txid TEXT, vout INTEGER, confirmations INTEGER, partials TEXT, rbf_partials TEXT, outputs TEXT, output_type TEXT, last_webhook_ts INTEGER, payout_txid TEXT, deadline_ts INTEGER, rbf_psbt TEXT, rbf_state TEXT)")
+        cur.execute("CREATE TABLE orders(order_id TEXT PRIMARY KEY, descriptor TEXT, idx INTEGER, min_conf INTEGER, label TEXT, amount_sat INTEGER, fee_est_sat INTEGER, created_at INTEGER, state TEXT, funding_txid TEXT, vout INTEGER, confirmations INTEGER, partials TEXT, rbf_partials TEXT, outputs TEXT, output_type TEXT, last_webhook_ts INTEGER, payout_txid TEXT, deadline_ts INTEGER, rbf_psbt TEXT, rbf_state TEXT, merged_psbt TEXT, rbf_merged_psbt TEXT)")
         conn.commit(); conn.close()
     def next_index():
         conn = sqlite3.connect(db_path); conn.row_factory=sqlite3.Row; cur = conn.execute("SELECT MAX(idx) FROM orders"); row = cur.fetchone(); conn.close(); return (row[0]+1) if row and row[0] is not None else 0
@@ -39,22 +39,40 @@ def create_client(monkeypatch):
         conn=sqlite3.connect(db_path); conn.row_factory=sqlite3.Row; cur=conn.execute("SELECT rbf_partials FROM orders WHERE order_id=?", (order_id,)); row=cur.fetchone(); conn.close(); import json as js; return js.loads(row[0]) if row and row[0] else []
     def set_payout_txid(order_id, txid):
         conn=sqlite3.connect(db_path); conn.row_factory=sqlite3.Row; conn.execute("UPDATE orders SET payout_txid=? WHERE order_id=?", (txid, order_id)); conn.commit(); conn.close()
-    def update_funding(order_id, txid, vout, conf):
+    def update_funding(order_id, txid, vout, conf, funding=None):
         conn=sqlite3.connect(db_path); conn.row_factory=sqlite3.Row; conn.execute("UPDATE orders SET funding_txid=?, vout=?, confirmations=? WHERE order_id=?", (txid, vout, conf, order_id)); conn.commit(); conn.close()
     def start_rbf(order_id, psbt):
-        conn=sqlite3.connect(db_path); conn.row_factory=sqlite3.Row; cur=conn.execute("SELECT state FROM orders WHERE order_id=?", (order_id,)); row=cur.fetchone(); prev=row[0] if row else None; conn.execute("UPDATE orders SET rbf_psbt=?, rbf_partials=NULL, partials=NULL, rbf_state=?, state='rbf_signing' WHERE order_id=?", (psbt, prev, order_id)); conn.commit(); conn.close()
+        conn=sqlite3.connect(db_path); conn.row_factory=sqlite3.Row; cur=conn.execute("SELECT state FROM orders WHERE order_id=?", (order_id,)); row=cur.fetchone(); prev=row[0] if row else None; conn.execute("UPDATE orders SET rbf_psbt=?, rbf_partials=NULL, partials=NULL, rbf_merged_psbt=NULL, merged_psbt=NULL, rbf_state=?, state='rbf_signing' WHERE order_id=?", (psbt, prev, order_id)); conn.commit(); conn.close()
     def get_rbf_psbt(order_id):
         conn=sqlite3.connect(db_path); conn.row_factory=sqlite3.Row; cur=conn.execute("SELECT rbf_psbt FROM orders WHERE order_id=?", (order_id,)); row=cur.fetchone(); conn.close(); return row[0] if row and row[0] else None
     def clear_rbf(order_id):
-        conn=sqlite3.connect(db_path); conn.row_factory=sqlite3.Row; cur=conn.execute("SELECT rbf_state FROM orders WHERE order_id=?", (order_id,)); row=cur.fetchone(); nxt=row[0] if row else None; conn.execute("UPDATE orders SET rbf_psbt=NULL, rbf_partials=NULL, rbf_state=NULL, state=? WHERE order_id=?", (nxt, order_id)); conn.commit(); conn.close()
+        conn=sqlite3.connect(db_path); conn.row_factory=sqlite3.Row; cur=conn.execute("SELECT rbf_state FROM orders WHERE order_id=?", (order_id,)); row=cur.fetchone(); nxt=row[0] if row else None; conn.execute("UPDATE orders SET rbf_psbt=NULL, rbf_partials=NULL, rbf_merged_psbt=NULL, rbf_state=NULL, state=? WHERE order_id=?", (nxt, order_id)); conn.commit(); conn.close()
     stub.init_db=init_db; stub.next_index=next_index; stub.upsert_order=upsert_order
     stub.get_order=get_order; stub.update_state=update_state; stub.set_outputs=set_outputs
     stub.get_outputs=get_outputs; stub.save_partials=save_partials; stub.get_partials=get_partials
     stub.save_rbf_partials=save_rbf_partials; stub.get_rbf_partials=get_rbf_partials
     stub.set_payout_txid=set_payout_txid; stub.update_funding=update_funding
     stub.start_rbf=start_rbf; stub.get_rbf_psbt=get_rbf_psbt; stub.clear_rbf=clear_rbf
+    def get_merge_state(order_id, rbf=False):
+        mcol, pcol = ('rbf_merged_psbt', 'rbf_partials') if rbf else ('merged_psbt', 'partials')
+        conn=sqlite3.connect(db_path); cur=conn.execute(f"SELECT {mcol}, {pcol} FROM orders WHERE order_id=?", (order_id,)); row=cur.fetchone(); conn.close(); return (row[0], json.loads(row[1]) if row[1] else []) if row else (None, [])
+    def save_merge_state(order_id, merged, hashes, expected, rbf=False):
+        mcol, pcol = ('rbf_merged_psbt', 'rbf_partials') if rbf else ('merged_psbt', 'partials')
+        conn=sqlite3.connect(db_path); cur=conn.execute(f"UPDATE orders SET {mcol}=?, {pcol}=? WHERE order_id=? AND {mcol} IS ?", (merged, json.dumps(hashes), order_id, expected)); conn.commit(); conn.close(); return cur.rowcount == 1
+    stub.get_merge_state=get_merge_state; stub.save_merge_state=save_merge_state
+    stub.transaction=contextlib.nullcontext
+    stub.count_webhook_backlog=lambda: 0
+    stub.claim_index=lambda index: None
+    stub.get_orders=lambda ids: {o: r for o, r in ((o, get_order(o)) for o in ids) if r}
     stub.count_pending_signatures=lambda:0
     stub.list_orders_by_states=lambda states: []
+    stub.list_deadline_orders=lambda states, since=None: []
+    stub.acquire_escalation_lease=lambda order_id, now, until: True
+    stub.release_escalation_lease=lambda order_id: None
+    stub.escalation_leased=lambda order_id: False
+    stub.acquire_leader_lease=lambda name, holder, now, until: False
+    stub.get_chain_cursor=lambda name: None
+    stub.release_leader_lease=lambda name, holder: None
     sys.modules['db']=stub
     for m in [k for k in list(sys.modules.keys()) if k.startswith('python_api')]:
         sys.modules.pop(m, None)
@@ -135,6 +153,22 @@ def stub_rpc(method, params=None):
     return {}
 
 
+def batch_from(stub):
+    return lambda calls: [stub(m, p) for m, p in calls]
+
+
+def async_from(stub):
+    async def call(*args):
+        return stub(*args)
+    return call
+
+
+def abatch_from(stub):
+    async def call(calls):
+        return [stub(m, p) for m, p in calls]
+    return call
+
+
 def stub_rpc_import_fail(method, params=None):
     if method == 'importdescriptors':
         return [{'success': False}]
@@ -158,7 +192,10 @@ def test_create_order_import_descriptor_failure(monkeypatch):
     rpc_module = importlib.import_module('python_api.rpc')
     orders_module = importlib.import_module('python_api.routes.orders')
     monkeypatch.setattr(rpc_module, 'rpc', stub_rpc_import_fail)
-    monkeypatch.setattr(orders_module, 'rpc', stub_rpc_import_fail)
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc_import_fail))
+    monkeypatch.setattr(rpc_module, 'rpc_batch', batch_from(stub_rpc_import_fail))
+    monkeypatch.setattr(orders_module, 'arpc', async_from(stub_rpc_import_fail))
+    monkeypatch.setattr(orders_module, 'arpc_batch', abatch_from(stub_rpc_import_fail))
     headers = {'x-api-key': 'testkey'}
     body = {
         'order_id': 'orderF',
@@ -174,6 +211,145 @@ def test_create_order_import_descriptor_failure(monkeypatch):
     assert db.get_order('orderF') is None
 
 
+def test_order_status_batch(monkeypatch):
+    client = create_client(monkeypatch)
+    import python_api
+    import importlib
+    rpc_module = importlib.import_module('python_api.rpc')
+    orders_module = importlib.import_module('python_api.routes.orders')
+    calls = []
+
+    def stub_rpc_counting(method, params=None):
+        calls.append(method)
+        if method == 'listunspent':
+            return [
+                {'txid': 'tx1', 'vout': 0, 'amount': 0.000665, 'label': 'escrow:orderA'},
+                {'txid': 'tx3', 'vout': 0, 'amount': 0.0006, 'label': 'escrow:orderB'},
+                {'txid': 'tx4', 'vout': 1, 'amount': 0.1, 'label': 'escrow:other'},
+            ]
+        return stub_rpc(method, params)
+
+    monkeypatch.setattr(rpc_module, 'rpc', stub_rpc_counting)
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc_counting))
+    monkeypatch.setattr(rpc_module, 'rpc_batch', batch_from(stub_rpc_counting))
+    monkeypatch.setattr(python_api, 'rpc', stub_rpc_counting)
+    monkeypatch.setattr(python_api, 'rpc_batch', batch_from(stub_rpc_counting))
+    monkeypatch.setattr(orders_module, 'arpc', async_from(stub_rpc_counting))
+    monkeypatch.setattr(orders_module, 'arpc_batch', abatch_from(stub_rpc_counting))
+    headers = {'x-api-key': 'testkey'}
+    for oid in ('orderA', 'orderB', 'orderC'):
+        body = {'order_id': oid, 'buyer': {'xpub': 'X'}, 'seller': {'xpub': 'Y'}, 'escrow': {'xpub': 'Z'}, 'min_conf': 2, 'amount_sat': 60000}
+        r = client.post('/orders', json=body, headers=headers)
+        assert r.status_code == 200
+    calls.clear()
+    r = client.post('/orders/status:batch', json={'order_ids': ['orderA', 'orderB', 'orderC', 'missing']}, headers=headers)
+    assert r.status_code == 200, r.text
+    res = r.json()['orders']
+    assert calls.count('listunspent') == 1
+    assert res['orderA']['state'] == 'escrow_funded'
+    assert res['orderB']['state'] == 'awaiting_deposit'
+    assert res['orderB']['funding']['shortfall_sat'] == 1500
+    assert res['orderC']['funding'] is None
+    assert res['missing']['state'] == 'awaiting_deposit'
+    import db
+    assert db.get_order('orderA')['state'] == 'escrow_funded'
+
+
+def test_order_status_cached_per_chain_tag(monkeypatch):
+    client = create_client(monkeypatch)
+    import importlib
+    rpc_module = importlib.import_module('python_api.rpc')
+    orders_module = importlib.import_module('python_api.routes.orders')
+    cache_module = importlib.import_module('python_api.status_cache')
+    calls = []
+    wallet = {'txcount': 1}
+
+    def stub_rpc_counting(method, params=None):
+        calls.append(method)
+        if method == 'listunspent':
+            return [{'txid': 'tx1', 'vout': 0, 'amount': 0.0006, 'label': 'escrow:orderS'}]
+        if method == 'getbestblockhash':
+            return 'b1'
+        if method == 'getwalletinfo':
+            return dict(wallet)
+        return stub_rpc(method, params)
+
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc_counting))
+    monkeypatch.setattr(orders_module, 'arpc', async_from(stub_rpc_counting))
+    monkeypatch.setattr(orders_module, 'arpc_batch', abatch_from(stub_rpc_counting))
+    monkeypatch.setattr(cache_module, '_TAG_TTL', 0)
+    headers = {'x-api-key': 'testkey'}
+    body = {'order_id': 'orderS', 'buyer': {'xpub': 'X'}, 'seller': {'xpub': 'Y'}, 'escrow': {'xpub': 'Z'}, 'min_conf': 2, 'amount_sat': 60000}
+    assert client.post('/orders', json=body, headers=headers).status_code == 200
+    calls.clear()
+    for _ in range(3):
+        r = client.get('/orders/orderS/status', headers=headers)
+        assert r.status_code == 200, r.text
+        assert r.json()['funding']['shortfall_sat'] == 1500
+    assert calls.count('listunspent') == 1
+    # a new wallet transaction changes the tag
+    wallet['txcount'] = 2
+    client.get('/orders/orderS/status', headers=headers)
+    assert calls.count('listunspent') == 2
+    r = client.post('/orders/status:batch', json={'order_ids': ['orderS']}, headers=headers)
+    assert r.json()['orders']['orderS']['state'] == 'awaiting_deposit'
+    assert calls.count('listunspent') == 2
+
+
+def test_fee_rate_cached_per_block(monkeypatch):
+    client = create_client(monkeypatch)
+    import asyncio
+    import importlib
+    orders_module = importlib.import_module('python_api.routes.orders')
+    psbt_module = importlib.import_module('python_api.routes.psbt')
+    cache_module = importlib.import_module('python_api.status_cache')
+    fees = importlib.import_module('python_api.fees')
+    calls, funded = [], []
+    chain = {'best': 'b1'}
+
+    def stub_rpc_fees(method, params=None):
+        calls.append(method)
+        if method == 'getbestblockhash':
+            return chain['best']
+        if method == 'getwalletinfo':
+            return {'txcount': 1}
+        if method == 'walletcreatefundedpsbt':
+            funded.append(params[3])
+        return stub_rpc(method, params)
+
+    rpc_module = importlib.import_module('python_api.rpc')
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc_fees))
+    for module in (orders_module, psbt_module):
+        monkeypatch.setattr(module, 'arpc', async_from(stub_rpc_fees))
+        monkeypatch.setattr(module, 'arpc_batch', abatch_from(stub_rpc_fees))
+    monkeypatch.setattr(orders_module, 'afind_utxos_for_label', async_from(stub_utxos))
+    monkeypatch.setattr(cache_module, '_TAG_TTL', 0)
+    headers = {'x-api-key': 'testkey'}
+    body = {'order_id': 'orderF', 'buyer': {'xpub': 'X'}, 'seller': {'xpub': 'Y'}, 'escrow': {'xpub': 'Z'}, 'min_conf': 2, 'amount_sat': 60000}
+    assert client.post('/orders', json=body, headers=headers).status_code == 200
+    for _ in range(2):
+        r = client.post('/orders/orderF/payout_quote', json={'address': 'tb1qseller111', 'target_conf': 3}, headers=headers)
+        assert r.status_code == 200, r.text
+    # the order's estimate serves both quotes, which pass it as an explicit fee_rate
+    assert calls.count('estimatesmartfee') == 1
+    assert [o['fee_rate'] for o in funded] == [10.0, 10.0] and 'conf_target' not in funded[0]
+    chain['best'] = 'b2'
+    client.post('/orders/orderF/payout_quote', json={'address': 'tb1qseller111', 'target_conf': 3}, headers=headers)
+    assert calls.count('estimatesmartfee') == 2
+
+    # concurrent misses for one target share a single estimatesmartfee
+    async def slow_batch(batch_calls):
+        await asyncio.sleep(0.01)
+        return [stub_rpc_fees(m, p) for m, p in batch_calls]
+
+    async def burst():
+        return await asyncio.gather(*(fees.fee_rates.get(6, slow_batch) for _ in range(5)))
+
+    calls.clear()
+    assert asyncio.run(burst()) == [10.0] * 5
+    assert calls.count('estimatesmartfee') == 1
+
+
 def test_payout_quote(monkeypatch):
     client=create_client(monkeypatch)
     import python_api
@@ -183,10 +359,15 @@ def test_payout_quote(monkeypatch):
     psbt_module = importlib.import_module('python_api.routes.psbt')
     admin_module = importlib.import_module('python_api.routes.admin')
     monkeypatch.setattr(rpc_module, 'rpc', stub_rpc)
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(rpc_module, 'rpc_batch', batch_from(stub_rpc))
     monkeypatch.setattr(python_api, 'rpc', stub_rpc)
-    monkeypatch.setattr(orders_module, 'rpc', stub_rpc)
-    monkeypatch.setattr(orders_module, 'find_utxos_for_label', stub_utxos)
-    monkeypatch.setattr(psbt_module, 'rpc', stub_rpc)
+    monkeypatch.setattr(python_api, 'rpc_batch', batch_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'arpc_batch', abatch_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'afind_utxos_for_label', async_from(stub_utxos))
+    monkeypatch.setattr(psbt_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(psbt_module, 'arpc_batch', abatch_from(stub_rpc))
     headers={'x-api-key':'testkey'}
     body={'order_id':'orderQ','buyer':{'xpub':'X'},'seller':{'xpub':'Y'},'escrow':{'xpub':'Z'},'min_conf':2,'amount_sat':60000}
     r=client.post('/orders', json=body, headers=headers)
@@ -199,6 +380,68 @@ def test_payout_quote(monkeypatch):
     assert r.status_code==200, r.text
     assert r.json()=={'fee_sat':6500}
 
+def test_payout_quote_local(monkeypatch):
+    client = create_client(monkeypatch)
+    import importlib
+    rpc_module = importlib.import_module('python_api.rpc')
+    orders_module = importlib.import_module('python_api.routes.orders')
+    fees = importlib.import_module('python_api.fees')
+    metrics = importlib.import_module('python_api.metrics')
+    payee = 'tb1qw508d6qejxtdg4y5r3zarvary0c5xw7kxpjzsx'
+    calls, funded = [], []
+    core = {'changepos': -1, 'estimate_fails': False}
+
+    def stub_rpc_local(method, params=None):
+        calls.append(method)
+        if method == 'getblockchaininfo':
+            return {'chain': 'test'}
+        if method == 'estimatesmartfee' and core['estimate_fails']:
+            raise RuntimeError('estimatesmartfee failed')
+        if method == 'walletcreatefundedpsbt' and payee in params[1]:
+            funded.append(params[3])
+            return {'psbt': 'psbtP', 'changepos': core['changepos'], 'fee': 0.0000146}
+        return stub_rpc(method, params)
+
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc_local))
+    monkeypatch.setattr(rpc_module, 'BTC_NETWORK', '')
+    monkeypatch.setattr(orders_module, 'arpc', async_from(stub_rpc_local))
+    monkeypatch.setattr(orders_module, 'arpc_batch', abatch_from(stub_rpc_local))
+    monkeypatch.setattr(orders_module, 'afind_utxos_for_label', async_from(stub_utxos_short))
+    headers = {'x-api-key': 'testkey'}
+    body = {'order_id': 'orderL', 'buyer': {'xpub': 'X'}, 'seller': {'xpub': 'Y'}, 'escrow': {'xpub': 'Z'}, 'min_conf': 2, 'amount_sat': 60000}
+    assert client.post('/orders', json=body, headers=headers).status_code == 200
+    # one 2-of-3 P2WSH input and a P2WPKH output are 146 vB, at the stub's 10 sat/vB
+    calls.clear()
+    r = client.post('/orders/orderL/payout_quote', json={'address': payee}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json() == {'fee_sat': 1460}
+    assert 'walletcreatefundedpsbt' not in calls
+    r = client.post('/orders/orderL/payout_quote?verify=true', json={'address': payee}, headers=headers)
+    assert r.json() == {'fee_sat': 1460}
+    assert calls.count('walletcreatefundedpsbt') == 1
+    # addresses the local sizing cannot handle still go through Core
+    r = client.post('/orders/orderL/payout_quote', json={'address': 'tb1qseller111'}, headers=headers)
+    assert r.json() == {'fee_sat': 6500}
+    quotes = metrics.PAYOUT_QUOTES
+    assert quotes.labels(source='local')._value.get() == 1 and quotes.labels(source='core')._value.get() == 2
+
+    # an overfunded label needs change: refused the same way with and without verify
+    monkeypatch.setattr(orders_module, 'afind_utxos_for_label', async_from(stub_utxos))
+    core['changepos'] = 1
+    for path in ('/orders/orderL/payout_quote', '/orders/orderL/payout_quote?verify=true'):
+        r = client.post(path, json={'address': payee}, headers=headers)
+        assert r.status_code == 400 and r.json()['detail'] == 'unexpected change output'
+    assert quotes.labels(source='local')._value.get() == 1
+
+    # a failing estimate leaves the quote to Core's own conf_target estimation
+    monkeypatch.setattr(orders_module, 'afind_utxos_for_label', async_from(stub_utxos_short))
+    core.update(changepos=-1, estimate_fails=True)
+    fees.fee_rates.clear()
+    r = client.post('/orders/orderL/payout_quote', json={'address': payee, 'target_conf': 6}, headers=headers)
+    assert r.status_code == 200 and r.json() == {'fee_sat': 1460}
+    assert funded[-1]['conf_target'] == 6 and 'fee_rate' not in funded[-1]
+
+
 def test_full_payout_flow(monkeypatch):
     client=create_client(monkeypatch)
     import python_api
@@ -208,12 +451,17 @@ def test_full_payout_flow(monkeypatch):
     psbt_module = importlib.import_module('python_api.routes.psbt')
     admin_module = importlib.import_module('python_api.routes.admin')
     monkeypatch.setattr(rpc_module, 'rpc', stub_rpc)
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(rpc_module, 'rpc_batch', batch_from(stub_rpc))
     monkeypatch.setattr(python_api, 'rpc', stub_rpc)
-    monkeypatch.setattr(orders_module, 'rpc', stub_rpc)
-    monkeypatch.setattr(orders_module, 'find_utxos_for_label', stub_utxos)
-    monkeypatch.setattr(psbt_module, 'rpc', stub_rpc)
-    monkeypatch.setattr(psbt_module, 'find_utxos_for_label', stub_utxos)
-    monkeypatch.setattr(admin_module, 'rpc', stub_rpc)
+    monkeypatch.setattr(python_api, 'rpc_batch', batch_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'arpc_batch', abatch_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'afind_utxos_for_label', async_from(stub_utxos))
+    monkeypatch.setattr(psbt_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(psbt_module, 'arpc_batch', abatch_from(stub_rpc))
+    monkeypatch.setattr(psbt_module, 'afind_utxos_for_label', async_from(stub_utxos))
+    monkeypatch.setattr(admin_module, 'arpc', async_from(stub_rpc))
     headers={'x-api-key':'testkey'}
     body={'order_id':'order1','buyer':{'xpub':'X'},'seller':{'xpub':'Y'},'escrow':{'xpub':'Z'},'min_conf':2,'amount_sat':60000}
     r=client.post('/orders', json=body, headers=headers)
@@ -265,7 +513,9 @@ def test_bumpfee_dispute_block(monkeypatch):
     rpc_module = importlib.import_module('python_api.rpc')
     admin_module = importlib.import_module('python_api.routes.admin')
     monkeypatch.setattr(rpc_module, 'rpc', stub_rpc)
-    monkeypatch.setattr(admin_module, 'rpc', stub_rpc)
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(rpc_module, 'rpc_batch', batch_from(stub_rpc))
+    monkeypatch.setattr(admin_module, 'arpc', async_from(stub_rpc))
     from db import upsert_order, set_payout_txid, update_state
     upsert_order('order1','desc',0,1,'escrow:order1',60000,0)
     set_payout_txid('order1','txid123')
@@ -283,11 +533,16 @@ def test_payout_build_insufficient(monkeypatch):
     orders_module = importlib.import_module('python_api.routes.orders')
     psbt_module = importlib.import_module('python_api.routes.psbt')
     monkeypatch.setattr(rpc_module, 'rpc', stub_rpc)
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(rpc_module, 'rpc_batch', batch_from(stub_rpc))
     monkeypatch.setattr(python_api, 'rpc', stub_rpc)
-    monkeypatch.setattr(orders_module, 'rpc', stub_rpc)
-    monkeypatch.setattr(orders_module, 'find_utxos_for_label', stub_utxos_insuf)
-    monkeypatch.setattr(psbt_module, 'rpc', stub_rpc)
-    monkeypatch.setattr(psbt_module, 'find_utxos_for_label', stub_utxos_insuf)
+    monkeypatch.setattr(python_api, 'rpc_batch', batch_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'arpc_batch', abatch_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'afind_utxos_for_label', async_from(stub_utxos_insuf))
+    monkeypatch.setattr(psbt_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(psbt_module, 'arpc_batch', abatch_from(stub_rpc))
+    monkeypatch.setattr(psbt_module, 'afind_utxos_for_label', async_from(stub_utxos_insuf))
     headers = {'x-api-key': 'testkey'}
     body = {'order_id': 'orderI', 'buyer': {'xpub': 'X'}, 'seller': {'xpub': 'Y'}, 'escrow': {'xpub': 'Z'}, 'min_conf': 2, 'amount_sat': 60000}
     r = client.post('/orders', json=body, headers=headers)
@@ -308,11 +563,16 @@ def test_refund_psbt(monkeypatch):
     orders_module = importlib.import_module('python_api.routes.orders')
     psbt_module = importlib.import_module('python_api.routes.psbt')
     monkeypatch.setattr(rpc_module, 'rpc', stub_rpc)
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(rpc_module, 'rpc_batch', batch_from(stub_rpc))
     monkeypatch.setattr(python_api, 'rpc', stub_rpc)
-    monkeypatch.setattr(orders_module, 'rpc', stub_rpc)
-    monkeypatch.setattr(orders_module, 'find_utxos_for_label', stub_utxos)
-    monkeypatch.setattr(psbt_module, 'rpc', stub_rpc)
-    monkeypatch.setattr(psbt_module, 'find_utxos_for_label', stub_utxos)
+    monkeypatch.setattr(python_api, 'rpc_batch', batch_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'arpc_batch', abatch_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'afind_utxos_for_label', async_from(stub_utxos))
+    monkeypatch.setattr(psbt_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(psbt_module, 'arpc_batch', abatch_from(stub_rpc))
+    monkeypatch.setattr(psbt_module, 'afind_utxos_for_label', async_from(stub_utxos))
     headers={'x-api-key':'testkey'}
     body={'order_id':'order2','buyer':{'xpub':'X'},'seller':{'xpub':'Y'},'escrow':{'xpub':'Z'},'min_conf':2,'amount_sat':60000}
     r=client.post('/orders', json=body, headers=headers)
@@ -334,11 +594,16 @@ def test_underfunded_deposit(monkeypatch):
     orders_module = importlib.import_module('python_api.routes.orders')
     psbt_module = importlib.import_module('python_api.routes.psbt')
     monkeypatch.setattr(rpc_module, 'rpc', stub_rpc)
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(rpc_module, 'rpc_batch', batch_from(stub_rpc))
     monkeypatch.setattr(python_api, 'rpc', stub_rpc)
-    monkeypatch.setattr(orders_module, 'rpc', stub_rpc)
-    monkeypatch.setattr(orders_module, 'find_utxos_for_label', stub_utxos_short)
-    monkeypatch.setattr(psbt_module, 'rpc', stub_rpc)
-    monkeypatch.setattr(psbt_module, 'find_utxos_for_label', stub_utxos_short)
+    monkeypatch.setattr(python_api, 'rpc_batch', batch_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'arpc_batch', abatch_from(stub_rpc))
+    monkeypatch.setattr(orders_module, 'afind_utxos_for_label', async_from(stub_utxos_short))
+    monkeypatch.setattr(psbt_module, 'arpc', async_from(stub_rpc))
+    monkeypatch.setattr(psbt_module, 'arpc_batch', abatch_from(stub_rpc))
+    monkeypatch.setattr(psbt_module, 'afind_utxos_for_label', async_from(stub_utxos_short))
     headers = {'x-api-key': 'testkey'}
     body = {'order_id': 'orderU', 'buyer': {'xpub': 'X'}, 'seller': {'xpub': 'Y'}, 'escrow': {'xpub': 'Z'}, 'min_conf': 2, 'amount_sat': 60000}
     r = client.post('/orders', json=body, headers=headers)
@@ -370,8 +635,12 @@ def test_psbt_decode_multi_input(monkeypatch):
         return stub_rpc(method, params)
 
     monkeypatch.setattr(python_api, 'rpc', stub_rpc_multi)
+    monkeypatch.setattr(python_api, 'rpc_batch', batch_from(stub_rpc_multi))
     monkeypatch.setattr(rpc_module, 'rpc', stub_rpc_multi)
-    monkeypatch.setattr(psbt_module, 'rpc', stub_rpc_multi)
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_rpc_multi))
+    monkeypatch.setattr(rpc_module, 'rpc_batch', batch_from(stub_rpc_multi))
+    monkeypatch.setattr(psbt_module, 'arpc', async_from(stub_rpc_multi))
+    monkeypatch.setattr(psbt_module, 'arpc_batch', abatch_from(stub_rpc_multi))
     headers = {'x-api-key': 'testkey'}
     r = client.post('/psbt/decode', json={'psbt': 'multi'}, headers=headers)
     assert r.status_code == 200, r.text
@@ -393,7 +662,7 @@ def test_stuck_worker_watch_only(monkeypatch):
         'output_type': 'payout',
     }
 
-    def list_orders(states):
+    def list_orders(states, since=None):
         return [order]
 
     def get_partials(order_id):
@@ -433,24 +702,227 @@ def test_stuck_worker_watch_only(monkeypatch):
     logger = Logger()
 
     monkeypatch.setattr(workers, 'rpc', rpc_stub)
-    monkeypatch.setattr(workers.db, 'list_orders_by_states', list_orders)
+    monkeypatch.setattr(importlib.import_module('python_api.rpc'), 'rpc', rpc_stub)
+    monkeypatch.setattr(workers.db, 'list_deadline_orders', list_orders)
+    monkeypatch.setattr(workers.db, 'get_order', lambda order_id: order)
     monkeypatch.setattr(workers.db, 'get_partials', get_partials)
     monkeypatch.setattr(psbt_routes, 'psbt_finalize', finalize_stub)
     monkeypatch.setattr(admin_routes, 'tx_broadcast', broadcast_stub)
     monkeypatch.setattr(workers, 'log', logger)
 
-    def stop(*a, **kw):
-        raise SystemExit
-
-    monkeypatch.setattr(workers.time, 'sleep', stop)
-
-    try:
-        workers._stuck_worker()
-    except SystemExit:
-        pass
+    scheduler = workers.DeadlineScheduler()
+    scheduler.run_once()
+    assert scheduler.wait_idle(5)
 
     assert finalize_called == []
     assert broadcast_called == []
     assert logger.errors == []
     assert ('deadline_watchonly_escalated', {'order_id': 'orderW', 'sign_count': 1}) in logger.events
     assert order['state'] == 'dispute'
+
+
+def test_utxo_index_incremental(monkeypatch):
+    create_client(monkeypatch)
+    import importlib
+    idx_module = importlib.import_module('python_api.utxo_index')
+    rpc_module = importlib.import_module('python_api.rpc')
+    chain = {'tip': 100, 'best': 'b100', 'since': {'transactions': [], 'lastblock': 'b100'}}
+    unspent = [
+        {'txid': 'tx1', 'vout': 0, 'amount': 0.0006, 'label': 'escrow:order1', 'address': 'tb1qa', 'confirmations': 3},
+        {'txid': 'tx2', 'vout': 1, 'amount': 0.0001, 'label': 'escrow:order2', 'address': 'tb1qb', 'confirmations': 0},
+    ]
+    calls = []
+
+    def fake_rpc(method, params=None):
+        calls.append(method)
+        if method == 'getblockcount':
+            return chain['tip']
+        if method == 'getbestblockhash':
+            return chain['best']
+        if method == 'listsinceblock':
+            return chain['since']
+        if method == 'listunspent':
+            addrs = params[2]
+            return [u for u in unspent if not addrs or u['address'] in addrs]
+        if method == 'gettransaction':
+            return {'confirmations': chain['spend_conf'].get(params[0], 0), 'decoded': {'vin': [{'txid': 'tx1', 'vout': 0}]}}
+        raise AssertionError(method)
+
+    chain['spend_conf'] = {}
+    monkeypatch.setattr(idx_module, 'rpc', fake_rpc)
+    monkeypatch.setattr(idx_module, 'rpc_batch', batch_from(fake_rpc))
+    index = idx_module.UTXOIndex(poll=60, rebuild_every=3600)
+    monkeypatch.setattr(idx_module, 'utxo_index', index)
+    assert not index.ready()
+    index.refresh()
+    assert index.ready()
+    assert [u['txid'] for u in index.lookup(['escrow:order1'], 2)['escrow:order1']] == ['tx1']
+    assert index.lookup(['escrow:order2'], 1)['escrow:order2'] == []
+
+    # new block confirms the mempool deposit
+    chain.update(tip=101, since={'transactions': [{'category': 'receive', 'address': 'tb1qb', 'txid': 'tx2'}], 'lastblock': 'b101'})
+    unspent[0]['confirmations'] = 4
+    unspent[1]['confirmations'] = 1
+    calls.clear()
+    index.refresh()
+    assert 'listunspent' in calls
+    assert index.lookup(['escrow:order2'], 1)['escrow:order2'][0]['confirmations'] == 1
+    assert index.lookup(['escrow:order1'], 0)['escrow:order1'][0]['confirmations'] == 4
+
+    # payout spends tx1:0 from the mempool
+    chain['since'] = {'transactions': [{'category': 'send', 'address': 'tb1qdest', 'txid': 'payout'}], 'lastblock': 'b101'}
+    spent = unspent.pop(0)
+    index.refresh()
+    assert index.lookup(['escrow:order1'], 0)['escrow:order1'] == []
+
+    # the unconfirmed payout is replaced out of the wallet's view: tx1:0 comes back
+    chain['since'] = {'transactions': [], 'lastblock': 'b101'}
+    chain['spend_conf']['payout'] = -1
+    unspent.insert(0, spent)
+    calls.clear()
+    index.refresh()
+    assert calls.count('gettransaction') == 1
+    assert [u['txid'] for u in index.lookup(['escrow:order1'], 0)['escrow:order1']] == ['tx1']
+
+    # a confirmed spend is final and no longer re-checked
+    chain['since'] = {'transactions': [{'category': 'send', 'address': 'tb1qdest', 'txid': 'payout2'}], 'lastblock': 'b102'}
+    chain['spend_conf']['payout2'] = 1
+    del unspent[0]
+    index.refresh()
+    assert index.lookup(['escrow:order1'], 0)['escrow:order1'] == []
+    chain['since'] = {'transactions': [{'category': 'send', 'address': 'tb1qdest', 'txid': 'payout2'}], 'lastblock': 'b102'}
+    calls.clear()
+    index.refresh()
+    assert 'gettransaction' not in calls
+
+    # lookups are served without touching Core
+    monkeypatch.setattr(rpc_module, 'rpc', fake_rpc)
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(fake_rpc))
+    calls.clear()
+    assert rpc_module.find_utxos_for_label('escrow:order2', 0)[0]['txid'] == 'tx2'
+    assert calls == []
+
+    # reorg forces a full rebuild
+    chain['since'] = {'transactions': [], 'removed': [{'txid': 'tx2'}], 'lastblock': 'b101'}
+    calls.clear()
+    index.refresh()
+    assert calls.count('listunspent') == 1 and 'getbestblockhash' in calls
+
+
+def test_finalize_input_errors_are_deterministic(monkeypatch):
+    create_client(monkeypatch)
+    import asyncio
+    import importlib
+    psbt_module = importlib.import_module('python_api.routes.psbt')
+    from fastapi import HTTPException
+    batches = []
+
+    def core(method, params=None):
+        if method == 'gettransaction':
+            return {'details': [{'vout': v, 'label': 'escrow:o' if params[0] != 'bad' else 'other'} for v in range(10)]}
+        if method == 'gettxout':
+            return {'value': 0.0001}
+        raise AssertionError(method)
+
+    async def batch(calls):
+        batches.append(len(calls))
+        await asyncio.sleep(0.001 * (5 - len(batches)))
+        return [core(m, p) for m, p in calls]
+
+    monkeypatch.setattr(psbt_module, 'arpc_batch', batch)
+    monkeypatch.setattr(psbt_module, 'FINALIZE_RPC_BATCH', 4)
+    vins = [{'txid': 'fund', 'vout': i, 'sequence': 0xfffffffd} for i in range(6)]
+    assert asyncio.run(psbt_module._verify_inputs(vins, 'escrow:o', True)) == 60000
+    assert sum(batches) == 7 and max(batches) == 4
+
+    vins[2] = {'txid': 'bad', 'vout': 0, 'sequence': 0xfffffffd}
+    vins[4]['sequence'] = 0xffffffff
+    for _ in range(3):
+        batches.clear()
+        try:
+            asyncio.run(psbt_module._verify_inputs(vins, 'escrow:o', True))
+        except HTTPException as e:
+            assert e.detail == 'input not from escrow label'
+        else:
+            raise AssertionError('expected failure')
+
+    # a later input's RPC error does not pre-empt an earlier input's check, nor the reverse
+    def core_missing(method, params=None):
+        if method == 'gettransaction' and params[0] == 'gone':
+            raise HTTPException(500, 'Invalid or non-wallet transaction id')
+        return core(method, params)
+
+    async def batch_missing(calls):
+        batches.append(len(calls))
+        return [core_missing(m, p) for m, p in calls]
+
+    monkeypatch.setattr(psbt_module, 'arpc_batch', batch_missing)
+    vins = [{'txid': 'fund', 'vout': i, 'sequence': 0xfffffffd} for i in range(6)]
+    vins[1]['sequence'] = 0xffffffff
+    vins[3] = {'txid': 'gone', 'vout': 0, 'sequence': 0xfffffffd}
+    for first_bad, detail in ((1, 'RBF disabled'), (4, 'Invalid or non-wallet transaction id')):
+        vins[1]['sequence'] = 0xffffffff if first_bad == 1 else 0xfffffffd
+        try:
+            asyncio.run(psbt_module._verify_inputs(vins, 'escrow:o', True))
+        except HTTPException as e:
+            assert e.detail == detail
+        else:
+            raise AssertionError('expected failure')
+
+    # an input's own gettxout error comes after its label and RBF checks
+    def core_no_txout(method, params=None):
+        if method == 'gettxout' and params == ['fund', 0]:
+            raise HTTPException(500, 'gettxout failed')
+        return core(method, params)
+
+    async def batch_no_txout(calls):
+        return [core_no_txout(m, p) for m, p in calls]
+
+    monkeypatch.setattr(psbt_module, 'arpc_batch', batch_no_txout)
+    vins = [{'txid': 'fund', 'vout': i, 'sequence': 0xfffffffd} for i in range(3)]
+    for seq, detail in ((0xffffffff, 'RBF disabled'), (0xfffffffd, 'gettxout failed')):
+        vins[0]['sequence'] = seq
+        try:
+            asyncio.run(psbt_module._verify_inputs(vins, 'escrow:o', True))
+        except HTTPException as e:
+            assert e.detail == detail
+        else:
+            raise AssertionError('expected failure')
+
+
+def test_merge_combines_locally_and_dedupes(monkeypatch):
+    client = create_client(monkeypatch)
+    import db as stub_db
+    from test_bip174 import make_psbt, P2WSH
+    rpc_module = importlib.import_module('python_api.rpc')
+    psbt_module = importlib.import_module('python_api.routes.psbt')
+    bip174 = importlib.import_module('python_api.bip174')
+    calls = []
+
+    def stub_counting(method, params=None):
+        calls.append(method)
+        return stub_rpc(method, params)
+
+    monkeypatch.setattr(rpc_module, 'arpc', async_from(stub_counting))
+    monkeypatch.setattr(psbt_module, 'arpc', async_from(stub_counting))
+    stub_db.upsert_order('orderM', 'desc', 0, 1, 'escrow:orderM', 1000, 10)
+    headers = {'x-api-key': 'testkey'}
+    buyer = make_psbt([(P2WSH, 1000)], [2000], sigs=((0,),))
+    seller = make_psbt([(P2WSH, 1000)], [2000], sigs=((1,),))
+
+    r = client.post('/psbt/merge', json={'order_id': 'orderM', 'partials': [buyer]}, headers=headers)
+    assert r.status_code == 200, r.text
+    r = client.post('/psbt/merge', json={'order_id': 'orderM', 'partials': [buyer, seller]}, headers=headers)
+    merged = r.json()['psbt']
+    assert len(bip174.decode_psbt(merged, 'tb')['inputs'][0]['partial_signatures']) == 2
+    # same content with the input map serialized in another key order: still a duplicate
+    reordered = bip174.PSBT.from_base64(seller)
+    reordered.inputs[0] = reordered.inputs[0][::-1]
+    reencoded = reordered.to_base64()
+    assert reencoded != seller
+    r = client.post('/psbt/merge', json={'order_id': 'orderM', 'partials': [reencoded]}, headers=headers)
+    assert r.json()['psbt'] == merged
+    merged_psbt, hashes = stub_db.get_merge_state('orderM')
+    assert merged_psbt == merged
+    assert len(hashes) == 2
+    assert 'combinepsbt' not in calls
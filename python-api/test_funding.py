@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    fd, db_path = tempfile.mkstemp()
+    os.close(fd)
+    monkeypatch.setenv("ORDERS_DB", db_path)
+    monkeypatch.setenv("ALLOW_ORIGINS", "http://test")
+    sys.path.insert(0, os.path.dirname(__file__))
+    sys.modules.pop("db", None)
+    for m in [k for k in list(sys.modules) if k.startswith("python_api")]:
+        sys.modules.pop(m, None)
+    import python_api.main  # noqa: F401 - runs the migrations
+    import python_api.funding as funding
+    import python_api.workers as workers
+
+    state = {"tip": 100, "txs": [], "utxos": {}, "conf": {}, "calls": []}
+
+    def rpc_batch(calls):
+        out = []
+        for method, params in calls:
+            state["calls"].append(method)
+            if method == "getblockcount":
+                out.append(state["tip"])
+            elif method == "getbestblockhash":
+                out.append(f"b{state['tip']}")
+            elif method == "listsinceblock":
+                out.append({"transactions": state["txs"], "lastblock": f"b{state['tip']}"})
+            elif method == "gettransaction":
+                out.append({"confirmations": state["conf"][params[0]]})
+        return out
+
+    monkeypatch.setattr(funding, "rpc_batch", rpc_batch)
+    monkeypatch.setattr(funding, "find_utxos_for_labels", lambda labels, c: {l: state["utxos"].get(l, []) for l in labels})
+    monkeypatch.setattr(workers, "WOO_CALLBACK_URL", "http://shop/hook")
+    monkeypatch.setattr(workers, "WOO_HMAC_SECRET", "secret")
+    funding.db.upsert_order("o1", "desc", 0, 1, "escrow:o1", 1000, 10)
+    yield funding, state
+    funding.db.close_conn()
+
+
+def test_watcher_funds_order_without_status_polling(chain, monkeypatch):
+    funding, state = chain
+    db = funding.db
+    watcher = funding.FundingWatcher()
+    watcher.step()
+    assert db.get_chain_cursor("funding")["blockhash"] == "b100"
+
+    # deposit seen in the mempool: recorded, evaluated once per tip
+    state["txs"] = [{"category": "receive", "label": "escrow:o1", "txid": "t1", "confirmations": 0}]
+    state["utxos"]["escrow:o1"] = [{"txid": "t1", "vout": 0, "amount": 0.0000101}]
+    state["conf"]["t1"] = 0
+    watcher.step()
+    assert db.get_order("o1")["state"] == "awaiting_deposit"
+    assert json.loads(db.get_order("o1")["funding"])["confirmations"] == 0
+    state["calls"].clear()
+    watcher.step()
+    assert "gettransaction" not in state["calls"]
+
+    # mined: the next block funds the order and queues the webhook
+    state["tip"] = 101
+    state["conf"]["t1"] = 1
+    state["txs"][0]["confirmations"] = 1
+    watcher.step()
+    order = db.get_order("o1")
+    assert order["state"] == "escrow_funded" and order["confirmations"] == 1
+    rows = db.get_conn().execute("SELECT event FROM webhook_outbox").fetchall()
+    assert [r["event"] for r in rows] == ["escrow_funded"]
+    assert db.get_chain_cursor("funding")["blockhash"] == "b101"
+
+    # /status answers from the database while the watcher is live
+    import python_api.routes.orders as orders
+
+    async def no_core(*args, **kwargs):
+        raise AssertionError("Core called")
+
+    monkeypatch.setattr(orders, "arpc_batch", no_core)
+    monkeypatch.setattr(orders, "afind_utxos_for_label", no_core)
+    res = asyncio.run(orders.order_status("o1"))
+    assert res.state == "escrow_funded"
+    assert res.funding["total_sat"] == 1010 and res.funding["confirmations"] == 1
+
+
+def test_watcher_clears_funding_when_deposit_disappears(chain, monkeypatch):
+    funding, state = chain
+    db = funding.db
+    watcher = funding.FundingWatcher()
+    watcher.step()
+    state["txs"] = [{"category": "receive", "label": "escrow:o1", "txid": "t1", "confirmations": 0}]
+    state["utxos"]["escrow:o1"] = [{"txid": "t1", "vout": 0, "amount": 0.0000101}]
+    state["conf"]["t1"] = 0
+    watcher.step()
+    assert db.get_order("o1")["funding_txid"] == "t1"
+
+    # the mempool deposit is replaced by a spend elsewhere; the next block re-checks it
+    state["utxos"]["escrow:o1"] = []
+    state["txs"] = []
+    state["tip"] = 101
+    watcher.step()
+    order = db.get_order("o1")
+    assert order["funding"] is None and order["funding_txid"] is None
+
+    import python_api.routes.orders as orders
+
+    async def no_core(*args, **kwargs):
+        raise AssertionError("Core called")
+
+    monkeypatch.setattr(orders, "arpc_batch", no_core)
+    monkeypatch.setattr(orders, "afind_utxos_for_label", no_core)
+    res = asyncio.run(orders.order_status("o1"))
+    assert res.state == "awaiting_deposit" and res.funding is None
+    # with nothing to follow, later blocks no longer re-evaluate the order
+    assert funding.db.list_funding_orders(seen_only=True) == []
+
+
+def test_status_cache_bounds_and_expiry(chain, monkeypatch):
+    import python_api.status_cache as cache_module
+
+    cache = cache_module.StatusCache(max_entries=2, ttl=60)
+    tag = ("b1", 1)
+    for oid in ("a", "b", "c"):
+        cache.put(oid, tag, oid.upper())
+    assert cache.get("a", tag) is None  # least recently used went first
+    assert cache.get("b", tag) == "B" and cache.get("c", tag) == "C"
+    assert cache.get("b", ("b2", 1)) is None
+    cache.invalidate("c")
+    assert cache.get("c", tag) is None
+    monkeypatch.setattr(cache_module.time, "time", lambda: 10 ** 10)
+    assert cache.get("b", tag) is None
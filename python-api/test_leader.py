@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+
+@pytest.fixture
+def leader(monkeypatch):
+    fd, db_path = tempfile.mkstemp()
+    os.close(fd)
+    monkeypatch.setenv("ORDERS_DB", db_path)
+    monkeypatch.setenv("ALLOW_ORIGINS", "http://test")
+    sys.path.insert(0, os.path.dirname(__file__))
+    sys.modules.pop("db", None)
+    for m in [k for k in list(sys.modules) if k.startswith("python_api")]:
+        sys.modules.pop(m, None)
+    import python_api.leader as leader
+
+    leader.db.init_db()
+    yield leader
+    leader.db.close_conn()
+
+
+def _election(leader, events, name, ttl=0.3):
+    return leader.LeaderElection(
+        "workers",
+        lambda: events.append((name, "elected")),
+        lambda: events.append((name, "deposed")),
+        ttl=ttl,
+    )
+
+
+def test_single_leader_with_failover(leader):
+    events = []
+    a = _election(leader, events, "a")
+    b = _election(leader, events, "b")
+    assert a.step() and not b.step()
+    assert a.step() and not b.step()  # renewal keeps the role
+
+    # a stalls past its lease: b takes over and a steps down on its next renewal
+    time.sleep(0.35)
+    assert b.step()
+    assert not a.step()
+    assert events == [("a", "elected"), ("b", "elected"), ("a", "deposed")]
+
+    # a clean shutdown hands over without waiting for expiry
+    b.stop()
+    assert a.step()
+    assert events[-2:] == [("b", "deposed"), ("a", "elected")]
+
+
+def test_database_errors_keep_the_role_until_the_lease_lapses(leader, monkeypatch):
+    events = []
+    a = _election(leader, events, "a")
+    assert a.step()
+
+    def locked(*args):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(leader.db, "acquire_leader_lease", locked)
+    assert a.step()
+    time.sleep(0.35)
+    assert not a.step()
+    assert events == [("a", "elected"), ("a", "deposed")]
@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+
+def _logging_module(monkeypatch, **env):
+    monkeypatch.setenv("ALLOW_ORIGINS", "http://test")
+    for k, v in env.items():
+        monkeypatch.setenv(k, v)
+    sys.path.insert(0, os.path.dirname(__file__))
+    for m in [k for k in list(sys.modules) if k.startswith("python_api")]:
+        sys.modules.pop(m, None)
+    import python_api.logging as logging_module
+
+    return logging_module
+
+
+def _records(logging_module, capsys):
+    logging_module._writer.flush()
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+
+
+def test_request_context_and_truncated_fields(monkeypatch, capsys, caplog):
+    caplog.set_level(logging.INFO)
+    lm = _logging_module(monkeypatch, LOG_MAX_FIELD="100")
+    app = FastAPI()
+    app.add_middleware(lm.LoggingMiddleware)
+    psbt = "cHNidP8B" * 50
+
+    @app.get("/orders/{order_id}/thing")
+    async def thing(order_id: str):
+        lm.order_id_var.set(order_id)
+        lm.log.bind(request_id=lm.req_id_var.get(), actor=lm.actor_var.get()).info("rpc_start", params=[psbt, 0])
+        return {"ok": True}
+
+    client = TestClient(app)
+    r = client.get("/orders/o1/thing", headers={"X-Request-ID": "rid", "X-Actor": "admin"})
+    assert r.status_code == 200
+    rpc, request = _records(lm, capsys)
+    assert rpc["event"] == "rpc_start" and rpc["request_id"] == "rid" and rpc["actor"] == "admin"
+    assert rpc["params"][0].startswith(psbt[:64]) and f"[{len(psbt)} chars sha256:" in rpc["params"][0]
+    assert rpc["params"][1] == 0
+    assert request["event"] == "request" and request["status"] == 200
+    assert request["order_id"] == "o1" and request["path"] == "/orders/o1/thing"
+    assert rpc["timestamp"].endswith("Z")
+    assert lm.req_id_var.get() is None and lm.order_id_var.get() is None
+
+
+def test_sampling_and_full_queue(monkeypatch, capsys, caplog):
+    caplog.set_level(logging.INFO)
+    lm = _logging_module(monkeypatch, LOG_SAMPLE="rpc_success=0,rpc_start=1")
+    for _ in range(20):
+        lm.log.info("rpc_success")
+        lm.log.info("rpc_start")
+    lm.log.error("rpc_success", error="kept")
+    events = [r["event"] for r in _records(lm, capsys)]
+    assert events == ["rpc_start"] * 20 + ["rpc_success"]
+
+    # a writer that cannot keep up drops records instead of blocking the caller
+    writer = lm.LogWriter(maxsize=2)
+    monkeypatch.setattr(writer, "_start", lambda: None)
+    writer._thread = object()
+    dropped = lm.LOG_DROPPED._value.get()
+    for i in range(5):
+        writer.put({"event": "x", "timestamp": 0})
+    assert lm.LOG_DROPPED._value.get() == dropped + 3
@@ -17,6 +17,8 @@ def create_client():
     stub.init_db = lambda: None
     stub.count_pending_signatures = lambda: 0
     stub.list_orders_by_states = lambda states: []
+    stub.list_deadline_orders = lambda states, since=None: []
+    stub.acquire_leader_lease = lambda name, holder, now, until: False
     stub.get_partials = lambda order_id: []
     sys.modules["db"] = stub
     for m in [k for k in list(sys.modules.keys()) if k.startswith('python_api')]:
@@ -33,3 +35,57 @@ def test_rate_limit_blocks_after_threshold():
         assert resp.status_code == 200
     resp = client.get("/metrics", headers=headers)
     assert resp.status_code == 429
+
+
+def _take(args):
+    path, n = args
+    sys.modules.pop("python_api.ratelimit", None)
+    from python_api.ratelimit import TokenBucketLimiter
+
+    limiter = TokenBucketLimiter(path, "30/hour")
+    return sum(1 for _ in range(n) if limiter.take("key") == 0)
+
+
+def test_token_bucket_is_shared_and_weighted():
+    import multiprocessing
+
+    client = create_client()
+    from python_api import ratelimit
+
+    path = tempfile.mkstemp()[1]
+    a = ratelimit.TokenBucketLimiter(path, "10/minute")
+    b = ratelimit.TokenBucketLimiter(path, "10/minute")
+    assert a.take("k", 4, now=1000) == 0
+    assert b.take("k", 4, now=1000) == 0
+    assert a.take("k", 4, now=1000) == 12  # 2 tokens left, 2 more refill in 12s
+    assert b.take("k", 4, now=1012) == 0
+    assert a.take("other", 10, now=1012) == 0
+
+    # several processes draw from one bucket
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        assert sum(pool.map(_take, [(path + "-procs", 20)] * 4)) == 30
+
+    # /live is free, a finalize uses 20 tokens of the key's budget
+    ratelimit.limiter = ratelimit.TokenBucketLimiter(path + "-api", "30/minute")
+    headers = {"x-api-key": "testkey"}
+    for _ in range(40):
+        assert client.get("/live").status_code == 200
+    assert client.post("/psbt/finalize", json={"psbt": "x"}, headers=headers).status_code != 429
+    resp = client.post("/psbt/finalize", json={"psbt": "x"}, headers=headers)
+    assert resp.status_code == 429 and int(resp.headers["Retry-After"]) > 0
+    assert client.get("/metrics", headers=headers).status_code == 200
+
+
+def test_unknown_api_keys_share_the_client_bucket():
+    client = create_client()
+    from python_api import ratelimit
+
+    ratelimit.limiter = ratelimit.TokenBucketLimiter(tempfile.mkstemp()[1], "2/minute")
+    # made-up keys are refused by the route, but must not each get a fresh bucket
+    for i in range(2):
+        assert client.get("/metrics", headers={"x-api-key": f"bogus{i}"}).status_code == 401
+    assert client.get("/metrics", headers={"x-api-key": "bogus2"}).status_code == 429
+    rows = ratelimit.limiter._conn().execute("SELECT key FROM rate_buckets").fetchall()
+    assert [r[0] for r in rows] == ["testclient"]
+    # a configured key keeps its own budget
+    assert client.get("/metrics", headers={"x-api-key": "testkey"}).status_code == 200
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    fd, db_path = tempfile.mkstemp()
+    os.close(fd)
+    monkeypatch.setenv("ORDERS_DB", db_path)
+    monkeypatch.setenv("ALLOW_ORIGINS", "http://test")
+    sys.path.insert(0, os.path.dirname(__file__))
+    sys.modules.pop("db", None)
+    for m in [k for k in list(sys.modules) if k.startswith("python_api")]:
+        sys.modules.pop(m, None)
+    import python_api.main  # noqa: F401 - runs the migrations
+    import python_api.events as events
+    import python_api.workers as workers
+
+    monkeypatch.setattr(workers, "WOO_CALLBACK_URL", "")
+    workers.db.upsert_order("o1", "desc", 0, 1, "escrow:o1", 1000, 10)
+    workers.db.upsert_order("o2", "desc", 1, 1, "escrow:o2", 2000, 10)
+    yield events, workers
+    workers.db.close_conn()
+
+
+def _parse(chunk):
+    assert chunk.startswith("event: status\ndata: ")
+    return json.loads(chunk.split("data: ", 1)[1])
+
+
+async def _quiet():
+    return False
+
+
+def test_stream_pushes_snapshot_then_deltas(hub):
+    events, workers = hub
+    db = workers.db
+    order_events = events.order_events
+    order_events.poll = 0
+    order_events.ping = 0.05
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        order_events.bind(loop)
+        stream = order_events.stream(["o1", "o2", "nope"], _quiet)
+        first = [_parse(await stream.__anext__()) for _ in range(3)]
+        assert [e["order_id"] for e in first] == ["nope", "o1", "o2"]
+        assert first[0]["state"] == "awaiting_deposit" and first[1]["fee_est_sat"] == 10
+        assert events.STREAM_SUBSCRIBERS._value.get() == 1
+
+        # a state change from a worker thread reaches the subscriber as a delta
+        await loop.run_in_executor(None, workers.advance_state, db.get_order("o1"), "escrow_funded", 1)
+        delta = _parse(await stream.__anext__())
+        assert delta["order_id"] == "o1" and delta["state"] == "escrow_funded"
+        assert set(delta) == {"order_id", "state", "deadline_ts"}
+
+        # a write that changes nothing visible is not pushed; idle streams ping
+        order_events.publish("o2")
+        assert await stream.__anext__() == ": ping\n\n"
+
+        db.update_funding("o2", "t2", 0, 0, {"total_sat": 5, "confirmations": 0, "utxos": []})
+        order_events.publish("o2")
+        delta = _parse(await stream.__anext__())
+        assert delta == {"order_id": "o2", "funding": {"total_sat": 5, "confirmations": 0, "utxos": []}}
+
+        await stream.aclose()
+        assert order_events._subs == {} and order_events._rows == {}
+        assert events.STREAM_SUBSCRIBERS._value.get() == 0
+
+    asyncio.run(main())
+
+
+def test_stream_polls_for_changes_from_other_processes(hub):
+    events, workers = hub
+    db = workers.db
+    order_events = events.OrderEvents(poll=0.05, ping=5)
+
+    async def main():
+        order_events.bind(asyncio.get_running_loop())
+        streams = [order_events.stream(["o1"], _quiet) for _ in range(50)]
+        for s in streams:
+            assert _parse(await s.__anext__())["state"] == "awaiting_deposit"
+
+        # written without publish(), as another API process would
+        db.update_state("o1", "escrow_funded", 1)
+        deltas = await asyncio.wait_for(asyncio.gather(*(s.__anext__() for s in streams)), 2)
+        assert {_parse(d)["state"] for d in deltas} == {"escrow_funded"}
+        for s in streams:
+            await s.aclose()
+        await asyncio.sleep(0.1)
+        assert order_events._poller is None
+
+    asyncio.run(main())
@@ -0,0 +1,200 @@
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+
+class Receiver:
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.delay = 0
+        self.received = []
+        self.headers = []
+        self.reply = b""
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.received.append((body.decode(), self.headers["X-Signature"]))
+                receiver.headers.append(dict(self.headers))
+                status = receiver.statuses.pop(0) if receiver.statuses else 200
+                time.sleep(receiver.delay)
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(receiver.reply)))
+                self.end_headers()
+                self.wfile.write(receiver.reply)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    fd, db_path = tempfile.mkstemp()
+    os.close(fd)
+    monkeypatch.setenv("ORDERS_DB", db_path)
+    monkeypatch.setenv("ALLOW_ORIGINS", "http://test")
+    sys.path.insert(0, os.path.dirname(__file__))
+    sys.modules.pop("db", None)
+    for m in [k for k in list(sys.modules) if k.startswith("python_api")]:
+        sys.modules.pop(m, None)
+    import python_api.workers as workers
+
+    receiver = Receiver()
+    monkeypatch.setattr(workers, "WOO_CALLBACK_URL", receiver.url)
+    monkeypatch.setattr(workers, "WOO_CALLBACK_BATCH_URL", receiver.url + "/batch")
+    monkeypatch.setattr(workers, "WOO_HMAC_SECRET", "secret")
+    monkeypatch.setattr(workers, "WEBHOOK_BACKOFF", 2)
+    monkeypatch.setattr(workers, "WEBHOOK_RETRIES", 1)
+    workers.db.upsert_order("o1", "desc", 0, 1, "escrow:o1", 1000, 10)
+    yield workers, receiver
+    receiver.close()
+    workers.db.close_conn()
+
+
+def _due_now(db):
+    db.get_conn().execute("UPDATE webhook_outbox SET next_attempt_at=0")
+
+
+def test_state_change_and_webhook_share_a_transaction(outbox, monkeypatch):
+    workers, _ = outbox
+    db = workers.db
+    order = db.get_order("o1")
+
+    def broken(*args):
+        raise RuntimeError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(db, "enqueue_webhook", broken)
+        with pytest.raises(RuntimeError):
+            workers.advance_state(order, "escrow_funded", 2, {"order_id": "o1", "event": "escrow_funded"})
+    assert db.get_order("o1")["state"] == "awaiting_deposit"
+
+    order = db.get_order("o1")
+    assert workers.advance_state(order, "escrow_funded", 2, {"order_id": "o1", "event": "escrow_funded"})
+    assert db.get_order("o1")["state"] == "escrow_funded"
+    assert workers.update_webhook_gauge() == 1
+
+
+def test_delivery_retries_then_records_success(outbox):
+    workers, receiver = outbox
+    db = workers.db
+    receiver.statuses = [500]
+    workers.woo_callback({"order_id": "o1", "event": "settled", "txid": "t1"})
+    session = requests.Session()
+
+    assert workers.deliver_webhooks(session) == 1
+    assert workers.deliver_webhooks(session) == 0  # backing off
+    row = db.get_conn().execute("SELECT attempts, failed_at FROM webhook_outbox").fetchone()
+    assert tuple(row) == (1, None)
+    assert not db.get_order("o1")["last_webhook_ts"]
+
+    _due_now(db)
+    assert workers.deliver_webhooks(session) == 1
+    assert workers.update_webhook_gauge() == 0
+    assert db.get_order("o1")["last_webhook_ts"]
+    body, sig = receiver.received[-1]
+    assert json.loads(body) == {"order_id": "o1", "event": "settled", "txid": "t1"}
+    assert sig == hmac.new(b"secret", body.encode(), hashlib.sha256).hexdigest()
+    ts = receiver.headers[-1]["X-WEO-TS"]
+    assert receiver.headers[-1]["X-WEO-Sign"] == hmac.new(b"secret", (ts + body).encode(), hashlib.sha256).hexdigest()
+
+
+def test_exhausted_webhook_leaves_backlog(outbox):
+    workers, receiver = outbox
+    db = workers.db
+    receiver.statuses = [500, 500]
+    workers.woo_callback({"order_id": "o1", "event": "dispute_opened"})
+    session = requests.Session()
+    workers.deliver_webhooks(session)
+    _due_now(db)
+    workers.deliver_webhooks(session)
+    assert len(receiver.received) == 2
+    assert workers.update_webhook_gauge() == 0
+    row = db.get_conn().execute("SELECT attempts, failed_at, last_error FROM webhook_outbox").fetchone()
+    assert row["attempts"] == 2 and row["failed_at"] and "500" in row["last_error"]
+
+
+def test_scheduler_delivers_concurrently_past_failures(outbox):
+    workers, receiver = outbox
+    db = workers.db
+    receiver.delay = 0.2
+    receiver.statuses = [500]
+    for i in range(8):
+        workers.woo_callback({"order_id": "o1", "event": f"e{i}"})
+    scheduler = workers.WebhookScheduler(workers=8)
+    t = threading.Thread(target=scheduler.run, daemon=True)
+    start = time.time()
+    t.start()
+    while workers.update_webhook_gauge() > 1 and time.time() - start < 5:
+        time.sleep(0.02)
+    elapsed = time.time() - start
+    scheduler.stop()
+    t.join(2)
+    # 8 requests at 200 ms each finish together, the failed one waits in the retry heap
+    assert elapsed < 1.0
+    assert len(receiver.received) == 8
+    assert workers.update_webhook_gauge() == 1
+    assert len(scheduler._timers) == 1
+    row = db.get_conn().execute("SELECT attempts, failed_at FROM webhook_outbox").fetchone()
+    assert tuple(row) == (1, None)
+
+
+def test_batch_mode_coalesces_and_retries_rejected_events(outbox, monkeypatch):
+    workers, receiver = outbox
+    db = workers.db
+    monkeypatch.setattr(workers, "WEBHOOK_BATCH_MODE", True)
+    db.upsert_order("o2", "desc", 0, 1, "escrow:o2", 1000, 10)
+    workers.woo_callback({"order_id": "o1", "event": "settled", "txid": "t1"})
+    workers.woo_callback({"order_id": "o2", "event": "escrow_funded"})
+    workers.woo_callback({"order_id": "o1", "event": "settled", "txid": "t2"})  # RBF replacement
+    workers.woo_callback({"order_id": "o3", "event": "refunded"})
+    receiver.reply = json.dumps({"ok": True, "results": [
+        {"order_id": "o2", "ok": True, "status": 200},
+        {"order_id": "o1", "ok": True, "status": 200},
+        {"order_id": "o3", "ok": False, "status": 404},
+    ]}).encode()
+
+    assert workers.deliver_webhooks(requests.Session()) == 4
+    assert len(receiver.received) == 1
+    body, _ = receiver.received[0]
+    assert [e.get("txid") for e in json.loads(body)] == [None, "t2", None]
+    headers = receiver.headers[0]
+    assert headers["X-WEO-Sign"] == hmac.new(b"secret", (headers["X-WEO-TS"] + body).encode(), hashlib.sha256).hexdigest()
+    assert db.get_order("o1")["last_webhook_ts"] and db.get_order("o2")["last_webhook_ts"]
+    rows = db.get_conn().execute("SELECT order_id, attempts, last_error FROM webhook_outbox").fetchall()
+    assert [tuple(r) for r in rows] == [("o3", 1, "status 404")]
+
+
+@pytest.mark.parametrize("reply", [b"<html>ok</html>", b'{"ok": true}', b'{"results": [{"ok": true}]}', b'{"results": [1, 2]}'])
+def test_batch_mode_reschedules_unmatched_response(outbox, monkeypatch, reply):
+    workers, receiver = outbox
+    db = workers.db
+    monkeypatch.setattr(workers, "WEBHOOK_BATCH_MODE", True)
+    workers.woo_callback({"order_id": "o1", "event": "settled", "txid": "t1"})
+    workers.woo_callback({"order_id": "o1", "event": "settled", "txid": "t2"})
+    workers.woo_callback({"order_id": "o2", "event": "refunded"})
+    receiver.reply = reply
+
+    # a 200 that cannot be matched to the batch proves nothing was delivered
+    assert workers.deliver_webhooks(requests.Session()) == 3
+    rows = db.get_conn().execute("SELECT order_id, attempts, last_error FROM webhook_outbox ORDER BY id").fetchall()
+    assert [tuple(r) for r in rows] == [("o1", 1, "unmatched batch response"), ("o2", 1, "unmatched batch response")]
+    assert not db.get_order("o1")["last_webhook_ts"]